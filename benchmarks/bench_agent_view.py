@@ -0,0 +1,145 @@
+"""
+Prompt size and tool time of the chatbot agent on the full survey against the compact agent view.
+
+The agent answers the predefined sidebar questions offline with a scripted chat model: for each
+question it runs the pandas code a model would write for it in the python tool, then answers. The
+same code runs on both frames, so the difference is only the frame the tool works on and the prompt
+describing it (df.head() of every column against the schema summary of agent_view.py).
+
+Prompt tokens are counted with tiktoken's cl100k_base encoding when it can be loaded, and estimated
+as 4 characters per token otherwise. The survey defaults to a synthetic one (see synthetic_survey.py).
+
+Usage (from benchmarks/):
+    python bench_agent_view.py
+    python bench_agent_view.py --rows 1000000 --repeat 3
+    python bench_agent_view.py --survey path/to/survey_results_public.csv
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from langchain.callbacks.base import BaseCallbackHandler
+from langchain.prompts import ChatPromptTemplate
+from langchain_community.chat_models.fake import FakeListChatModel
+
+from agent_view import agent_prefix, load_agent_view
+from bench_suite import DATA_DIR, survey_file
+from chatbot import build_agent, predefined_questions, prompt_template
+from helpers import load_survey
+
+DATA_SCIENTISTS_IN_USA = ("df[(df['DevType'] == 'Data scientist or machine learning specialist') "
+                          "& (df['Country'] == 'United States of America')]")
+
+# Pandas code run in the python tool for each predefined question, in order
+TOOL_CODE = [
+    "df['LanguageHaveWorkedWith'].str.split(';').explode().value_counts().head(10)",
+    "df['PlatformHaveWorkedWith'].str.split(';').explode().value_counts().head(10)",
+    "df['EdLevel'].value_counts().head(10)",
+    "df.groupby('DevType', observed=True)['ConvertedCompYearly'].median().sort_values(ascending=False).head(10)",
+    f"{DATA_SCIENTISTS_IN_USA}['ConvertedCompYearly'].median()",
+    f"{DATA_SCIENTISTS_IN_USA}.groupby('EdLevel', observed=True)['ConvertedCompYearly'].median()",
+]
+
+
+def token_counter():
+    # Returns (count, name) of the tokenizer used
+    try:
+        import tiktoken
+
+        encoding = tiktoken.get_encoding('cl100k_base')
+        return (lambda text: len(encoding.encode(text))), 'cl100k_base tokens'
+    except Exception:
+        return (lambda text: len(text) // 4), 'tokens (estimated as characters / 4)'
+
+
+class RunRecorder(BaseCallbackHandler):
+    """
+    Collects the text of every prompt sent to the chat model and the time spent in every tool call.
+    """
+
+    def __init__(self):
+        self.prompts = []
+        self.tool_seconds = []
+        self.tool_starts = {}
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.prompts.extend('\n'.join(str(message.content) for message in batch) for batch in messages)
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.prompts.extend(prompts)
+
+    def on_tool_start(self, serialized, input_str, run_id=None, **kwargs):
+        self.tool_starts[run_id] = time.perf_counter()
+
+    def on_tool_end(self, output, run_id=None, **kwargs):
+        self.tool_seconds.append(time.perf_counter() - self.tool_starts.pop(run_id))
+
+
+def run_question(df, prefix, question, code):
+    # One tool call with code, then the final answer
+    responses = [f"Thought: I should query the dataframe.\nAction: python_repl_ast\nAction Input: {code}",
+                 "Thought: I now know the final answer.\nFinal Answer: This is a stub answer."]
+    agent = build_agent(FakeListChatModel(responses=responses), df, prefix=prefix)
+
+    recorder = RunRecorder()
+    final_prompt = ChatPromptTemplate.from_template(template=prompt_template).format_messages(query=question)
+    agent.invoke(final_prompt, config={'callbacks': [recorder]})
+    return recorder
+
+
+def measure(df, prefix, repeat, count_tokens):
+    """
+    Returns, per predefined question, the best tool time over repeat runs and the tokens of the first prompt.
+    """
+    results = []
+    for question, code in zip(predefined_questions, TOOL_CODE):
+        recorders = [run_question(df, prefix, question, code) for _ in range(repeat)]
+        results.append({'tool_ms': 1000 * min(sum(recorder.tool_seconds) for recorder in recorders),
+                        'prompt_tokens': count_tokens(recorders[0].prompts[0])})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the agent on the full survey and on the agent view.")
+    parser.add_argument('--survey', help="survey CSV; default is a synthetic survey of --rows responses")
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    survey = args.survey or survey_file(args.rows, 0, args.data_dir)
+    count_tokens, token_name = token_counter()
+
+    frames = {}
+    start = time.perf_counter()
+    full = load_survey(survey, columns=None)
+    frames['full survey'] = (full, None, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    view = load_agent_view(survey)
+    prefix = agent_prefix(view)
+    frames['agent view'] = (view, prefix, time.perf_counter() - start)
+
+    results = {}
+    for name, (df, prefix, load_seconds) in frames.items():
+        print(f"{name:<12} {len(df):,} rows x {len(df.columns)} columns, {df.memory_usage(deep=True).sum() / 1e6:8.1f} MB, "
+              f"loaded in {load_seconds:.2f}s")
+        results[name] = measure(df, prefix, args.repeat, count_tokens)
+
+    print(f"\nper question: tool time (best of {args.repeat}) and first prompt size in {token_name}")
+    print(f"{'question':<62} {'full':>9} {'view':>9}   {'full':>7} {'view':>7}")
+    for question, full_result, view_result in zip(predefined_questions, results['full survey'], results['agent view']):
+        print(f"{question[:60]:<62} {full_result['tool_ms']:6.1f} ms {view_result['tool_ms']:6.1f} ms   "
+              f"{full_result['prompt_tokens']:7,} {view_result['prompt_tokens']:7,}")
+
+    for name, result in results.items():
+        print(f"{name:<12} mean tool time {statistics.mean(r['tool_ms'] for r in result):7.1f} ms, "
+              f"mean prompt {statistics.mean(r['prompt_tokens'] for r in result):7,.0f} {token_name}")
+
+
+if __name__ == '__main__':
+    main()
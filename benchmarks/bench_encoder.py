@@ -0,0 +1,72 @@
+"""
+Micro-benchmark of perform_encoding against the compiled FeatureEncoder, for single records and batches.
+
+Both encoders are run on the same random respondents and their outputs are checked for equality.
+
+Usage (from benchmarks/):
+    python bench_encoder.py
+    python bench_encoder.py --weights-dir path/to/saved_weights --batch-size 100000
+"""
+import argparse
+import os
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from feature_encoder import FeatureEncoder
+from helpers import Age_keys, DevType_keys, EdLevel_keys, Employment_keys, Industry_keys, IcorPM_keys, OrgSize_keys, RemoteWork_keys
+from helpers import FEATURE_ORDER, perform_encoding
+from predictor import WEIGHTS_DIR, load_predictor
+
+
+def random_features(rng, n):
+    # A DataFrame with object columns, like a chunk read by predict.py
+    years = rng.integers(0, 51, n).astype(float)
+    features = pd.DataFrame({'Age': rng.choice(Age_keys, n), 'Employment': rng.choice(Employment_keys, n),
+                             'RemoteWork': rng.choice(RemoteWork_keys, n), 'EdLevel': rng.choice(EdLevel_keys, n),
+                             'YearsCodePro': np.where(years == 0, 0.5, years), 'DevType': rng.choice(DevType_keys, n),
+                             'Industry': rng.choice(Industry_keys, n), 'OrgSize': rng.choice(OrgSize_keys, n),
+                             'ICorPM': rng.choice(IcorPM_keys, n)})
+    return features.astype({column: object for column in FEATURE_ORDER if column != 'YearsCodePro'})
+
+
+def best_of(function, number, repeat=5):
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare perform_encoding with the compiled FeatureEncoder.")
+    parser.add_argument('--weights-dir', default=WEIGHTS_DIR)
+    parser.add_argument('--batch-size', type=int, default=100000)
+    args = parser.parse_args()
+
+    predictor = load_predictor(args.weights_dir)
+    encoders, education_level_map = predictor.encoders, predictor.education_level_map
+    encoder = FeatureEncoder(encoders, education_level_map)
+
+    batch = random_features(np.random.default_rng(0), args.batch_size)
+    expected = perform_encoding(batch, encoders, education_level_map).to_numpy(dtype=np.float32)
+    assert np.array_equal(encoder.encode_many(batch), expected), "encoded batches differ"
+
+    record = batch.iloc[0].to_dict()
+    out = np.empty((1, len(FEATURE_ORDER)), dtype=np.float32)
+    assert np.array_equal(encoder.encode_one(record, out)[0], expected[0]), "encoded records differ"
+
+    single_old = best_of(lambda: perform_encoding({column: [value] for column, value in record.items()}, encoders, education_level_map), 200)
+    single_new = best_of(lambda: encoder.encode_one(record, out), 20000)
+    print(f"single record   perform_encoding {single_old * 1e6:10.1f} us   FeatureEncoder {single_new * 1e6:8.2f} us   "
+          f"{single_old / single_new:7.0f}x")
+
+    out = np.empty((args.batch_size, len(FEATURE_ORDER)), dtype=np.float32)
+    batch_old = best_of(lambda: perform_encoding(batch, encoders, education_level_map), 1, repeat=3)
+    batch_new = best_of(lambda: encoder.encode_many(batch, out), 1, repeat=3)
+    print(f"{args.batch_size:,} records  perform_encoding {batch_old * 1e3:10.1f} ms   FeatureEncoder {batch_new * 1e3:8.1f} ms   "
+          f"{batch_old / batch_new:7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
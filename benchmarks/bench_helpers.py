@@ -0,0 +1,68 @@
+"""
+Micro-benchmark of the per-row helper conversions against their vectorized replacements.
+
+Both versions are run on the full public survey and their outputs are checked for equality.
+
+Usage (from benchmarks/):
+    python bench_helpers.py
+    python bench_helpers.py --survey path/to/survey_results_public.csv --repeat 5
+"""
+import argparse
+import os
+import sys
+import timeit
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from helpers import SURVEY_PATH, load_survey
+from helpers import convert_OrgSize, convert_OrgSize_column, convert_YearsCodePro, convert_YearsCodePro_column, records_to_consider
+
+
+def records_to_consider_loop(column_counts, threshold=1000):
+    # The original Python loop, kept here as the baseline.
+    result = []
+    for entity, count in zip(column_counts.index, column_counts.values):
+        if count >= threshold:
+            result.append(entity)
+    return result
+
+
+def best_of(function, repeat):
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the per-row and vectorized helper conversions.")
+    parser.add_argument('--survey', default=SURVEY_PATH)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    df = load_survey(args.survey, columns=['Country', 'YearsCodePro', 'OrgSize'], dtypes={})
+    years = df['YearsCodePro'].dropna()
+    org_size = df['OrgSize'].dropna()
+    country_counts = df['Country'].value_counts()
+
+    cases = [
+        ('convert_YearsCodePro', lambda: years.apply(convert_YearsCodePro), lambda: convert_YearsCodePro_column(years)),
+        ('convert_OrgSize', lambda: org_size.apply(convert_OrgSize), lambda: convert_OrgSize_column(org_size)),
+        ('records_to_consider', lambda: records_to_consider_loop(country_counts), lambda: records_to_consider(country_counts)),
+    ]
+
+    print(f"{len(df)} survey rows, best of {args.repeat}")
+    print(f"{'helper':<24}{'per-row (ms)':>14}{'vectorized (ms)':>18}{'speedup':>10}")
+
+    for name, old, new in cases:
+        old_result, new_result = old(), new()
+        if isinstance(old_result, pd.Series):
+            pd.testing.assert_series_equal(old_result, new_result)
+        else:
+            assert old_result == new_result, name
+
+        old_time, new_time = best_of(old, args.repeat), best_of(new, args.repeat)
+        print(f"{name:<24}{old_time * 1000:>14.3f}{new_time * 1000:>18.3f}{old_time / new_time:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
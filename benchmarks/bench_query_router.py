@@ -0,0 +1,95 @@
+"""
+Latency of chatbot questions answered by the deterministic query router against the LLM agent.
+
+The agent runs offline on a stub chat model that makes one pandas tool call before answering, with an
+optional simulated model latency per call, so only the agent's own overhead and the simulated round
+trips are measured. The router needs neither.
+
+Usage (from benchmarks/):
+    python bench_query_router.py
+    python bench_query_router.py --survey path/to/survey_results_public.csv --llm-latency 1.5 --repeat 3
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from langchain_community.chat_models.fake import FakeListChatModel
+
+from chatbot import ask_agent, build_agent, predefined_questions
+from helpers import SURVEY_PATH, load_survey
+from plotting_helpers import load_survey_frames
+from query_router import QueryRouter
+
+ROUTABLE_QUESTIONS = [
+    "What was the median salary of Data Scientists in the IT field in USA?",
+    "What was the median annual salary for Data Scientists in the IT sector in the United States, including a breakdown by Education level?",
+    "What is the average salary of full-stack developers in Germany?",
+    "How many respondents work in healthcare in India?",
+    "What is the median compensation by country?",
+]
+
+
+class SlowFakeChatModel(FakeListChatModel):
+    """
+    FakeListChatModel that waits latency seconds before every reply, standing in for a remote model.
+    """
+    latency: float = 0.0
+
+    def _call(self, *args, **kwargs):
+        time.sleep(self.latency)
+        return super()._call(*args, **kwargs)
+
+
+def stub_agent(df, latency):
+    # Each question costs two model calls: one tool call on the dataframe, then the final answer.
+    responses = ["Thought: I should look at the dataframe.\nAction: python_repl_ast\nAction Input: df.shape",
+                 "Thought: I now know the final answer.\nFinal Answer: This is a stub answer."]
+    return build_agent(SlowFakeChatModel(responses=responses, latency=latency), df)
+
+
+def time_calls(function, questions, repeat):
+    timings = []
+    for _ in range(repeat):
+        for question in questions:
+            start = time.perf_counter()
+            function(question)
+            timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(name, timings):
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(0.95 * len(timings)))]
+    print(f"{name:<8} mean {1000 * statistics.mean(timings):9.2f} ms   p50 {1000 * statistics.median(timings):9.2f} ms   "
+          f"p95 {1000 * p95:9.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare routed and agent answers to chatbot questions.")
+    parser.add_argument('--survey', default=SURVEY_PATH)
+    parser.add_argument('--llm-latency', type=float, default=0.0, help="simulated seconds per chat model call")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    survey = load_survey_frames(args.survey)
+    router = QueryRouter(survey.final, survey.raw)
+    print(f"router built in {time.perf_counter() - start:.2f}s")
+
+    unrouted = [question for question in ROUTABLE_QUESTIONS + predefined_questions if router.parse(question) is None]
+    print(f"{len(ROUTABLE_QUESTIONS) + len(predefined_questions) - len(unrouted)} questions routed, "
+          f"{len(unrouted)} left to the agent")
+
+    questions = [question for question in ROUTABLE_QUESTIONS if router.parse(question) is not None]
+    df = load_survey(args.survey, columns=None)
+
+    report('router', time_calls(router.answer, questions, args.repeat))
+    report('agent', time_calls(lambda question: ask_agent(stub_agent(df, args.llm_latency), question), questions, args.repeat))
+
+
+if __name__ == '__main__':
+    main()
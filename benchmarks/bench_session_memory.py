@@ -0,0 +1,121 @@
+"""
+Memory held per Streamlit session and per worker process.
+
+Sessions: the app is run headless with streamlit.testing several times in one process, keeping every
+session alive, and the growth of the process RSS per extra session is reported.
+
+Workers: several processes load the survey frames (the Key Insights frames plus the agent's survey
+view) at the same time, either privately (every process parses the CSV into its own memory, as before
+shared_store.py) or through the memory-mapped shared store. Private memory and PSS (shared pages split
+between the processes mapping them) of each worker are read from /proc, so this part needs Linux.
+
+Usage (from benchmarks/):
+    python bench_session_memory.py
+    python bench_session_memory.py --survey path/to/survey_results_public.csv --workers 8 --sessions 20
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, SRC_DIR)
+
+from helpers import SURVEY_PATH
+
+
+def memory_mb(pid='self'):
+    """
+    Returns:
+    - dict: Rss, Pss and Private (clean + dirty) memory of a process in MB.
+    """
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as file:
+        for line in file:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1]) / 1024
+
+    return {'rss': fields['Rss'], 'pss': fields['Pss'], 'private': fields['Private_Clean'] + fields['Private_Dirty']}
+
+
+def run_worker(survey, shared_dir):
+    # Loads what a warm app process holds, then waits until the parent has measured every worker.
+    from agent_view import AGENT_VIEW_VERSION, agent_view_dtypes, load_agent_view
+    from plotting_helpers import compute_insights, load_survey_frames
+    from shared_store import shared_frame
+
+    survey_frames = load_survey_frames(survey, shared_dir=shared_dir)
+    compute_insights(survey_frames)
+    shared_frame('survey_agent_view', survey_frames.version, lambda: load_agent_view(survey), shared_dir,
+                 AGENT_VIEW_VERSION, agent_view_dtypes(survey))
+
+    print('ready', flush=True)
+    sys.stdin.readline()
+
+
+def measure_workers(survey, workers, shared_dir):
+    command = [sys.executable, os.path.abspath(__file__), '--worker', '--survey', survey]
+    if shared_dir is not None:
+        command += ['--shared-dir', shared_dir]
+
+        # Build the shared files up front, so every worker measures the steady state.
+        subprocess.run(command, input='\n', capture_output=True, text=True, check=True)
+
+    processes = [subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True) for _ in range(workers)]
+    for process in processes:
+        if process.stdout.readline().strip() != 'ready':
+            sys.exit("A worker failed to start")
+
+    usage = [memory_mb(process.pid) for process in processes]
+
+    for process in processes:
+        process.communicate('\n')
+
+    return usage
+
+
+def measure_sessions(survey_dir, sessions):
+    from streamlit.testing.v1 import AppTest
+
+    os.chdir(survey_dir)
+    apps, rss = [], []
+    for _ in range(sessions):
+        app = AppTest.from_file(os.path.join(SRC_DIR, 'main.py'), default_timeout=600)
+        app.run()
+        apps.append(app)
+        rss.append(memory_mb()['rss'])
+
+    return rss
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure memory per Streamlit session and per worker process.")
+    parser.add_argument('--survey', default=SURVEY_PATH)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--sessions', type=int, default=10)
+    parser.add_argument('--app-dir', default=SRC_DIR, help="working directory of the app for the session test (the data is read from ../)")
+    parser.add_argument('--shared-dir', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    survey = os.path.abspath(args.survey)
+    if args.worker:
+        run_worker(survey, args.shared_dir)
+        return
+
+    with tempfile.TemporaryDirectory() as shared_dir:
+        for mode, directory in [('private', None), ('shared', shared_dir)]:
+            usage = measure_workers(survey, args.workers, directory)
+            print(f"{args.workers} workers, {mode:<7}  private {sum(u['private'] for u in usage) / len(usage):8.1f} MB/worker   "
+                  f"pss {sum(u['pss'] for u in usage) / len(usage):8.1f} MB/worker   pss total {sum(u['pss'] for u in usage):8.1f} MB")
+
+    if args.sessions > 1:
+        rss = measure_sessions(os.path.abspath(args.app_dir), args.sessions)
+        print(f"\n{args.sessions} sessions in one process: first session {rss[0]:.1f} MB RSS, "
+              f"then {(rss[-1] - rss[0]) / (len(rss) - 1):.2f} MB per additional session")
+
+
+if __name__ == '__main__':
+    main()
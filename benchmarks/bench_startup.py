@@ -0,0 +1,102 @@
+"""
+Startup cost of the Streamlit app.
+
+The app script is run headless with streamlit.testing in a fresh interpreter started with
+`python -X importtime`, so every import it triggers is timed. Reported are the wall-clock time of the
+first script run (time to first render, Streamlit's own imports excluded), a second cached run, the
+slowest top-level imports, and which heavy libraries were loaded by the first render.
+
+Usage (from benchmarks/):
+    python bench_startup.py
+    python bench_startup.py --app-dir path/to/app/src --no-secrets
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+# Libraries that only some tabs need
+HEAVY_MODULES = ['matplotlib', 'seaborn', 'plotly', 'langchain', 'langchain_experimental', 'langchain_openai', 'openai',
+                 'sklearn', 'scipy', 'pyarrow']
+
+
+def run_child(app_dir, secrets):
+    # Runs in the -X importtime interpreter. Streamlit is imported before the clock starts.
+    from streamlit.testing.v1 import AppTest
+
+    sys.path.insert(0, os.path.abspath(SRC_DIR))
+    before = set(sys.modules)
+    os.chdir(app_dir)
+
+    app = AppTest.from_file(os.path.join(os.path.abspath(SRC_DIR), 'main.py'), default_timeout=600)
+    if secrets:
+        app.secrets['OPENAI_API_KEY'] = 'sk-benchmark'
+
+    start = time.perf_counter()
+    app.run()
+    first_run = time.perf_counter() - start
+
+    start = time.perf_counter()
+    app.run()
+    second_run = time.perf_counter() - start
+
+    loaded = {module.split('.')[0] for module in set(sys.modules) - before}
+    print(json.dumps({'first_run': first_run, 'second_run': second_run,
+                      'exceptions': [str(exception.value) for exception in app.exception],
+                      'heavy_modules_loaded': sorted(module for module in HEAVY_MODULES if module in loaded)}))
+
+
+def parse_importtime(stderr):
+    """
+    Returns:
+    - dict: Cumulative import time in seconds of each top-level import.
+    """
+    times = {}
+    for line in stderr.splitlines():
+        match = re.match(r'import time:\s+\d+ \|\s+(\d+) \| ( *)(\S+)', line)
+        if match and not match.group(2):
+            times[match.group(3)] = times.get(match.group(3), 0) + int(match.group(1)) / 1e6
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time and time to first render of the Streamlit app.")
+    parser.add_argument('--app-dir', default=SRC_DIR, help="working directory of the app (the data is read from ../)")
+    parser.add_argument('--no-secrets', action='store_true', help="run without OPENAI_API_KEY")
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.app_dir, not args.no_secrets)
+        return
+
+    command = [sys.executable, '-X', 'importtime', os.path.abspath(__file__), '--child', '--app-dir', os.path.abspath(args.app_dir)]
+    if args.no_secrets:
+        command.append('--no-secrets')
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        sys.exit(result.stderr[-2000:])
+
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    imports = parse_importtime(result.stderr)
+
+    print(f"time to first render     {report['first_run']:8.2f} s")
+    print(f"cached rerun             {report['second_run']:8.2f} s")
+    print(f"total import time        {sum(imports.values()):8.2f} s")
+    print(f"heavy libraries loaded   {', '.join(report['heavy_modules_loaded']) or 'none'}")
+    if report['exceptions']:
+        print(f"exceptions               {report['exceptions']}")
+
+    print(f"\nslowest top-level imports:")
+    for name, seconds in sorted(imports.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {seconds:8.3f} s  {name}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+"""
+Benchmark suite of the data and model paths, runnable offline on synthetic surveys.
+
+For every size (10k, 100k and 1M responses by default) a synthetic survey_results_public.csv is written
+once by synthetic_survey.py into --data-dir, then these steps are timed:
+    load_csv                      helpers.load_survey (the app's columns and dtypes)
+    preprocess_till_Ed_Level      the Key Insights preprocessing
+    eda_level_<n>:aggregate       the aggregate behind chart n (plotting_helpers.INSIGHT_BUILDERS)
+    eda_level_<n>:figure          building the plotly figure of chart n from it (charts.eda_chart)
+    preprocessing_pipeline        preprocessing.py end to end, writing the clean training CSV
+    perform_encoding:batch/single helpers.perform_encoding on tab2 form values
+    predict_compensation:*        a single prediction (table lookup and model) and a batch through the model
+
+Each step reports the best and mean wall time of --repeat runs and, from one extra run under tracemalloc,
+its peak Python/NumPy allocation. Steps that need the model are skipped (with the reason) when the
+saved weights cannot be loaded. Results go to a JSON file tagged with the git commit, so two runs can be
+compared with --compare.
+
+Usage (from benchmarks/):
+    python bench_suite.py
+    python bench_suite.py --sizes 10000 100000 --repeat 5 --weights-dir ../saved_weights
+    python bench_suite.py --compare results/bench-abc1234.json results/bench-def5678.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, '..', 'src'))
+
+import plotting_helpers
+from bench_encoder import random_features
+from charts import eda_chart
+from helpers import FEATURE_ORDER, load_survey, perform_encoding
+from plotting_helpers import INSIGHT_BUILDERS, SurveyFrames, preprocess_till_Ed_Level, process_usa_data
+from prediction_table import load_prediction_table
+from predictor import WEIGHTS_DIR, load_predictor
+from preprocessing import run_pipeline
+from synthetic_survey import write_survey
+
+DATA_DIR = os.path.join(BENCHMARKS_DIR, 'data')
+RESULTS_DIR = os.path.join(BENCHMARKS_DIR, 'results')
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCHMARKS_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=BENCHMARKS_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return commit + ('-dirty' if dirty else '')
+
+
+def survey_file(rows, seed, data_dir=DATA_DIR):
+    # Generated once per (rows, seed) and reused by later runs
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"survey_{rows}_{seed}.csv")
+    if not os.path.exists(path):
+        print(f"writing {rows:,} synthetic responses to {path}", file=sys.stderr)
+        write_survey(path, rows, seed)
+    return path
+
+
+def measure(function, repeat, memory=True, setup=None):
+    """
+    Times function over repeat runs, then runs it once more under tracemalloc for its peak allocation.
+
+    Returns:
+    - dict: best_seconds, mean_seconds, seconds (every run) and peak_bytes (None without memory).
+    """
+    seconds = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start)
+
+    peak = None
+    if memory:
+        if setup:
+            setup()
+        tracemalloc.start()
+        try:
+            function()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return {'best_seconds': min(seconds), 'mean_seconds': float(np.mean(seconds)), 'seconds': seconds, 'peak_bytes': peak}
+
+
+def data_steps(path):
+    """
+    Yields (step, function, setup) for the load, preprocessing and Key Insights steps of one survey file.
+    """
+    yield 'load_csv', lambda: load_survey(path), None
+
+    raw = load_survey(path)
+    yield 'preprocess_till_Ed_Level', lambda: preprocess_till_Ed_Level(raw), None
+
+    final = preprocess_till_Ed_Level(raw)
+    survey = SurveyFrames(f"bench:{path}", raw, final, process_usa_data(final))
+
+    # The multi-select charts reuse an index built on first use; clear it so every run builds it
+    def clear_indexes():
+        plotting_helpers._multi_hot_indexes.clear()
+
+    insights = {}
+    for level, (name, build) in enumerate(INSIGHT_BUILDERS.items(), start=1):
+        yield f"eda_level_{level}:aggregate", lambda build=build: build(survey), clear_indexes
+        insights[name] = build(survey)
+    for level in range(1, len(INSIGHT_BUILDERS) + 1):
+        yield f"eda_level_{level}:figure", lambda level=level: eda_chart(level, insights), None
+
+    output = os.path.join(tempfile.mkdtemp(prefix='bench_suite_'), 'survey_results_clean_usa.csv')
+    yield 'preprocessing_pipeline', lambda: run_pipeline([path], output), None
+
+
+def model_steps(rows, weights_dir, max_predict_rows):
+    """
+    Yields (step, function, setup) for encoding and prediction on rows tab2 form inputs.
+    """
+    predictor = load_predictor(weights_dir)
+    encoders, education_level_map = predictor.encoders, predictor.education_level_map
+
+    batch = random_features(np.random.default_rng(0), rows)
+    record = {column: [value] for column, value in batch.iloc[0].items()}
+
+    yield 'perform_encoding:batch', lambda: perform_encoding(batch, encoders, education_level_map), None
+    yield 'perform_encoding:single', lambda: perform_encoding(record, encoders, education_level_map), None
+
+    # main.predict_compensation answers from the prediction table when it is built, from the model otherwise
+    table = load_prediction_table(weights_dir)
+    if table is not None:
+        yield 'predict_compensation:single_table', lambda: table.lookup({column: values[0] for column, values in record.items()}), None
+    yield 'predict_compensation:single_model', lambda: predictor.predict_many(record)[0], None
+
+    predict_batch = batch.iloc[:max_predict_rows]
+    yield 'predict_compensation:batch', lambda: predictor.predict_many(predict_batch), None
+
+
+def run_suite(sizes, repeat=3, seed=0, data_dir=DATA_DIR, weights_dir=WEIGHTS_DIR, max_predict_rows=100000, memory=True):
+    results = []
+
+    for rows in sizes:
+        path = survey_file(rows, seed, data_dir)
+        steps = [('data', data_steps(path))]
+
+        try:
+            load_predictor(weights_dir)
+            steps.append(('model', model_steps(rows, weights_dir, max_predict_rows)))
+        except Exception as error:
+            results.append({'rows': rows, 'step': 'model', 'skipped': f"cannot load the model from {weights_dir}: {error}"})
+
+        for _, generator in steps:
+            for step, function, setup in generator:
+                result = {'rows': rows, 'step': step, **measure(function, repeat, memory, setup)}
+                if step == 'predict_compensation:batch':
+                    result['predicted_rows'] = min(rows, max_predict_rows)
+                results.append(result)
+
+                peak = f"{result['peak_bytes'] / 1e6:9.1f} MB" if result['peak_bytes'] is not None else ''
+                print(f"{rows:>9,} {step:<36} {result['best_seconds'] * 1e3:12.2f} ms {peak}", file=sys.stderr)
+
+    return results
+
+
+def compare(base_path, new_path):
+    """
+    Prints the steps of two result files side by side, with the new/base ratio of their best times.
+    """
+    runs = []
+    for path in [base_path, new_path]:
+        with open(path) as file:
+            report = json.load(file)
+        runs.append((report['meta']['commit'], {(result['rows'], result['step']): result for result in report['results']
+                                                if 'skipped' not in result}))
+
+    (base_commit, base), (new_commit, new) = runs
+    print(f"{'rows':>9} {'step':<36} {base_commit:>14} {new_commit:>14} {'ratio':>7} {'peak MB':>17}")
+    for key in sorted(set(base) & set(new)):
+        old_result, new_result = base[key], new[key]
+        peaks = '/'.join(f"{result['peak_bytes'] / 1e6:.1f}" if result.get('peak_bytes') is not None else '-'
+                         for result in [old_result, new_result])
+        print(f"{key[0]:>9,} {key[1]:<36} {old_result['best_seconds'] * 1e3:11.2f} ms {new_result['best_seconds'] * 1e3:11.2f} ms "
+              f"{new_result['best_seconds'] / old_result['best_seconds']:7.2f} {peaks:>17}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the load, preprocessing, Key Insights, encoding and prediction paths.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000], help="synthetic survey sizes")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per step")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-dir', default=DATA_DIR, help="where the synthetic surveys are cached")
+    parser.add_argument('--weights-dir', default=WEIGHTS_DIR)
+    parser.add_argument('--max-predict-rows', type=int, default=100000, help="rows of the batch prediction step")
+    parser.add_argument('--no-memory', action='store_true', help="skip the tracemalloc run of each step")
+    parser.add_argument('--output', help="JSON file to write (default: results/bench-<commit>.json)")
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'), help="compare two result files instead of running")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    commit = git_commit()
+    meta = {'commit': commit, 'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count(),
+            'pandas': pd.__version__, 'numpy': np.__version__, 'sizes': args.sizes, 'repeat': args.repeat,
+            'seed': args.seed, 'features': FEATURE_ORDER}
+
+    results = run_suite(args.sizes, args.repeat, args.seed, args.data_dir, args.weights_dir, args.max_predict_rows,
+                        not args.no_memory)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"bench-{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump({'meta': meta, 'results': results}, file, indent=2)
+    print(f"Wrote {output}")
+
+
+if __name__ == '__main__':
+    main()
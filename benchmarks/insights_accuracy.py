@@ -0,0 +1,120 @@
+"""
+Accuracy report of the incremental Key Insights aggregates (src/incremental_insights.py) against the exact
+pandas results of plotting_helpers.compute_insights.
+
+The survey is folded into the incremental state in --batches slices, as if its responses had arrived over
+time. Every statistic of every chart is then compared with the exact value:
+    - counts, means, minimums, maximums and standard deviations by relative error
+    - medians and percentiles by relative error and by rank error, the distance between the ranks of the
+      estimated and the exact value within their group (0.001 = a tenth of a percent of the group's responses)
+
+Usage (from benchmarks/):
+    python insights_accuracy.py
+    python insights_accuracy.py --survey path/to/survey_results_public.csv --batches 50
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from helpers import SURVEY_PATH, load_survey
+from incremental_insights import PERCENTILES, SALARY_GROUPS, IncrementalInsights
+from plotting_helpers import compute_insights, load_survey_frames
+
+# Statistic column -> quantile, for the rank error
+QUANTILES = {'median': 0.5, 'ConvertedCompYearly': 0.5, **PERCENTILES}
+
+
+def labelled(frame):
+    # Every chart frame has its labels either as its index or as its first column
+    if frame.index.name is not None:
+        return frame
+    return frame.set_index(frame.columns[0])
+
+
+def midrank(values, x):
+    # Fraction of the values below x, counting ties as half
+    return (np.searchsorted(values, x, 'left') + np.searchsorted(values, x, 'right')) / (2 * len(values))
+
+
+def compare(exact, estimated, group_values):
+    """
+    Returns one row per (chart, statistic) with the number of groups and the errors of the estimates.
+    """
+    rows = []
+    for chart, exact_frame in exact.items():
+        exact_frame, estimated_frame = labelled(exact_frame), labelled(estimated[chart])
+
+        missing = exact_frame.index.difference(estimated_frame.index)
+        extra = estimated_frame.index.difference(exact_frame.index)
+        labels = exact_frame.index.intersection(estimated_frame.index)
+
+        for stat in exact_frame.columns:
+            truth = exact_frame.loc[labels, stat].to_numpy(dtype=np.float64)
+            guess = estimated_frame.loc[labels, stat].to_numpy(dtype=np.float64)
+            relative = np.abs(guess - truth) / np.maximum(np.abs(truth), 1e-12)
+            relative = relative[~np.isnan(truth)]
+
+            row = {'chart': chart, 'stat': stat, 'groups': len(labels), 'missing': len(missing) + len(extra),
+                   'max_rel_error': relative.max() if len(relative) else 0.0,
+                   'mean_rel_error': relative.mean() if len(relative) else 0.0, 'max_rank_error': np.nan}
+
+            if chart in group_values and stat in QUANTILES:
+                values = group_values[chart]
+                row['max_rank_error'] = max(abs(midrank(values[label], estimate) - midrank(values[label], value))
+                                            for label, value, estimate in zip(labels, truth, guess))
+            rows.append(row)
+
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the incremental Key Insights aggregates with the exact ones.")
+    parser.add_argument('--survey', default=SURVEY_PATH)
+    parser.add_argument('--batches', type=int, default=10, help="slices the survey is folded in")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    survey = load_survey_frames(args.survey, shared_dir=None)
+    exact = compute_insights(survey)
+    exact_seconds = time.perf_counter() - start
+
+    raw = load_survey(args.survey)
+    engine, fold_seconds = IncrementalInsights(), []
+    for number, rows in enumerate(np.array_split(np.arange(len(raw)), args.batches)):
+        batch = raw.iloc[rows]
+        start = time.perf_counter()
+        engine.fold(batch, str(number))
+        fold_seconds.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    estimated = engine.insights()
+    serve_seconds = time.perf_counter() - start
+
+    # The salaries of every group, sorted, for the rank errors; the UK is shortened as in median_compensation
+    frames = {'final': survey.final, 'usa': survey.usa}
+    group_values = {}
+    for chart, (frame, column) in SALARY_GROUPS.items():
+        groups = frames[frame].groupby(column, observed=True)['ConvertedCompYearly']
+        group_values[chart] = {label: np.sort(values.to_numpy(dtype=np.float64)) for label, values in groups}
+    group_values['median_compensation']['United Kingdom'] = group_values['median_compensation'].get(
+        'United Kingdom of Great Britain and Northern Ireland')
+
+    report = compare(exact, estimated, group_values)
+    with pd.option_context('display.width', 200, 'display.max_rows', None, 'display.float_format', '{:.2e}'.format):
+        print(report.to_string(index=False))
+
+    print(f"\n{len(raw):,} responses in {args.batches} batches")
+    print(f"full recompute (load, preprocess, aggregate)  {exact_seconds:8.3f} s")
+    print(f"fold one batch (mean of {args.batches})             {np.mean(fold_seconds):8.3f} s")
+    print(f"serve the aggregates from the state           {serve_seconds:8.3f} s")
+    print(f"quantile groups beyond the exact buffer: {sum(summary.count > summary.digest.buffer_size for groups in engine.salaries.values() for summary in groups.values())}")
+
+
+if __name__ == '__main__':
+    main()
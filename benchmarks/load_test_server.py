@@ -0,0 +1,123 @@
+"""
+Offline load test for the prediction service in src/server.py.
+
+Requests are driven straight through the ASGI interface in this process, so no sockets or network
+access are needed. Pass --url to hit a running server (e.g. uvicorn on localhost) instead.
+
+Usage (from benchmarks/):
+    python load_test_server.py --requests 5000 --concurrency 64
+    python load_test_server.py --url http://127.0.0.1:8000 --requests 2000 --concurrency 32
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import urllib.request
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from helpers import Age_keys, DevType_keys, EdLevel_keys, Employment_keys, Industry_keys, IcorPM_keys, OrgSize_keys, RemoteWork_keys
+from predictor import WEIGHTS_DIR
+from server import create_app
+
+
+def random_record(rng):
+    return {'Age': rng.choice(Age_keys), 'Employment': rng.choice(Employment_keys), 'RemoteWork': rng.choice(RemoteWork_keys),
+            'EdLevel': rng.choice(EdLevel_keys), 'YearsCodePro': int(rng.integers(0, 51)), 'DevType': rng.choice(DevType_keys),
+            'Industry': rng.choice(Industry_keys), 'OrgSize': rng.choice(OrgSize_keys), 'ICorPM': rng.choice(IcorPM_keys)}
+
+
+async def asgi_post(app, path, payload):
+    body = json.dumps(payload).encode()
+    received = False
+    response = {}
+
+    async def receive():
+        nonlocal received
+        if received:
+            await asyncio.sleep(3600)
+        received = True
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+        else:
+            response['body'] = message.get('body', b'')
+
+    await app({'type': 'http', 'method': 'POST', 'path': path, 'headers': []}, receive, send)
+    return response['status'], json.loads(response['body'])
+
+
+async def http_post(url, path, payload):
+    def post():
+        request = urllib.request.Request(url.rstrip('/') + path, data=json.dumps(payload).encode(),
+                                         headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.loads(response.read())
+
+    return await asyncio.get_running_loop().run_in_executor(None, post)
+
+
+async def run_load_test(post, records, concurrency, path):
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(payload):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            status, _ = await post(path, payload)
+            latencies.append(time.perf_counter() - start)
+            errors += status != 200
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(payload) for payload in records))
+    return time.perf_counter() - start, np.array(latencies), errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the prediction service.")
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--batch-endpoint-size', type=int, default=0,
+                        help="send this many records per /predict/batch call instead of single /predict calls")
+    parser.add_argument('--max-batch-size', type=int, default=256)
+    parser.add_argument('--max-wait-ms', type=float, default=5)
+    parser.add_argument('--weights-dir', default=WEIGHTS_DIR)
+    parser.add_argument('--url', help="base URL of a running server; the in-process app is used when omitted")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.batch_endpoint_size:
+        path = '/predict/batch'
+        payloads = [{'records': [random_record(rng) for _ in range(args.batch_endpoint_size)]} for _ in range(args.requests)]
+    else:
+        path = '/predict'
+        payloads = [random_record(rng) for _ in range(args.requests)]
+
+    app = None
+    if args.url:
+        post = lambda path, payload: http_post(args.url, path, payload)
+    else:
+        app = create_app(args.weights_dir, args.max_batch_size, args.max_wait_ms)
+        post = lambda path, payload: asgi_post(app, path, payload)
+
+    elapsed, latencies, errors = asyncio.run(run_load_test(post, payloads, args.concurrency, path))
+
+    print(f"{len(payloads)} requests to {path} at concurrency {args.concurrency}: {elapsed:.2f}s, "
+          f"{len(payloads) / elapsed:,.0f} req/s, {errors} errors")
+    print(f"latency p50 {np.percentile(latencies, 50) * 1000:.1f} ms, p95 {np.percentile(latencies, 95) * 1000:.1f} ms, "
+          f"p99 {np.percentile(latencies, 99) * 1000:.1f} ms")
+    if app is not None:
+        batcher = app.get_batcher()
+        print(f"{batcher.batches} model calls, {batcher.records / max(batcher.batches, 1):.1f} records per call on average")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+"""
+Synthetic Stack Overflow survey responses for offline benchmarks.
+
+The rows have every column of survey_results_public.csv, in its order: the layout the 2023 schema
+(survey_results_schema.csv) documents, or the header of the real survey when it is on disk. The columns
+the app reads get answers from the real answer lists (helpers' keys, the raw EdLevel and OrgSize answers,
+a realistic mix of countries and currencies, log-normal compensation with about half of it missing).
+The others get answers of a similar length, so parsing costs about the same. Generation is deterministic
+for a seed and written in chunks, so a million rows need little memory.
+
+Usage (from benchmarks/):
+    python synthetic_survey.py --rows 100000 --output data/survey_100000.csv
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from helpers import SURVEY_PATH, Age_keys, DevType_keys, Employment_keys, IcorPM_keys, Industry_keys, OrgSize_keys, RemoteWork_keys
+from helpers import renaming_education_level
+
+# Columns of the 2023 survey_results_public.csv, in file order
+SURVEY_LAYOUT = ['ResponseId', 'Q120', 'MainBranch', 'Age', 'Employment', 'RemoteWork', 'CodingActivities', 'EdLevel',
+                 'LearnCode', 'LearnCodeOnline', 'LearnCodeCoursesCert', 'YearsCode', 'YearsCodePro', 'DevType', 'OrgSize',
+                 'PurchaseInfluence', 'TechList', 'BuyNewTool', 'Country', 'Currency', 'CompTotal',
+                 'LanguageHaveWorkedWith', 'LanguageWantToWorkWith', 'DatabaseHaveWorkedWith', 'DatabaseWantToWorkWith',
+                 'PlatformHaveWorkedWith', 'PlatformWantToWorkWith', 'WebframeHaveWorkedWith', 'WebframeWantToWorkWith',
+                 'MiscTechHaveWorkedWith', 'MiscTechWantToWorkWith', 'ToolsTechHaveWorkedWith', 'ToolsTechWantToWorkWith',
+                 'NEWCollabToolsHaveWorkedWith', 'NEWCollabToolsWantToWorkWith', 'OpSysPersonal use', 'OpSysProfessional use',
+                 'OfficeStackAsyncHaveWorkedWith', 'OfficeStackAsyncWantToWorkWith', 'OfficeStackSyncHaveWorkedWith',
+                 'OfficeStackSyncWantToWorkWith', 'AISearchHaveWorkedWith', 'AISearchWantToWorkWith', 'AIDevHaveWorkedWith',
+                 'AIDevWantToWorkWith', 'NEWSOSites', 'SOVisitFreq', 'SOAccount', 'SOPartFreq', 'SOComm', 'SOAI', 'AISelect',
+                 'AISent', 'AIAcc', 'AIBen', 'AIToolInterested in Using', 'AIToolCurrently Using',
+                 'AIToolNot interested in Using', 'AINextVery different', 'AINextNeither different nor similar',
+                 'AINextSomewhat similar', 'AINextVery similar', 'AINextSomewhat different', 'TBranch', 'ICorPM', 'WorkExp',
+                 'Knowledge_1', 'Knowledge_2', 'Knowledge_3', 'Knowledge_4', 'Knowledge_5', 'Knowledge_6', 'Knowledge_7',
+                 'Knowledge_8', 'Frequency_1', 'Frequency_2', 'Frequency_3', 'TimeSearching', 'TimeAnswering',
+                 'ProfessionalTech', 'Industry', 'SurveyLength', 'SurveyEase', 'ConvertedCompYearly']
+
+# Country: (share of responses, currency, local currency per USD)
+COUNTRIES = {'United States of America': (0.20, 'USD\tUnited States dollar', 1.0),
+             'Germany': (0.08, 'EUR European Euro', 0.92),
+             'India': (0.07, 'INR\tIndian rupee', 83.0),
+             'United Kingdom of Great Britain and Northern Ireland': (0.06, 'GBP\tPound sterling', 0.79),
+             'Canada': (0.04, 'CAD\tCanadian dollar', 1.35),
+             'France': (0.03, 'EUR European Euro', 0.92),
+             'Poland': (0.025, 'PLN\tPolish zloty', 4.0),
+             'Netherlands': (0.02, 'EUR European Euro', 0.92),
+             'Australia': (0.02, 'AUD\tAustralian dollar', 1.5),
+             'Brazil': (0.02, 'BRL\tBrazilian real', 4.9),
+             'Spain': (0.018, 'EUR European Euro', 0.92),
+             'Italy': (0.015, 'EUR European Euro', 0.92),
+             'Sweden': (0.013, 'SEK\tSwedish krona', 10.5),
+             'Switzerland': (0.01, 'CHF\tSwiss franc', 0.88)}
+# The rest of the responses are spread over this many small countries
+OTHER_COUNTRIES = 120
+
+YEARS = ['Less than 1 year'] + [str(year) for year in range(1, 51)] + ['More than 50 years']
+RAW_ORG_SIZES = OrgSize_keys[1:] + ['2 to 9 employees', '10 to 19 employees', "I don't know",
+                                    'Just me - I am a freelancer, sole proprietor, etc.']
+MAIN_BRANCHES = ['I am a developer by profession', 'I am not primarily a developer, but I write code sometimes as part of my work/studies',
+                 'I am learning to code', 'I code primarily as a hobby', 'I used to be a developer by profession, but no longer am']
+AGREEMENT = ['Strongly agree', 'Agree', 'Neither agree nor disagree', 'Disagree', 'Strongly disagree']
+FREQUENCY = ['Never', '1-2 times a week', '3-5 times a week', '6-10 times a week', '10+ times a week']
+LANGUAGES = ['JavaScript', 'HTML/CSS', 'Python', 'SQL', 'TypeScript', 'Bash/Shell (all shells)', 'Java', 'C#', 'C++', 'C', 'PHP',
+             'PowerShell', 'Go', 'Rust', 'Kotlin', 'Ruby', 'Lua', 'Dart', 'Assembly', 'Swift', 'R', 'Visual Basic (.Net)',
+             'MATLAB', 'VBA', 'Groovy', 'Scala', 'Perl', 'GDScript', 'Objective-C', 'Elixir', 'Haskell', 'Delphi']
+DATABASES = ['PostgreSQL', 'MySQL', 'SQLite', 'MongoDB', 'Microsoft SQL Server', 'Redis', 'MariaDB', 'Elasticsearch', 'Oracle',
+             'Dynamodb', 'Firebase Realtime Database', 'Cloud Firestore', 'BigQuery', 'Microsoft Access', 'H2', 'Cosmos DB',
+             'Supabase', 'InfluxDB', 'Cassandra', 'Snowflake', 'Neo4J', 'IBM DB2', 'Solr', 'Firebird', 'Couch DB', 'Clickhouse',
+             'Cockroachdb', 'Couchbase', 'DuckDB', 'Datomic']
+
+# Relative frequency of the answers of the skewed columns, in pool order (the others are uniform)
+DEVTYPE_WEIGHTS = [28, 15, 6, 4, 3, 3, 3, 2, 2, 2, 2, 2, 2, 1, 4] + [10, 2, 0.5, 0.5]
+INDUSTRY_WEIGHTS = [50, 12, 10, 5, 6, 5, 3, 5, 4]
+
+# Share of missing answers of the columns the app reads, among respondents who reported their compensation
+# and among the others (the survey's work questions are mostly skipped together); other columns miss 15%
+MISSING = {'ResponseId': (0.0, 0.0), 'Q120': (0.0, 0.0), 'MainBranch': (0.0, 0.0), 'Country': (0.0, 0.02),
+           'Age': (0.005, 0.01), 'Employment': (0.0, 0.03), 'EdLevel': (0.005, 0.03), 'RemoteWork': (0.0, 0.35),
+           'YearsCode': (0.005, 0.03), 'YearsCodePro': (0.01, 0.5), 'DevType': (0.0, 0.3), 'OrgSize': (0.01, 0.55),
+           'Currency': (0.0, 0.6), 'WorkExp': (0.05, 0.9), 'Industry': (0.08, 0.95), 'ICorPM': (0.05, 0.9),
+           'LanguageHaveWorkedWith': (0.01, 0.03), 'DatabaseHaveWorkedWith': (0.1, 0.25)}
+
+
+def survey_layout(survey_path=SURVEY_PATH):
+    """
+    Returns the columns of survey_results_public.csv: the real file's header when it is on disk (not a
+    Git LFS pointer), SURVEY_LAYOUT otherwise.
+    """
+    if os.path.exists(survey_path):
+        with open(survey_path) as file:
+            header = file.readline()
+        if not header.startswith('version https://git-lfs'):
+            return pd.read_csv(survey_path, nrows=0).columns.tolist()
+    return list(SURVEY_LAYOUT)
+
+
+def option_pool(rng, column, size=40):
+    # Stand-in answers for a column the app does not read, about as long as the real ones
+    return [f"{column[:8]} {number} {'x' * int(length)}" for number, length in enumerate(rng.integers(0, 8, size))]
+
+
+def combinations(rng, options, count=1500, most=8):
+    # Distinct multi-select answers; the survey has a long tail of them, but not one per respondent
+    sizes = rng.integers(1, most + 1, count)
+    return np.array([';'.join(rng.choice(options, min(size, len(options)), replace=False)) for size in sizes], dtype=object)
+
+
+class SurveyGenerator:
+    """
+    Draws synthetic responses chunk by chunk. The answer pools are fixed by the seed, so every chunk (and
+    every size) comes from the same distribution.
+
+    Parameters:
+    - seed (int, optional): Seed of the answer pools and of the responses. Default is 0.
+    - columns (list, optional): Column layout; survey_layout() by default.
+    """
+
+    def __init__(self, seed=0, columns=None):
+        self.seed = seed
+        self.columns = columns or survey_layout()
+        rng = np.random.default_rng(seed)
+
+        other_share = 1 - sum(share for share, _, _ in COUNTRIES.values())
+        self.countries = list(COUNTRIES) + [f"Country {number}" for number in range(OTHER_COUNTRIES)]
+        self.country_shares = np.array([share for share, _, _ in COUNTRIES.values()] + [other_share / OTHER_COUNTRIES] * OTHER_COUNTRIES)
+        self.currencies = np.array([COUNTRIES[country][1] if country in COUNTRIES else 'EUR European Euro' for country in self.countries], dtype=object)
+        self.rates = np.array([COUNTRIES[country][2] if country in COUNTRIES else 1.0 for country in self.countries])
+
+        self.pools = {'MainBranch': np.array(MAIN_BRANCHES, dtype=object),
+                      'Age': np.array(Age_keys + ['Under 18 years old', 'Prefer not to say'], dtype=object),
+                      'Employment': np.array(Employment_keys + ['Student, full-time', 'Not employed, but looking for work',
+                                                                'Retired', 'I prefer not to say'], dtype=object),
+                      'RemoteWork': np.array(RemoteWork_keys, dtype=object),
+                      'EdLevel': np.array(list(renaming_education_level), dtype=object),
+                      'YearsCode': np.array(YEARS, dtype=object), 'YearsCodePro': np.array(YEARS, dtype=object),
+                      'DevType': np.array(DevType_keys + ['Student', 'Academic researcher', 'Blockchain', 'Designer'], dtype=object),
+                      'OrgSize': np.array(RAW_ORG_SIZES, dtype=object),
+                      'Industry': np.array(Industry_keys, dtype=object),
+                      'ICorPM': np.array(IcorPM_keys, dtype=object),
+                      'LanguageHaveWorkedWith': combinations(rng, LANGUAGES),
+                      'DatabaseHaveWorkedWith': combinations(rng, DATABASES, most=5),
+                      'Q120': np.array(['I agree'], dtype=object)}
+
+        self.weights = {'DevType': np.array(DEVTYPE_WEIGHTS) / sum(DEVTYPE_WEIGHTS),
+                        'Industry': np.array(INDUSTRY_WEIGHTS) / sum(INDUSTRY_WEIGHTS)}
+
+        for column in self.columns:
+            if column in self.pools or column in ('ResponseId', 'Country', 'Currency', 'CompTotal', 'ConvertedCompYearly', 'WorkExp'):
+                continue
+            if column.startswith('Knowledge_'):
+                self.pools[column] = np.array(AGREEMENT, dtype=object)
+            elif column.startswith('Frequency_'):
+                self.pools[column] = np.array(FREQUENCY, dtype=object)
+            elif 'WorkedWith' in column or 'WantToWorkWith' in column or column.startswith(('OpSys', 'AITool', 'AINext', 'LearnCode')) \
+                    or column in ('CodingActivities', 'NEWSOSites', 'TechList', 'BuyNewTool', 'AIBen', 'ProfessionalTech'):
+                self.pools[column] = combinations(rng, option_pool(rng, column, 25), count=400, most=3)
+            else:
+                self.pools[column] = np.array(option_pool(rng, column, 6), dtype=object)
+
+    def chunk(self, start, rows):
+        """
+        Returns responses start to start + rows as a DataFrame in the survey's column layout.
+        """
+        rng = np.random.default_rng([self.seed, start])
+
+        country_codes = rng.choice(len(self.countries), rows, p=self.country_shares)
+        compensation = np.round(rng.lognormal(11.4, 0.75, rows) * np.where(country_codes == 0, 1.4, 1.0))
+        compensation[rng.random(rows) < 0.45] = np.nan
+        local = compensation * self.rates[country_codes]
+        # A few respondents report their total in another currency than the one they picked
+        local[rng.random(rows) < 0.05] *= 2.5
+
+        data = {}
+        for column in self.columns:
+            if column == 'ResponseId':
+                data[column] = np.arange(start + 1, start + rows + 1)
+            elif column == 'Country':
+                data[column] = np.array(self.countries, dtype=object)[country_codes]
+            elif column == 'Currency':
+                data[column] = self.currencies[country_codes]
+            elif column == 'CompTotal':
+                data[column] = local
+            elif column == 'ConvertedCompYearly':
+                data[column] = compensation
+            elif column == 'WorkExp':
+                data[column] = rng.integers(0, 50, rows).astype(float)
+            else:
+                pool = self.pools[column]
+                data[column] = pool[rng.choice(len(pool), rows, p=self.weights.get(column))]
+
+        df = pd.DataFrame(data)
+        reported = ~np.isnan(compensation)
+        for column in self.columns:
+            if column in ('CompTotal', 'ConvertedCompYearly'):
+                continue
+            share_reported, share_other = MISSING.get(column, (0.15, 0.15))
+            df.loc[rng.random(rows) < np.where(reported, share_reported, share_other), column] = np.nan
+        df.loc[~reported, 'CompTotal'] = np.nan
+
+        return df
+
+
+def write_survey(path, rows, seed=0, chunk_rows=100000):
+    """
+    Writes rows synthetic responses to path as a survey_results_public.csv lookalike.
+
+    Returns:
+    - str: path.
+    """
+    generator = SurveyGenerator(seed)
+    tmp_path = path + '.tmp'
+    for start in range(0, rows, chunk_rows):
+        generator.chunk(start, min(chunk_rows, rows - start)).to_csv(tmp_path, mode='w' if start == 0 else 'a',
+                                                                     header=start == 0, index=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic survey_results_public.csv.")
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', required=True)
+    args = parser.parse_args()
+
+    write_survey(args.output, args.rows, args.seed)
+    print(f"Wrote {args.rows:,} responses to {args.output} ({os.path.getsize(args.output) / 1e6:.1f} MB)")
+
+
+if __name__ == '__main__':
+    main()
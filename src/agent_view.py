@@ -0,0 +1,212 @@
+"""
+Compact survey view for the chatbot agent.
+
+The pandas agent used to get the whole survey (~84 columns, mostly free-form object columns) and a
+df.head() of it in its prompt. It now gets:
+    - the columns its questions are about (AGENT_COLUMNS), read with the selective loading of
+      helpers.load_survey and cleaned with the same per-row conversions as the Key Insights
+      preprocessing: numeric experience years, the grouped organisation sizes and the short education
+      levels. Every text column, the semicolon-delimited multi-select ones included, is categorical,
+      so string operations run once per distinct answer instead of once per respondent.
+    - a schema summary in place of df.head(): one line per column with its dtype, the survey question
+      (from survey_results_schema.csv when it is available) and pre-aggregated figures (the most
+      common answers, or the median and range of a numeric column). Many questions can be answered
+      from the summary alone, without a tool call.
+
+Every respondent is kept; unlike the Key Insights charts, the agent answers about the whole survey. The
+columns are not: a question about any other column (e.g. the AI tool, office stack or community
+questions) cannot be answered from the view. The prompt says so, and the agent answers that the data is
+not loaded instead of guessing. Add a column to AGENT_COLUMNS (and bump AGENT_VIEW_VERSION) to cover it.
+
+Answers are cached per agent_version: the survey's content hash, AGENT_VIEW_VERSION and a hash of the
+columns and prompts, so changing any of them never serves an answer computed from another view.
+
+Print the view's summary and size (from src/):
+    python agent_view.py
+"""
+import argparse
+import hashlib
+import html
+import re
+
+import pandas as pd
+
+from helpers import SURVEY_PATH, convert_OrgSize_column, convert_YearsCodePro_column, load_survey, renaming_education_level
+from multihot import MultiHotIndex
+
+SCHEMA_PATH = "../stack-overflow-developer-survey-results-2023/survey_results_schema.csv"
+
+# Columns the agent is given, out of the ~84 of survey_results_public.csv
+AGENT_COLUMNS = ['MainBranch', 'Age', 'Employment', 'RemoteWork', 'EdLevel', 'LearnCode', 'YearsCode', 'YearsCodePro',
+                 'DevType', 'OrgSize', 'Country', 'ConvertedCompYearly', 'WorkExp', 'Industry', 'ICorPM',
+                 'LanguageHaveWorkedWith', 'DatabaseHaveWorkedWith', 'PlatformHaveWorkedWith', 'WebframeHaveWorkedWith',
+                 'ToolsTechHaveWorkedWith', 'AISelect', 'AISent']
+
+# Semicolon-delimited multi-select answers
+MULTI_SELECT_COLUMNS = ['Employment', 'LearnCode', 'LanguageHaveWorkedWith', 'DatabaseHaveWorkedWith',
+                        'PlatformHaveWorkedWith', 'WebframeHaveWorkedWith', 'ToolsTechHaveWorkedWith']
+
+NUMERIC_COLUMNS = ['YearsCode', 'YearsCodePro', 'ConvertedCompYearly', 'WorkExp']
+
+AGENT_DTYPES = {column: 'float32' if column in ['ConvertedCompYearly', 'WorkExp'] else 'category'
+                for column in AGENT_COLUMNS}
+
+# Schema version of the shared agent view (see shared_store.py). Bump it when build_agent_view changes.
+AGENT_VIEW_VERSION = 1
+
+# Answers listed per column in the schema summary
+TOP_ANSWERS = 6
+
+AGENT_PREFIX = """You are working with a pandas dataframe in Python named `df`: the answers of the Stack Overflow
+Developer Survey 2023, one row per respondent ({rows:,} rows). Its columns are listed below as
+`name (dtype): question | summary`. Multi-select answers are ';'-separated; count them with
+df[column].str.split(';').explode().value_counts(). Salaries are in ConvertedCompYearly (USD per year).
+Answer from the summary when it already holds the answer; otherwise use the tools. Only the columns below
+were loaded from the survey; when a question needs any other column, say that it is not in the loaded data.
+
+{summary}
+
+You should use the tools below to answer the question posed of you:"""
+
+
+def build_agent_view(df):
+    """
+    Turns the raw survey columns of AGENT_COLUMNS into the agent's view.
+
+    Parameters:
+    - df (pd.DataFrame): Survey responses read with AGENT_COLUMNS (missing columns are skipped).
+
+    Returns:
+    - pd.DataFrame: The view, with categorical text columns and float32 numeric ones.
+    """
+    view = pd.DataFrame(index=df.index)
+    for column in [column for column in AGENT_COLUMNS if column in df.columns]:
+        values = df[column]
+        if column in ['YearsCode', 'YearsCodePro']:
+            values = convert_YearsCodePro_column(values).astype('float32')
+        elif column == 'OrgSize':
+            values = convert_OrgSize_column(values)
+        elif column == 'EdLevel':
+            values = values.map(renaming_education_level)
+        elif column in NUMERIC_COLUMNS:
+            values = values.astype('float32')
+
+        view[column] = values if column in NUMERIC_COLUMNS else values.astype('category')
+
+    return view
+
+
+def load_agent_view(path=SURVEY_PATH):
+    """
+    Reads only the AGENT_COLUMNS present in the survey file and builds the agent's view from them.
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    columns = [column for column in AGENT_COLUMNS if column in header]
+    return build_agent_view(load_survey(path, columns=columns, dtypes=AGENT_DTYPES))
+
+
+def agent_view_dtypes(path=SURVEY_PATH):
+    """
+    Returns the columns and dtypes of the view load_agent_view builds from the survey file at path.
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    return {column: 'float32' if column in NUMERIC_COLUMNS else 'category' for column in AGENT_COLUMNS if column in header}
+
+
+def agent_version(survey_version):
+    """
+    Returns the version the agent's answers are cached under (see answer_cache.py).
+
+    Parameters:
+    - survey_version (str): Content hash of the survey file.
+
+    Returns:
+    - str: survey_version with AGENT_VIEW_VERSION and a hash of AGENT_COLUMNS and the agent's prompts.
+    """
+    from chatbot import prompt_template
+
+    prompts = hashlib.sha256('\n'.join([*AGENT_COLUMNS, AGENT_PREFIX, prompt_template]).encode()).hexdigest()
+    return f"{survey_version}:agent-view-v{AGENT_VIEW_VERSION}:{prompts[:16]}"
+
+
+def read_schema(path=SCHEMA_PATH):
+    """
+    Reads the question text of every column from survey_results_schema.csv.
+
+    Returns:
+    - dict: qname -> question (plain text), or an empty dict when the file is missing or not the CSV
+    (e.g. a Git LFS pointer).
+    """
+    try:
+        schema = pd.read_csv(path, usecols=['qname', 'question'], dtype=str)
+    except (OSError, ValueError):
+        return {}
+
+    return {qname: re.sub(r'\s+', ' ', html.unescape(re.sub(r'<[^>]+>', ' ', question))).strip()
+            for qname, question in zip(schema['qname'], schema['question']) if isinstance(question, str)}
+
+
+def column_question(column, schema):
+    # Multi-select questions are listed once (e.g. 'Language') for their HaveWorkedWith/WantToWorkWith columns
+    if column in schema:
+        return schema[column]
+    prefixes = [qname for qname in schema if column.startswith(qname)]
+    return schema[max(prefixes, key=len)] if prefixes else None
+
+
+def column_summary(values):
+    # Pre-aggregated figures of one column: its most common answers, or the median and range of numbers
+    if values.name in NUMERIC_COLUMNS:
+        if values.notna().sum() == 0:
+            return "no answers"
+        return (f"{values.notna().sum():,} answers, median {values.median():,.1f}, "
+                f"min {values.min():,.1f}, max {values.max():,.1f}")
+
+    if values.name in MULTI_SELECT_COLUMNS:
+        top = MultiHotIndex.from_column(values).top_k(TOP_ANSWERS)
+        counts = zip(top[values.name], top['count'])
+        distinct = "multi-select"
+    else:
+        top = values.value_counts().head(TOP_ANSWERS)
+        counts = zip(top.index, top.values)
+        distinct = f"{values.nunique():,} distinct"
+
+    answers = '; '.join(f"{answer} ({count:,})" for answer, count in counts)
+    return f"{values.notna().sum():,} answers, {distinct}, top: {answers}"
+
+
+def schema_summary(view, schema=None):
+    """
+    Returns the schema summary given to the agent in place of df.head(): one line per column.
+
+    Parameters:
+    - view (pd.DataFrame): The output of build_agent_view.
+    - schema (dict, optional): The output of read_schema. Read from SCHEMA_PATH when not given.
+    """
+    schema = read_schema() if schema is None else schema
+
+    lines = []
+    for column in view.columns:
+        question = column_question(column, schema)
+        question = f"{question} | " if question else ''
+        lines.append(f"- {column} ({view[column].dtype}): {question}{column_summary(view[column])}")
+
+    return '\n'.join(lines)
+
+
+def agent_prefix(view, schema=None):
+    """
+    Returns the agent prompt prefix describing view (see chatbot.build_agent).
+    """
+    return AGENT_PREFIX.format(rows=len(view), summary=schema_summary(view, schema))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Print the agent's survey view summary and its size.")
+    parser.add_argument('--survey', default=SURVEY_PATH)
+    parser.add_argument('--schema', default=SCHEMA_PATH)
+    args = parser.parse_args()
+
+    view = load_agent_view(args.survey)
+    print(agent_prefix(view, read_schema(args.schema)))
+    print(f"\n{len(view):,} rows x {len(view.columns)} columns, {view.memory_usage(deep=True).sum() / 1e6:.1f} MB in memory")
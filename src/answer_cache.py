@@ -0,0 +1,145 @@
+"""
+Persistent cache of chatbot answers.
+
+Answers are stored in a SQLite file keyed on the normalized question text plus the version of the agent
+(agent_view.agent_version: the content hash of the survey, the agent view's version and a hash of its
+columns and prompts), so neither a new survey release nor a new view or prompt serves stale answers. Entries expire after a
+TTL and the least recently used ones are evicted beyond max_entries.
+
+Precompute the predefined sidebar questions (from src/):
+    python answer_cache.py
+    python answer_cache.py --stub   # offline, with a local stub chat model instead of ChatOpenAI
+"""
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from helpers import SURVEY_PATH
+
+ANSWER_CACHE_PATH = "../stack-overflow-developer-survey-results-2023/chat_answers.sqlite"
+
+
+def normalize_query(query):
+    """
+    Lower-cases the question, collapses whitespace and drops trailing punctuation, so trivially
+    different spellings of the same question share a cache entry.
+    """
+    return re.sub(r'\s+', ' ', query.lower()).strip().rstrip('?.! ')
+
+
+class AnswerCache:
+    """
+    SQLite-backed answer cache with TTL expiry, LRU eviction and hit/miss counters.
+
+    Parameters:
+    - path (str): SQLite file to use (':memory:' for a throwaway cache).
+    - dataset_version (str): Version of the survey and agent the answers are computed from (see agent_view.agent_version).
+    - ttl_seconds (float, optional): Age after which an answer is recomputed. Default is 7 days.
+    - max_entries (int, optional): Number of answers kept. Default is 1000.
+    """
+
+    def __init__(self, path, dataset_version, ttl_seconds=7 * 24 * 3600, max_entries=1000):
+        self.dataset_version = dataset_version
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        # Streamlit serves sessions from several threads, so share one connection behind a lock.
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS answers (
+                                       key TEXT PRIMARY KEY, query TEXT, dataset_version TEXT, answer TEXT,
+                                       created_at REAL, last_used REAL)""")
+        self.connection.commit()
+
+    def key(self, query):
+        return hashlib.sha256(f"{self.dataset_version}\n{normalize_query(query)}".encode()).hexdigest()
+
+    def get(self, query):
+        """
+        Returns the cached answer to query, or None if there is no fresh one.
+        """
+        key, now = self.key(query), time.time()
+
+        with self.lock:
+            row = self.connection.execute("SELECT answer, created_at FROM answers WHERE key = ?", (key,)).fetchone()
+
+            if row is None or now - row[1] > self.ttl_seconds:
+                if row is not None:
+                    self.connection.execute("DELETE FROM answers WHERE key = ?", (key,))
+                    self.connection.commit()
+                self.misses += 1
+                return None
+
+            self.connection.execute("UPDATE answers SET last_used = ? WHERE key = ?", (now, key))
+            self.connection.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, query, answer):
+        now = time.time()
+
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?)",
+                                    (self.key(query), normalize_query(query), self.dataset_version, answer, now, now))
+            # Evict the least recently used answers beyond max_entries
+            self.connection.execute("""DELETE FROM answers WHERE key NOT IN (
+                                           SELECT key FROM answers ORDER BY last_used DESC LIMIT ?)""", (self.max_entries,))
+            self.connection.commit()
+
+    def get_or_compute(self, query, compute):
+        """
+        Returns the cached answer to query, calling compute() and caching its result on a miss.
+        """
+        answer = self.get(query)
+        if answer is None:
+            answer = compute()
+            self.put(query, answer)
+        return answer
+
+    def stats(self):
+        with self.lock:
+            entries = self.connection.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries,
+                'hit_rate': self.hits / lookups if lookups else 0.0}
+
+
+def precompute_answers(cache, agent, questions):
+    """
+    Answers every question in questions that is not already cached.
+    """
+    from chatbot import ask_agent
+
+    for question in questions:
+        start = time.perf_counter()
+        cache.get_or_compute(question, lambda: ask_agent(agent, question))
+        print(f"{time.perf_counter() - start:6.2f}s  {question}")
+
+
+if __name__ == '__main__':
+    from agent_view import agent_prefix, agent_version, load_agent_view
+    from chatbot import build_agent, predefined_questions, stub_chat_model
+    from plotting_helpers import file_content_hash
+
+    parser = argparse.ArgumentParser(description="Precompute chatbot answers for the predefined questions.")
+    parser.add_argument('--survey', default=SURVEY_PATH)
+    parser.add_argument('--cache', default=ANSWER_CACHE_PATH)
+    parser.add_argument('--stub', action='store_true', help="use a local stub chat model instead of ChatOpenAI")
+    args = parser.parse_args()
+
+    if args.stub:
+        chat = stub_chat_model()
+    else:
+        from langchain_openai import ChatOpenAI
+        chat = ChatOpenAI(model_name='gpt-4-0613', temperature=0.2, api_key=os.environ['OPENAI_API_KEY'])
+
+    cache = AnswerCache(args.cache, agent_version(file_content_hash(args.survey)))
+    view = load_agent_view(args.survey)
+    precompute_answers(cache, build_agent(chat, view, prefix=agent_prefix(view)), predefined_questions)
+    print(cache.stats())
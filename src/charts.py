@@ -0,0 +1,155 @@
+"""
+Figures of the Key Insights tab, built from the aggregates of plotting_helpers.compute_insights.
+
+Only the app's Key Insights tab and the benchmarks import this module, so plotly is loaded on first use.
+"""
+import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+
+from figure_cache import figure_to_json
+from instrumentation import span
+
+
+def eda_chart(level, insights):
+    """
+    Builds the figure of one Key Insights chart.
+
+    Parameters:
+    - level (int): The chart number, 1 to 8, in the order of plotting_helpers.INSIGHT_NAMES.
+    - insights (dict): Aggregate DataFrames keyed by the names in INSIGHT_NAMES.
+
+    Returns:
+    - plotly.graph_objects.Figure: The chart.
+    """
+    if level == 1:
+        sorted_df = insights['survey_responses_count']
+
+        fig = px.bar(sorted_df, x='count', y='Country', color='Country', labels={'count': 'Number of Survey Responses'}, orientation='h')
+        fig.update_layout(yaxis={'categoryorder':'total ascending'}, showlegend=False)
+
+        return fig
+
+    if level == 2:
+        salary_stats_df = insights['median_compensation']
+
+        fig = px.bar(salary_stats_df,  y=salary_stats_df.index, x='median', labels={'median': 'Median Compensation (USD)'},
+                color='median', orientation='h', color_continuous_scale=px.colors.qualitative.Set1) 
+        fig.update_layout(yaxis={'categoryorder':'total ascending'}, showlegend=False)
+
+        return fig
+    
+    if level == 3:
+        # Top 20 databases by usage count
+        top20_dbs_counts = insights['top_databases']
+        dbs, counts = top20_dbs_counts['DatabaseHaveWorkedWith'].tolist(), top20_dbs_counts['count'].tolist()
+
+        vibrant_colors = [
+            '#e6194B', '#3cb44b', '#ffe119', '#4363d8', '#f58231', '#911eb4', '#46f0f0', '#f032e6', '#bcf60c', '#fabebe', 
+            '#008080', '#e6beff', '#9a6324', '#fffac8', '#800000', '#aaffc3', '#808000', '#ffd8b1', '#000075', '#808080'
+        ]
+
+        fig = go.Figure(data=[go.Bar(y=dbs, x=counts, orientation='h', marker_color=vibrant_colors 
+        )])
+
+        fig.update_layout( xaxis_title="Usage Count", yaxis_title="Databases",
+            yaxis={'categoryorder':'total ascending'}, height=500 
+        )
+
+        return fig
+    
+    if level == 4:
+        # Top 20 languages by usage count
+        top20_languages_counts = insights['top_languages']
+        languages, counts = top20_languages_counts['LanguageHaveWorkedWith'].tolist(), top20_languages_counts['count'].tolist()
+
+        vibrant_colors = ['#17bebb', '#ff6f61','#6b5b95', '#88b04b', '#f7cac9', '#92a8d1', '#955251', '#b565a7', '#009B77',
+                          '#DD4124', '#D65076', '#45B8AC', '#EFC050', '#5B5EA6', '#9B2335', '#e6194B', '#3cb44b', '#ffe119',
+                          '#4363d8', '#f58231' ] 
+
+        fig = go.Figure(data=[go.Bar(y=languages, x=counts, orientation='h', marker_color=vibrant_colors 
+        )])
+
+        fig.update_layout( xaxis_title="Usage Count", yaxis_title="Languages",
+            yaxis={'categoryorder':'total ascending'}, height=500 
+        )
+
+        return fig
+    
+    if level == 5:
+        dev_type_df = insights['dev_type']
+
+        fig = px.bar(dev_type_df, y='DevType', x='ConvertedCompYearly', color='DevType', 
+                     labels={'ConvertedCompYearly': 'Median Salary (USD)', 'DevType': 'Developer Type'}, orientation='h',height=550,
+                    color_continuous_scale=px.colors.qualitative.Set2)  
+
+        fig.update_layout(yaxis={'categoryorder':'total ascending'}, showlegend=False, xaxis_title='Median Salary (USD)',
+                        margin=dict(l=20, r=20, t=30, b=20))
+        return fig
+    
+    if level == 6:
+        industry_df = insights['industry_salaries']
+
+        fig = px.bar(industry_df, y='Industry', x='ConvertedCompYearly', color='Industry',  
+            labels={'ConvertedCompYearly': 'Median Salary (USD)', 'Industry': 'Industry'}, orientation='h',
+            height = 500, color_continuous_scale=px.colors.qualitative.Set3)  
+
+        fig.update_layout(yaxis={'categoryorder':'total ascending'}, showlegend=False)
+        return fig
+    
+    if level == 7:
+        salary_stats = insights['years_WorkExp']
+
+        fig = go.Figure()
+        fig.add_trace(go.Scatter(x=salary_stats['WorkExp'], y=salary_stats['median'], mode='lines+markers',
+                                name='Median Salary', line=dict(color='royalblue')))
+
+        lower_bound = np.maximum(salary_stats['median'] - salary_stats['std'], 0)
+
+        fig.add_trace(go.Scatter(x=salary_stats['WorkExp'], y=salary_stats['median'] + salary_stats['std'],
+                                mode='lines', name='Upper Bound', marker=dict(color="#444"),
+                                line=dict(width=0), showlegend=False))
+
+        fig.add_trace(go.Scatter(x=salary_stats['WorkExp'], y=lower_bound, mode='lines', name='Lower Bound',
+                                marker=dict(color="#444"), line=dict(width=0),
+                                fillcolor='rgba(68, 68, 68, 0.3)',fill='tonexty',showlegend=False))
+
+        fig.update_layout(xaxis_title='Years of Work Experience',
+                        yaxis_title='Median Salary (Yearly)',
+                        hovermode="x", height = 400)
+        
+        return fig 
+    
+    if level == 8:
+        median_salary_by_edlevel_sorted = insights['median_salary_Ed_Level']
+
+        fig = go.Figure()
+        fig = px.bar(median_salary_by_edlevel_sorted, y='EdLevel', x='ConvertedCompYearly', color='EdLevel',  
+                    labels={'ConvertedCompYearly': 'Median Salary (Yearly)', 'EdLevel': 'Education Level'},
+                    orientation='h', height=400)  
+
+        fig.update_layout(yaxis={'categoryorder':'total ascending'},  
+                        coloraxis_colorbar=dict(title='Median Salary'))
+        
+        return fig
+
+
+def eda_chart_json(level, insights):
+    """
+    Builds one Key Insights chart and returns it serialised (see figure_cache.py). This is the task the
+    app runs on its chart pool; it only reads the aggregates it is given and touches no Streamlit state.
+    """
+    with span('plot_eda_charts', level=level):
+        return figure_to_json(eda_chart(level, insights))
+
+
+def warm_up():
+    """
+    Builds one small figure of every kind the charts use. plotly imports its validators and JSON engine on
+    first use; doing that once here, on one thread, keeps concurrent first builds from racing on those imports.
+    """
+    fig = px.bar(x=[1], y=['warm up'], color=['warm up'], orientation='h', color_continuous_scale=px.colors.qualitative.Set1)
+    fig.add_trace(go.Bar(y=['warm up'], x=[1], orientation='h', marker_color=['#17bebb']))
+    fig.add_trace(go.Scatter(x=[1], y=[1], mode='lines+markers', line=dict(color='royalblue'), fill='tonexty'))
+    fig.update_layout(yaxis={'categoryorder': 'total ascending'}, coloraxis_colorbar=dict(title='warm up'))
+    figure_to_json(fig)
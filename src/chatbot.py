@@ -0,0 +1,62 @@
+# langchain is imported inside the functions, so the question list can be shown without paying for it.
+
+# Questions offered in the sidebar of the Chatbot tab
+predefined_questions = ["What are the most popular programming languages in 2023 according to the StackOverflow survey?",
+    "Which cloud platforms were mostly used by developers in 2023?",
+    "What are the most common educational backgrounds for developers in 2023?",
+    "Which profession is rewarding to choose for a person having an I.T. background?",
+    "What was the median salary of Data Scientists in the IT field in USA?",
+    "What was the median annual salary for Data Scientists in the IT sector in the United States, including a breakdown by Education level?"]
+
+prompt_template = """Given the following dataframe and a question, generate an answer only based on the passed dataframe. 
+                    In case if you're unable to find it, go to this link "https://survey.stackoverflow.co/2023/" to figure out the answer.
+                    If the answer is not found, kindly state "Sorry, I don't know." Don't try to make up an answer.
+                    QUERY: {query}"""
+
+
+def build_agent(chat, df, prefix=None):
+    """
+    Creates the pandas dataframe agent that answers questions about df with the given chat model.
+
+    Parameters:
+    - chat: The chat model.
+    - df (pd.DataFrame): The dataframe the agent's python tool works on.
+    - prefix (str, optional): Prompt describing df (see agent_view.agent_prefix). When given, it replaces
+    the default prompt and df.head() is left out of the prompt.
+    """
+    from langchain_experimental.agents.agent_toolkits import create_pandas_dataframe_agent
+
+    if prefix is None:
+        return create_pandas_dataframe_agent(chat, df, verbose=True)
+    return create_pandas_dataframe_agent(chat, df, prefix=prefix, include_df_in_prompt=False, verbose=True)
+
+
+def ask_agent(agent, query):
+    """
+    Runs one question through the agent and returns the text of its answer.
+    """
+    from langchain.prompts import ChatPromptTemplate
+
+    from instrumentation import is_enabled, langchain_callback, span
+
+    final_prompt = ChatPromptTemplate.from_template(template=prompt_template).format_messages(query=query)
+    # With instrumentation on, the LLM round trips, token usage and tool calls of the run are counted too
+    config = {'callbacks': [langchain_callback()]} if is_enabled() else None
+    with span('agent_invoke'):
+        response = agent.invoke(final_prompt, config=config)
+
+    return response['output']
+
+
+def stub_chat_model(answers=None):
+    """
+    A local chat model that replies with canned final answers, for running the chatbot offline
+    (no OPENAI_API_KEY or network access).
+
+    Parameters:
+    - answers (list, optional): Answers returned in turn. Default is a single placeholder answer.
+    """
+    from langchain_community.chat_models.fake import FakeListChatModel
+
+    answers = answers or ["This is a stub answer."]
+    return FakeListChatModel(responses=[f"Final Answer: {answer}" for answer in answers])
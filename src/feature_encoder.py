@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+
+from helpers import FEATURE_ORDER
+
+
+class FeatureEncoder:
+    """
+    perform_encoding compiled into flat lookup tables.
+
+    The fitted LabelEncoders and the EdLevel ordinal map are turned into one dict (for single records)
+    and one array of known labels (for batches) per column, once. Records are then encoded straight into
+    a contiguous float32 array with the columns in FEATURE_ORDER, which is the dtype the tree models of
+    the hybrid classifier convert their input to anyway.
+
+    Parameters:
+    - encoders (dict): Fitted LabelEncoders keyed by column.
+    - education_level_map (dict): Ordinal mapping for EdLevel.
+    """
+
+    def __init__(self, encoders, education_level_map):
+        # Label -> code for every categorical column; YearsCodePro (numeric) has no table.
+        self.tables = {column: {label: code for code, label in enumerate(encoder.classes_)}
+                       for column, encoder in encoders.items()}
+        self.tables['EdLevel'] = dict(education_level_map)
+
+        self.layout = [(position, column, self.tables.get(column)) for position, column in enumerate(FEATURE_ORDER)]
+
+        # For batches: the known labels of each column and the code of each of them
+        self.labels = {column: pd.Index(list(table)) for column, table in self.tables.items()}
+        self.codes = {column: np.fromiter(table.values(), dtype=np.float32, count=len(table))
+                      for column, table in self.tables.items()}
+
+    def unseen_error(self, column, values):
+        return ValueError(f"{column} contains previously unseen labels: {sorted(set(map(str, values)))}")
+
+    def encode_one(self, features, out=None):
+        """
+        Encodes a single respondent.
+
+        Parameters:
+        - features (dict): Raw feature values keyed by column, e.g. {'Age': '25-34 years old', ...}.
+        - out (np.ndarray, optional): float32 array of len(FEATURE_ORDER) values to fill. Allocated when not given.
+
+        Returns:
+        - np.ndarray: The encoded features, shape (1, len(FEATURE_ORDER)).
+
+        Raises:
+        - ValueError: If a value is not a label seen in training.
+        """
+        if out is None:
+            out = np.empty((1, len(FEATURE_ORDER)), dtype=np.float32)
+        row = out.reshape(-1)
+
+        for position, column, table in self.layout:
+            value = features[column]
+            if table is None:
+                row[position] = value
+            elif value in table:
+                row[position] = table[value]
+            else:
+                raise self.unseen_error(column, [value])
+
+        return out
+
+    def encode_many(self, input_features, out=None):
+        """
+        Encodes a batch of respondents.
+
+        Parameters:
+        - input_features (dict or pd.DataFrame): Raw feature values with one list entry (or row) per respondent.
+        - out (np.ndarray, optional): float32 array of shape (n, len(FEATURE_ORDER)) to fill. Allocated when not given.
+
+        Returns:
+        - np.ndarray: The encoded features, shape (n, len(FEATURE_ORDER)), same values as perform_encoding.
+
+        Raises:
+        - ValueError: If a column contains labels not seen in training.
+        """
+        columns = {column: np.asarray(input_features[column], dtype=object if column in self.tables else np.float32)
+                   for column in FEATURE_ORDER}
+        n = len(columns[FEATURE_ORDER[0]])
+
+        if out is None:
+            out = np.empty((n, len(FEATURE_ORDER)), dtype=np.float32)
+
+        for position, column, table in self.layout:
+            values = columns[column]
+            if table is None:
+                out[:, position] = values
+                continue
+
+            # Look up each distinct value once, then gather
+            row_codes, uniques = pd.factorize(values)
+            positions = self.labels[column].get_indexer(uniques)
+            if (positions == -1).any() or (row_codes == -1).any():
+                raise self.unseen_error(column, [value for value, found in zip(uniques, positions) if found == -1]
+                                        + ([None] if (row_codes == -1).any() else []))
+            out[:, position] = self.codes[column][positions][row_codes]
+
+        return out
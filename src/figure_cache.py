@@ -0,0 +1,183 @@
+"""
+Process-wide cache of the finished Key Insights charts.
+
+st.plotly_chart turns every figure it is given into a dict, validates it and serialises it to JSON on
+every rerun, on top of the figure having been built. The charts only change with the insights they
+are drawn from, so this module keeps the serialised figure (the exact JSON st.plotly_chart would
+send) per (insights version, theme, level) in a bounded LRU, and hands that JSON straight to the
+frontend. A rerun with a warm cache builds no plotly figures at all.
+
+Handing the JSON over relies on Streamlit internals (the PlotlyChart proto and DeltaGenerator._enqueue),
+so it is only done on the Streamlit releases it was checked against (PROTO_STREAMLIT_VERSIONS). On any
+other release the cached JSON is turned back into a figure and shown with the public st.plotly_chart.
+
+For a lightweight mode the charts can also be served as static PNG images, rendered once per cache
+entry. Rendering needs the optional kaleido package; without it the interactive chart is shown.
+"""
+import json
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from instrumentation import count
+
+logger = logging.getLogger(__name__)
+
+FIGURE_CACHE_SIZE = 32
+
+# What st.plotly_chart sends as the chart config when none is given
+PLOTLY_CONFIG = json.dumps({'showLink': False, 'linkText': False})
+
+# Streamlit releases whose PlotlyChart proto layout plotly_chart_from_json fills in
+PROTO_STREAMLIT_VERSIONS = ('1.31.',)
+
+# Plotly template of the static images for each Streamlit theme
+IMAGE_TEMPLATES = {'light': 'plotly_white', 'dark': 'plotly_dark'}
+
+
+class FigureCache:
+    """
+    LRU of serialised figures, and of their static images, shared by every session of the process.
+
+    Parameters:
+    - max_entries (int, optional): Figures kept before the least recently used is dropped. Default is 32.
+    """
+
+    def __init__(self, max_entries=FIGURE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """
+        Returns the figure JSON cached under key, or None.
+        """
+        entry = self.lookup(key)
+        return entry['spec'] if entry is not None else None
+
+    def put(self, key, spec):
+        """
+        Caches figure JSON under key, keeping an entry already there (and its image), and returns the entry.
+        """
+        with self.lock:
+            entry = self.entries.setdefault(key, {'spec': spec, 'image': None})
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return entry
+
+    def lookup(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        count('figure_cache_lookups', result='hit' if entry is not None else 'miss')
+        return entry
+
+    def entry(self, key, build):
+        # Built outside the lock: two sessions missing the same key at once both build it, but neither
+        # blocks the sessions reading other charts.
+        entry = self.lookup(key)
+        return entry if entry is not None else self.put(key, build())
+
+    def spec(self, key, build):
+        """
+        Returns the figure JSON cached under key, calling build() for it on a miss.
+        """
+        return self.entry(key, build)['spec']
+
+    def image(self, key, build, render):
+        """
+        Returns the static image cached under key, rendering it with render(spec) on first use.
+        Returns None when the image cannot be rendered.
+        """
+        entry = self.entry(key, build)
+        if entry['image'] is None:
+            entry['image'] = render(entry['spec']) or b''
+        return entry['image'] or None
+
+
+def figure_to_json(fig):
+    # Same serialisation as st.plotly_chart, so the cached chart is exactly the one it would send
+    import plotly.io
+
+    return plotly.io.to_json(fig, validate=False)
+
+
+@lru_cache(maxsize=None)
+def can_render_images():
+    try:
+        import kaleido  # noqa: F401
+    except ImportError:
+        logger.warning("Static charts need the kaleido package; showing interactive charts instead")
+        return False
+    return True
+
+
+def render_image(spec, theme='light', width=700):
+    """
+    Renders figure JSON to PNG bytes with the plotly template of the theme.
+
+    Returns:
+    - bytes or None: The image, or None when kaleido is not installed.
+    """
+    if not can_render_images():
+        return None
+
+    import plotly.io
+
+    fig = plotly.io.from_json(spec)
+    fig.update_layout(template=IMAGE_TEMPLATES.get(theme, 'plotly_white'))
+    return plotly.io.to_image(fig, format='png', width=width, height=fig.layout.height or 450)
+
+
+@lru_cache(maxsize=None)
+def can_enqueue_json():
+    import streamlit as st
+
+    if not st.__version__.startswith(PROTO_STREAMLIT_VERSIONS):
+        logger.warning("Streamlit %s is not one of %s; cached charts go through st.plotly_chart",
+                       st.__version__, PROTO_STREAMLIT_VERSIONS)
+        return False
+
+    try:
+        from streamlit.proto.PlotlyChart_pb2 import PlotlyChart as PlotlyChartProto
+    except ImportError:
+        return False
+    return ({'use_container_width', 'figure', 'theme'} <= set(PlotlyChartProto.DESCRIPTOR.fields_by_name)
+            and hasattr(st._main, '_enqueue'))
+
+
+def plotly_chart_from_json(spec, use_container_width=True, theme='streamlit', container=None):
+    """
+    Adds a Plotly chart to container (an st.empty placeholder, a column, ...) or else the current
+    Streamlit container from its serialised figure, the way st.plotly_chart does after building and
+    serialising the figure itself. On Streamlit releases other than PROTO_STREAMLIT_VERSIONS the figure
+    is rebuilt from the JSON and passed to st.plotly_chart.
+    """
+    import streamlit as st
+
+    if not can_enqueue_json():
+        import plotly.io
+
+        return (container or st).plotly_chart(plotly.io.from_json(spec, skip_invalid=True),
+                                              use_container_width=use_container_width, theme=theme)
+
+    from streamlit.proto.PlotlyChart_pb2 import PlotlyChart as PlotlyChartProto
+
+    proto = PlotlyChartProto()
+    proto.use_container_width = use_container_width
+    proto.figure.spec = spec
+    proto.figure.config = PLOTLY_CONFIG
+    proto.theme = theme or ''
+
+    return (container or st._main)._enqueue('plotly_chart', proto)
@@ -1,6 +1,27 @@
+import logging
 import pickle
+import time
+import numpy as np
 import pandas as pd
 
+from instrumentation import timed
+
+logger = logging.getLogger(__name__)
+
+SURVEY_PATH = "../stack-overflow-developer-survey-results-2023/survey_results_public.csv"
+
+# Columns of survey_results_public.csv used by the app and the preprocessing script (out of ~84).
+SURVEY_COLUMNS = ['MainBranch', 'Age', 'Employment', 'RemoteWork', 'EdLevel', 'YearsCode', 'YearsCodePro', 'DevType',
+                  'Country', 'CompTotal', 'ConvertedCompYearly', 'WorkExp', 'Industry', 'Currency', 'OrgSize', 'ICorPM',
+                  'LanguageHaveWorkedWith', 'DatabaseHaveWorkedWith']
+
+# Low-cardinality answers are read as categoricals and numeric answers as float32. The semicolon
+# delimited multi-select columns have too many distinct combinations to benefit and stay as objects.
+SURVEY_DTYPES = {'MainBranch': 'category', 'Age': 'category', 'Employment': 'category', 'RemoteWork': 'category',
+                 'EdLevel': 'category', 'YearsCode': 'category', 'YearsCodePro': 'category', 'DevType': 'category',
+                 'Country': 'category', 'Industry': 'category', 'Currency': 'category', 'OrgSize': 'category',
+                 'ICorPM': 'category', 'CompTotal': 'float32', 'ConvertedCompYearly': 'float32', 'WorkExp': 'float32'}
+
 renaming_education_level = {'Bachelor’s degree (B.A., B.S., B.Eng., etc.)' : 'Bachelors',
        'Master’s degree (M.A., M.S., M.Eng., MBA, etc.)' : 'Masters',
        'Some college/university study without earning a degree' : 'Some College',
@@ -22,7 +43,7 @@ DevType_keys = ['Developer, full-stack', 'Developer, back-end', 'Developer, fron
                 'Data scientist or machine learning specialist','Research & Development role',
                 'Engineer, site reliability', 'Other (please specify):']
 
-EdLevel_keys = ["Primary School", "Secondary School", "Some College", "Associate Degree",
+EdLevel_keys = ["Primary School", "Secondary School", "Some College", "Associate degree",
                                                     "Bachelors", "Masters", "PhD, Postdoc"]
 
 Age_keys = ["18-24 years old","25-34 years old", "35-44 years old", "45-54 years old", "55-64 years old","65 years or older"]
@@ -34,6 +55,9 @@ IcorPM_keys = ["Individual contributor", "People manager"]
 Employment_keys = ["Employed, full-time", "Employed, full-time;Independent contractor, freelancer, or self-employed","Employed, part-time",
                     "Independent contractor, freelancer, or self-employed","Employed, full-time;Employed, part-time"]
 
+# Column layout the hybrid classifier was trained on
+FEATURE_ORDER = ['Age', 'Employment', 'RemoteWork', 'EdLevel', 'YearsCodePro', 'DevType', 'Industry', 'OrgSize', 'ICorPM']
+
 salary_ranges = {
     'Low' : r'40,000 - 105,000',
     'Low-Mid' : r'105,500 - 135,000',
@@ -51,6 +75,34 @@ slider_ranges = {
 }
 
 
+@timed('load_csv')
+def load_survey(path=SURVEY_PATH, columns=SURVEY_COLUMNS, dtypes=SURVEY_DTYPES):
+    """
+    Reads the public survey with only the requested columns and compact dtypes.
+
+    The load time and in-memory size are logged at INFO level.
+
+    Parameters:
+    - path (str, optional): Location of survey_results_public.csv.
+    - columns (list, optional): Columns to read. Default is SURVEY_COLUMNS; None reads every column.
+    - dtypes (dict, optional): Dtype per column. Columns not listed are left to pandas' inference.
+
+    Returns:
+    - pd.DataFrame: The survey responses.
+    """
+    start = time.perf_counter()
+
+    if columns is None:
+        df = pd.read_csv(path, dtype=dtypes)
+    else:
+        df = pd.read_csv(path, usecols=columns, dtype={column: dtypes[column] for column in columns if column in dtypes})
+
+    logger.info("Loaded %s: %d rows x %d columns in %.2fs, %.1f MB in memory", path, len(df), len(df.columns),
+                time.perf_counter() - start, df.memory_usage(deep=True).sum() / 1e6)
+
+    return df
+
+
 # Calculating various statistics (mean, median, min, max, percentiles) for yearly converted compensation grouped by country. 
 def percentile(n):
     def percentile_(x):
@@ -74,12 +126,7 @@ def records_to_consider(column_counts, threshold = 1000):
     Returns:
     - list: A list of entities that meet or exceed the specified threshold.
     """
-    result = []
-    column_list = zip(column_counts.index, column_counts.values)
-    for entity, count in column_list:
-        if count >= threshold:
-            result.append(entity)
-    return result
+    return column_counts.index[column_counts.values >= threshold].tolist()
 
 def convert_YearsCodePro(experience):
     """
@@ -104,6 +151,41 @@ def convert_YearsCodePro(experience):
         return float(experience)
 
 
+def map_unique_values(column, function, dtype):
+    """
+    Applies a per-value function to a column by converting each distinct value only once.
+
+    The column is factorized, function is called on the (few) unique values to build a lookup
+    table, and the table is indexed by the integer codes in one vectorized step.
+
+    Parameters:
+    - column (pd.Series): Values to convert (object or category). NaN stays NaN.
+    - function (callable): The per-value conversion, e.g. convert_YearsCodePro.
+    - dtype (str): dtype of the lookup table and the result.
+
+    Returns:
+    - pd.Series: Same result as column.apply(function) for non-missing values.
+    """
+    codes, uniques = pd.factorize(column)
+    table = np.array([function(value) for value in uniques] + [np.nan], dtype=dtype)
+
+    # Missing values get code -1, which picks the trailing NaN.
+    return pd.Series(table[codes], index=column.index, name=column.name)
+
+
+def convert_YearsCodePro_column(experience):
+    """
+    Vectorized convert_YearsCodePro for a whole column.
+
+    Parameters:
+    - experience (pd.Series): Years of professional coding experience as survey strings (object or category).
+
+    Returns:
+    - pd.Series: float64 values, identical to experience.apply(convert_YearsCodePro).
+    """
+    return map_unique_values(experience, convert_YearsCodePro, 'float64')
+
+
 def convert_OrgSize(size):
     """
     Converts organization size categories into a more generalized category.
@@ -127,27 +209,73 @@ def convert_OrgSize(size):
     return size
 
 
-def perform_encoding(input_features):
+def convert_OrgSize_column(size):
+    """
+    Vectorized convert_OrgSize for a whole column.
+
+    Parameters:
+    - size (pd.Series): Organization size answers (object or category).
+
+    Returns:
+    - pd.Series: The same values as size.apply(convert_OrgSize); categorical input stays categorical.
+    """
+    converted = map_unique_values(size, convert_OrgSize, 'object')
+    return converted.astype('category') if isinstance(size.dtype, pd.CategoricalDtype) else converted
+
+
+def encode_label_column(values, encoder):
+    """
+    Vectorized equivalent of LabelEncoder.transform for a whole column.
+
+    Parameters:
+    - values (pd.Series): Raw category values.
+    - encoder (LabelEncoder): A fitted encoder whose classes_ define the codes.
+
+    Returns:
+    - np.ndarray: Integer codes identical to encoder.transform(values).
+
+    Raises:
+    - ValueError: If values contains categories the encoder has not seen.
+    """
+    codes = pd.Categorical(values, categories=encoder.classes_).codes
+    if (codes == -1).any():
+        unseen = sorted(set(pd.Series(values)[codes == -1].astype(str)))
+        raise ValueError(f"{values.name} contains previously unseen labels: {unseen}")
+    return codes.astype('int64')
+
+
+@timed('perform_encoding')
+def perform_encoding(input_features, encoders=None, education_level_map=None):
+    """
+    Encodes raw input features into the numeric layout expected by the hybrid classifier.
+
+    Parameters:
+    - input_features (dict or pd.DataFrame): Raw feature values, one list entry (or row) per respondent.
+    - encoders (dict, optional): Fitted LabelEncoders keyed by column. Loaded from disk when not given.
+    - education_level_map (dict, optional): Ordinal mapping for EdLevel. Loaded from disk when not given.
+
+    Returns:
+    - pd.DataFrame: Encoded features ordered as FEATURE_ORDER.
+    """
     # Load the encoders
-    with open('../saved_weights/encoders.pkl', 'rb') as file:
-        encoders = pickle.load(file)
+    if encoders is None:
+        with open('../saved_weights/encoders.pkl', 'rb') as file:
+            encoders = pickle.load(file)
 
     # Load the mappings
-    with open('../saved_weights/education_level_map.pkl', 'rb') as file:
-        education_level_map = pickle.load(file)
+    if education_level_map is None:
+        with open('../saved_weights/education_level_map.pkl', 'rb') as file:
+            education_level_map = pickle.load(file)
 
-    # Convert input features to DataFrame
-    input_df = pd.DataFrame(input_features)
+    # Convert input features to DataFrame, keeping only the model's columns
+    input_df = pd.DataFrame(input_features)[FEATURE_ORDER].copy()
     
-    # Apply LabelEncoders to categorical columns
+    # Apply LabelEncoders to categorical columns, one vectorized pass per column
     for column, encoder in encoders.items():
-        input_df[column] = encoder.transform(input_df[column])
+        input_df[column] = encode_label_column(input_df[column], encoder)
     
     # Map ordinal values directly
     input_df['EdLevel'] = input_df['EdLevel'].map(education_level_map)
 
     # Return processed DataFrame ready for model input
-    desired_order = ['Age', 'Employment', 'RemoteWork', 'EdLevel', 'YearsCodePro', 'DevType', 'Industry', 'OrgSize', 'ICorPM']
-    input_df = input_df[desired_order]
-
-    return input_df
\ No newline at end of file
+    return input_df
@@ -0,0 +1,409 @@
+"""
+Incrementally maintained Key Insights aggregates.
+
+Instead of recomputing every chart from the full survey, a batch of new responses (in the
+survey_results_public.csv schema) is folded into mergeable per-group state:
+    - exact counts: responses per country, and selections per language / database and country
+    - exact count, mean, min, max and standard deviation (Welford / Chan) of ConvertedCompYearly per group
+    - a t-digest of ConvertedCompYearly per group for the median and the percentiles
+
+Every preprocessing step looks at one row at a time except the country shortlist (countries with at
+least 1000 responses), so the state keeps every country and the shortlist is applied when the charts are
+served. The aggregates have the shapes of plotting_helpers.compute_insights and are written to the
+Key Insights store (see insights_store.py), which the app reloads when it changes.
+
+The state records the content hash of every batch folded into it, and a batch already there is
+refused, so re-running an append (or naming a file twice) cannot count its responses twice.
+
+A t-digest keeps its values exactly until it holds more than buffer_size of them; medians and percentiles
+of smaller groups are then the same as pandas'. Run benchmarks/insights_accuracy.py for the error on the
+larger ones.
+
+Usage (from src/):
+    python incremental_insights.py init --survey ../stack-overflow-developer-survey-results-2023/survey_results_public.csv
+    python incremental_insights.py append --batch pulse_responses.csv
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from helpers import SURVEY_PATH, load_survey, records_to_consider
+from insights_store import INSIGHTS_PATH, write_insights
+from multihot import MultiHotIndex
+from plotting_helpers import INSIGHT_NAMES, file_content_hash, process_usa_data, select_complete_records
+
+STATE_PATH = "../stack-overflow-developer-survey-results-2023/key_insights_state.json"
+STATE_FORMAT = 1
+
+USA = 'United States of America'
+
+# Salary aggregates: chart -> (frame the chart is computed from, group column)
+SALARY_GROUPS = {'median_compensation': ('final', 'Country'), 'dev_type': ('usa', 'DevType'),
+                 'industry_salaries': ('usa', 'Industry'), 'years_WorkExp': ('usa', 'WorkExp'),
+                 'median_salary_Ed_Level': ('usa', 'EdLevel')}
+
+# Multi-select aggregates: chart -> column
+SELECTION_COLUMNS = {'top_databases': 'DatabaseHaveWorkedWith', 'top_languages': 'LanguageHaveWorkedWith'}
+
+# Percentiles of the median_compensation chart, as named by helpers.percentile
+PERCENTILES = {'percentile_25': 0.25, 'percentile_75': 0.75, 'percentile_90': 0.90, 'percentile_99': 0.99}
+
+
+class TDigest:
+    """
+    Mergeable t-digest of a distribution: sorted centroids (mean, weight) that are small in the tails and
+    larger around the median.
+
+    Parameters:
+    - compression (int, optional): Size parameter of the k1 (arcsine) scale; about compression / 2 centroids
+      remain after a compression. Default is 1000.
+    - buffer_size (int, optional): Centroids kept before compressing. Default is 2000.
+    """
+
+    def __init__(self, compression=1000, buffer_size=2000):
+        self.compression = compression
+        self.buffer_size = buffer_size
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+
+    @property
+    def count(self):
+        return float(self.weights.sum())
+
+    def add(self, values, weights=None):
+        values = np.asarray(values, dtype=np.float64)
+        weights = np.ones(len(values)) if weights is None else np.asarray(weights, dtype=np.float64)
+
+        self.means = np.concatenate([self.means, values])
+        self.weights = np.concatenate([self.weights, weights])
+        if len(self.means) > self.buffer_size:
+            self.compress()
+
+    def merge(self, other):
+        self.add(other.means, other.weights)
+
+    def sort(self):
+        order = np.argsort(self.means, kind='stable')
+        self.means, self.weights = self.means[order], self.weights[order]
+
+    def compress(self):
+        self.sort()
+        total = self.weights.sum()
+
+        # Centroids whose middle falls in the same unit of the k1 scale are merged
+        q = (np.cumsum(self.weights) - self.weights / 2) / total
+        k = np.floor(self.compression / (2 * np.pi) * np.arcsin(2 * q - 1))
+        starts = np.flatnonzero(np.r_[True, k[1:] != k[:-1]])
+
+        weights = np.add.reduceat(self.weights, starts)
+        self.means = np.add.reduceat(self.means * self.weights, starts) / weights
+        self.weights = weights
+
+    def quantile(self, q, minimum, maximum):
+        """
+        Returns the q-th quantile, interpolated like pandas' default (linear) between the mean ranks of the
+        centroids, and between the exact minimum and maximum at the ends.
+        """
+        self.sort()
+        total = self.weights.sum()
+        if total == 0:
+            return np.nan
+
+        # 0-based mean rank of the values in each centroid; for single values, their rank
+        positions = np.cumsum(self.weights) - self.weights + (self.weights - 1) / 2
+        means = self.means
+        if positions[0] > 0:
+            positions, means = np.r_[0, positions], np.r_[minimum, means]
+        if positions[-1] < total - 1:
+            positions, means = np.r_[positions, total - 1], np.r_[means, maximum]
+
+        return float(np.interp(q * (total - 1), positions, means))
+
+    def to_dict(self):
+        return {'means': self.means.tolist(), 'weights': self.weights.tolist()}
+
+    @classmethod
+    def from_dict(cls, state, **kwargs):
+        digest = cls(**kwargs)
+        digest.means = np.array(state['means'], dtype=np.float64)
+        digest.weights = np.array(state['weights'], dtype=np.float64)
+        return digest
+
+
+class SalarySummary:
+    """
+    Mergeable summary of the salaries of one group: exact count, mean, sum of squared deviations (for the
+    standard deviation), min and max, plus a TDigest for the median and percentiles.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum = np.inf
+        self.maximum = -np.inf
+        self.digest = TDigest()
+
+    def combine(self, count, mean, m2, minimum, maximum):
+        # Chan et al.'s pairwise update of the running mean and sum of squared deviations
+        total = self.count + count
+        delta = mean - self.mean
+        self.m2 += m2 + delta ** 2 * self.count * count / total
+        self.mean += delta * count / total
+        self.count = total
+        self.minimum = min(self.minimum, minimum)
+        self.maximum = max(self.maximum, maximum)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return
+        mean = values.mean()
+        self.combine(len(values), mean, float(((values - mean) ** 2).sum()), values.min(), values.max())
+        self.digest.add(values)
+
+    def merge(self, other):
+        if other.count == 0:
+            return
+        self.combine(other.count, other.mean, other.m2, other.minimum, other.maximum)
+        self.digest.merge(other.digest)
+
+    def std(self):
+        # Sample standard deviation, like pandas (NaN for a single value)
+        return float(np.sqrt(self.m2 / (self.count - 1))) if self.count > 1 else np.nan
+
+    def quantile(self, q):
+        return self.digest.quantile(q, self.minimum, self.maximum)
+
+    def to_dict(self):
+        return {'count': self.count, 'mean': self.mean, 'm2': self.m2, 'min': self.minimum, 'max': self.maximum,
+                'digest': self.digest.to_dict()}
+
+    @classmethod
+    def from_dict(cls, state):
+        summary = cls()
+        summary.count, summary.mean, summary.m2 = state['count'], state['mean'], state['m2']
+        summary.minimum, summary.maximum = state['min'], state['max']
+        summary.digest = TDigest.from_dict(state['digest'])
+        return summary
+
+
+def group_key(value):
+    # Plain Python values, so the state round-trips through JSON (WorkExp groups are floats)
+    return value.item() if isinstance(value, np.generic) else value
+
+
+class IncrementalInsights:
+    """
+    Per-group state behind the Key Insights charts, updated one batch of survey responses at a time.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.rows = 0
+        self.batches = []
+        self.country_counts = Counter()
+        self.salaries = {chart: {} for chart in SALARY_GROUPS}
+        self.selections = {column: {} for column in SELECTION_COLUMNS.values()}
+
+    def fold(self, batch, batch_version=None):
+        """
+        Folds a batch of raw survey responses into the state.
+
+        Parameters:
+        - batch (pd.DataFrame): Rows in the survey_results_public.csv schema (at least helpers.SURVEY_COLUMNS).
+        - batch_version (str, optional): Content hash of the batch, chained into self.version and recorded in
+          self.batches.
+
+        Raises:
+        - ValueError: If a batch with the same content hash has already been folded in.
+        """
+        if batch_version is not None and batch_version in self.batches:
+            raise ValueError(f"Batch {batch_version[:12]} has already been folded into the Key Insights state")
+
+        country_counts = batch['Country'].value_counts()
+        self.country_counts.update({str(country): int(count) for country, count in country_counts.items() if count})
+
+        final = select_complete_records(batch)
+        frames = {'final': final, 'usa': process_usa_data(final)}
+
+        for chart, (frame, column) in SALARY_GROUPS.items():
+            groups = self.salaries[chart]
+            for group, values in frames[frame].groupby(column, observed=True)['ConvertedCompYearly']:
+                groups.setdefault(group_key(group), SalarySummary()).update(values.to_numpy())
+
+        for column, by_country in self.selections.items():
+            counts = MultiHotIndex.from_column(final[column]).segment_counts(final['Country'].astype(str))
+            for country, row in counts.iterrows():
+                by_country.setdefault(country, Counter()).update(row[row > 0].to_dict())
+
+        self.rows += len(batch)
+        if batch_version is not None:
+            self.batches.append(batch_version)
+            # A state holding only the survey has the survey's version, like a store built by insights_store.py
+            if self.version is None:
+                self.version = batch_version
+            else:
+                self.version = hashlib.sha256(f"{self.version}:{batch_version}".encode()).hexdigest()
+
+    def merge(self, other):
+        """
+        Adds the state of other (e.g. built from another shard of responses) into this one.
+
+        Raises:
+        - ValueError: If both states have folded in the same batch.
+        """
+        shared = set(self.batches) & set(other.batches)
+        if shared:
+            raise ValueError(f"Both states hold batches {sorted(batch[:12] for batch in shared)}")
+
+        self.batches += other.batches
+        self.rows += other.rows
+        self.country_counts.update(other.country_counts)
+
+        for chart, groups in other.salaries.items():
+            for group, summary in groups.items():
+                self.salaries[chart].setdefault(group, SalarySummary()).merge(summary)
+
+        for column, by_country in other.selections.items():
+            for country, counts in by_country.items():
+                self.selections[column].setdefault(country, Counter()).update(counts)
+
+        self.version = hashlib.sha256(f"{self.version}:{other.version}".encode()).hexdigest()
+
+    def shortlist(self):
+        return records_to_consider(pd.Series(self.country_counts, dtype='int64'), threshold=1000)
+
+    def salary_groups(self, chart, countries):
+        # median_compensation covers the shortlisted countries; the other salary charts only the USA
+        groups = self.salaries[chart]
+        if SALARY_GROUPS[chart][1] == 'Country':
+            return {group: groups[group] for group in countries if group in groups}
+        return groups if USA in countries else {}
+
+    def insights(self):
+        """
+        Returns every Key Insights aggregate, in the shapes of plotting_helpers.compute_insights.
+        """
+        countries = self.shortlist()
+        insights = {}
+
+        counts = pd.Series({country: self.country_counts[country] for country in countries}, dtype='int64')
+        insights['survey_responses_count'] = pd.DataFrame({'Country': counts.index, 'count': counts.values}).sort_values(
+            by='count', ascending=False)
+
+        groups = self.salary_groups('median_compensation', countries)
+        stats = pd.DataFrame({'mean': [summary.mean for summary in groups.values()],
+                              'median': [summary.quantile(0.5) for summary in groups.values()],
+                              'min': [summary.minimum for summary in groups.values()],
+                              'max': [summary.maximum for summary in groups.values()],
+                              **{name: [summary.quantile(q) for summary in groups.values()] for name, q in PERCENTILES.items()}},
+                             index=pd.Index(list(groups), name='Country'))
+        stats = stats.sort_values(by='median', ascending=False)
+        insights['median_compensation'] = stats.rename(index={'United Kingdom of Great Britain and Northern Ireland': 'United Kingdom'})
+
+        for chart, column in SELECTION_COLUMNS.items():
+            totals = Counter()
+            for country in countries:
+                totals.update(self.selections[column].get(country, {}))
+            top = totals.most_common(20)
+            insights[chart] = pd.DataFrame({column: [item for item, _ in top], 'count': [count for _, count in top]})
+
+        for chart in ['dev_type', 'industry_salaries']:
+            column = SALARY_GROUPS[chart][1]
+            groups = self.salary_groups(chart, countries)
+            medians = pd.DataFrame({column: list(groups), 'ConvertedCompYearly': [summary.quantile(0.5) for summary in groups.values()]})
+            insights[chart] = medians.sort_values(by='ConvertedCompYearly', ascending=False).reset_index(drop=True)
+
+        groups = dict(sorted(self.salary_groups('years_WorkExp', countries).items()))
+        insights['years_WorkExp'] = pd.DataFrame({'WorkExp': list(groups), 'median': [summary.quantile(0.5) for summary in groups.values()],
+                                                  'std': [summary.std() for summary in groups.values()]})
+
+        groups = dict(sorted(self.salary_groups('median_salary_Ed_Level', countries).items()))
+        medians = pd.DataFrame({'EdLevel': list(groups), 'ConvertedCompYearly': [summary.quantile(0.5) for summary in groups.values()]})
+        insights['median_salary_Ed_Level'] = medians.sort_values(by='ConvertedCompYearly', ascending=False)
+
+        return {name: insights[name] for name in INSIGHT_NAMES}
+
+    def to_dict(self):
+        return {'format': STATE_FORMAT, 'version': self.version, 'rows': self.rows, 'batches': self.batches,
+                'country_counts': dict(self.country_counts),
+                'salaries': {chart: [[group, summary.to_dict()] for group, summary in groups.items()]
+                             for chart, groups in self.salaries.items()},
+                'selections': {column: {country: dict(counts) for country, counts in by_country.items()}
+                               for column, by_country in self.selections.items()}}
+
+    @classmethod
+    def from_dict(cls, state):
+        if state.get('format') != STATE_FORMAT:
+            raise ValueError(f"Incremental insights state has format {state.get('format')}, expected {STATE_FORMAT}")
+
+        engine = cls()
+        engine.version, engine.rows = state['version'], state['rows']
+        # States saved before batches were recorded cannot tell which ones they hold
+        engine.batches = state.get('batches', [])
+        engine.country_counts = Counter(state['country_counts'])
+        engine.salaries = {chart: {group: SalarySummary.from_dict(summary) for group, summary in groups}
+                           for chart, groups in state['salaries'].items()}
+        engine.selections = {column: {country: Counter(counts) for country, counts in by_country.items()}
+                             for column, by_country in state['selections'].items()}
+        return engine
+
+
+def save_state(engine, path=STATE_PATH):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump(engine.to_dict(), file)
+    os.replace(tmp_path, path)
+
+
+def load_state(path=STATE_PATH):
+    with open(path) as file:
+        return IncrementalInsights.from_dict(json.load(file))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the Key Insights aggregates incrementally.")
+    parser.add_argument('command', choices=['init', 'append'])
+    parser.add_argument('--survey', default=SURVEY_PATH, help="survey to start from (init)")
+    parser.add_argument('--batch', action='append', default=[], help="CSV of new responses to fold in (append, repeatable)")
+    parser.add_argument('--state', default=STATE_PATH, help="JSON file holding the aggregation state")
+    parser.add_argument('--output', default=INSIGHTS_PATH, help="Key Insights store to rewrite")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    if args.command == 'init':
+        engine = IncrementalInsights()
+        engine.fold(load_survey(args.survey), file_content_hash(args.survey))
+    else:
+        if not args.batch:
+            parser.error("append needs at least one --batch")
+        engine = load_state(args.state)
+        folded = 0
+        for path in args.batch:
+            batch_version = file_content_hash(path)
+            if batch_version in engine.batches:
+                print(f"Skipping {path}: it has already been folded in", file=sys.stderr)
+                continue
+            engine.fold(load_survey(path), batch_version)
+            folded += 1
+
+        if not folded:
+            print(f"No new batches; {args.state} and {args.output} are unchanged")
+            return
+
+    save_state(engine, args.state)
+    write_insights(engine.insights(), engine.version, args.output)
+
+    print(f"{engine.rows:,} responses aggregated; wrote {args.state} and {args.output} in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,317 @@
+"""
+Filterable Key Insights: the salary and usage charts sliced by Country, Age, RemoteWork, OrgSize or any
+other categorical column of the preprocessed survey.
+
+The output of preprocess_till_Ed_Level is held as a small columnar store: every categorical column as
+an array of dictionary codes (the categorical's codes, in the smallest integer type that fits) plus its
+dictionary, and the salaries as one float64 array. The rows are kept sorted by salary, so a query only
+has to
+    1. build a row mask from one boolean lookup per filtered column (allowed[codes]),
+    2. stable-sort the selected rows by group code, which leaves every group's salaries sorted,
+    3. read counts, medians and percentiles off the group boundaries and reduce sums per group.
+
+The mask and grouping of a (filters, group_by) pair is the query plan; plans and finished aggregates
+are both kept in small LRU caches, so repeating a slice costs a dictionary lookup.
+
+median_compensation, dev_type, industry_salaries, years_WorkExp and median_salary_Ed_Level are all one
+call of InsightsEngine.aggregate. Without filters, chart() returns the same frames as the functions of
+plotting_helpers (medians and percentiles use the same linear interpolation as pandas).
+
+Usage (from src/):
+    python insights_engine.py --filter Age="25-34 years old" --filter RemoteWork=Remote
+    python insights_engine.py --survey path/to/survey_results_public.csv --repeat 20
+"""
+import argparse
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+import pandas as pd
+
+from plotting_helpers import SURVEY_PATH, load_survey_frames, multi_hot_index
+
+USA = 'United States of America'
+
+# Columns offered as filters on the Key Insights tab
+FILTER_COLUMNS = ['Country', 'Age', 'RemoteWork', 'OrgSize']
+
+# Salary charts: chart -> (group column, statistics); the charts drawn from the USA subset default to it
+SALARY_CHARTS = OrderedDict([
+    ('median_compensation', ('Country', ['mean', 'median', 'min', 'max', 'percentile_25', 'percentile_75',
+                                          'percentile_90', 'percentile_99'])),
+    ('dev_type', ('DevType', ['median'])),
+    ('industry_salaries', ('Industry', ['median'])),
+    ('years_WorkExp', ('WorkExp', ['median', 'std'])),
+    ('median_salary_Ed_Level', ('EdLevel', ['median']))])
+
+USA_CHARTS = ['dev_type', 'industry_salaries', 'years_WorkExp', 'median_salary_Ed_Level']
+
+# Multi-select charts: chart -> column
+SELECTION_CHARTS = OrderedDict([('top_databases', 'DatabaseHaveWorkedWith'), ('top_languages', 'LanguageHaveWorkedWith')])
+
+# Every chart but survey_responses_count, which counts all raw responses per country
+FILTERABLE_CHARTS = list(SALARY_CHARTS) + list(SELECTION_CHARTS)
+
+QUANTILES = {'median': 0.5, 'percentile_25': 0.25, 'percentile_75': 0.75, 'percentile_90': 0.90, 'percentile_99': 0.99}
+
+PLAN_CACHE_SIZE = 256
+RESULT_CACHE_SIZE = 256
+
+# Rows of a query, grouped: positions (into the salary-sorted store) ordered by group and salary,
+# the group code of every group and where each group starts in positions
+QueryPlan = namedtuple('QueryPlan', ['positions', 'group_codes', 'starts', 'counts'])
+
+
+def normalize_filters(filters):
+    """
+    Returns filters as a hashable, order-independent key: ((column, (value, ...)), ...).
+    Columns without selected values are dropped.
+    """
+    return tuple(sorted((column, tuple(sorted(map(str, values)))) for column, values in (filters or {}).items() if values))
+
+
+def _smallest_int(codes):
+    for dtype in (np.int8, np.int16, np.int32):
+        if len(codes) == 0 or codes.max() <= np.iinfo(dtype).max:
+            return codes.astype(dtype)
+    return codes.astype(np.int64)
+
+
+class InsightsEngine:
+    """
+    Columnar, dictionary-encoded copy of the preprocessed survey with a cached aggregation API.
+
+    Parameters:
+    - survey (SurveyFrames): The output of load_survey_frames; only survey.final is stored.
+    """
+
+    def __init__(self, survey):
+        self.version = survey.version
+        self.survey = survey
+        final = survey.final
+
+        # Rows sorted by salary once, so every group of any query comes out already sorted
+        salaries = final['ConvertedCompYearly'].to_numpy(dtype=np.float64)
+        self.order = np.argsort(salaries, kind='stable')
+        self.salaries = salaries[self.order]
+        self.rows = len(final)
+
+        self.codes, self.dictionaries = {}, {}
+        for column in final.columns:
+            values = final[column]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                codes, dictionary = values.cat.codes.to_numpy(), values.cat.categories
+            elif column == 'WorkExp':
+                codes, dictionary = pd.factorize(values, sort=True)
+            else:
+                continue
+            self.codes[column] = _smallest_int(np.asarray(codes)[self.order])
+            self.dictionaries[column] = pd.Index(dictionary, name=column)
+
+        # process_usa_data leaves out the USA answers whose CompTotal differs from ConvertedCompYearly
+        mismatched = (final['Country'] == USA).to_numpy() & (final['CompTotal'] != final['ConvertedCompYearly']).to_numpy()
+        self.mismatched = mismatched[self.order]
+
+        self.plans = OrderedDict()
+        self.results = OrderedDict()
+        self.lock = threading.Lock()
+
+    def values(self, column):
+        """
+        Returns the values of a dictionary-encoded column that occur in the survey.
+        """
+        present = np.bincount(self.codes[column][self.codes[column] >= 0], minlength=len(self.dictionaries[column]))
+        return self.dictionaries[column][present > 0].tolist()
+
+    def mask(self, filters, exclude_mismatched=False):
+        """
+        Boolean mask over the stored rows for normalized filters.
+        """
+        mask = ~self.mismatched if exclude_mismatched else np.ones(self.rows, dtype=bool)
+        for column, values in filters:
+            dictionary = self.dictionaries[column]
+            allowed = np.zeros(len(dictionary) + 1, dtype=bool)  # the extra last entry is code -1 (missing)
+            allowed[dictionary.get_indexer(pd.Index(values).astype(dictionary.dtype, copy=False))] = True
+            allowed[-1] = False
+            mask &= allowed[self.codes[column]]
+        return mask
+
+    def _cached(self, cache, size, key, compute):
+        with self.lock:
+            if key in cache:
+                cache.move_to_end(key)
+                return cache[key]
+        value = compute()
+        with self.lock:
+            cache[key] = value
+            while len(cache) > size:
+                cache.popitem(last=False)
+        return value
+
+    def plan(self, filters, group_by, exclude_mismatched=False):
+        """
+        Returns the QueryPlan of normalized filters grouped by group_by (cached).
+        """
+        def build():
+            positions = np.flatnonzero(self.mask(filters, exclude_mismatched))
+            group_codes = self.codes[group_by][positions]
+            order = np.argsort(group_codes, kind='stable')
+            positions, group_codes = positions[order], group_codes[order]
+
+            starts = np.flatnonzero(np.r_[True, group_codes[1:] != group_codes[:-1]]) if len(positions) else np.empty(0, int)
+            counts = np.diff(np.r_[starts, len(positions)])
+            return QueryPlan(positions, group_codes[starts], starts, counts)
+
+        return self._cached(self.plans, PLAN_CACHE_SIZE, (filters, group_by, exclude_mismatched), build)
+
+    def aggregate(self, group_by, stats=('median',), filters=None, exclude_mismatched=False):
+        """
+        Salary statistics per group of the rows matching filters.
+
+        Parameters:
+        - group_by (str): A dictionary-encoded column, e.g. 'DevType' or 'WorkExp'.
+        - stats (list, optional): Any of count, mean, median, min, max, std and percentile_25/75/90/99.
+        - filters (dict, optional): Column -> selected values; a row matches when each column holds one of them.
+        - exclude_mismatched (bool, optional): Leave out the USA answers process_usa_data drops. Default is False.
+
+        Returns:
+        - pd.DataFrame: One column per statistic, indexed by the group labels (in dictionary order).
+        """
+        key = (group_by, tuple(stats), normalize_filters(filters), exclude_mismatched)
+        return self._cached(self.results, RESULT_CACHE_SIZE, key, lambda: self._aggregate(*key))
+
+    def _aggregate(self, group_by, stats, filters, exclude_mismatched):
+        plan = self.plan(filters, group_by, exclude_mismatched)
+        values = self.salaries[plan.positions]
+        counts = plan.counts
+        index = self.dictionaries[group_by][plan.group_codes]
+
+        result = {}
+        if len(counts) == 0:
+            return pd.DataFrame({stat: pd.Series(dtype='float64') for stat in stats}, index=index)
+
+        sums = np.add.reduceat(values, plan.starts)
+        for stat in stats:
+            if stat == 'count':
+                result[stat] = counts
+            elif stat == 'mean':
+                result[stat] = sums / counts
+            elif stat == 'min':
+                result[stat] = values[plan.starts]
+            elif stat == 'max':
+                result[stat] = values[plan.starts + counts - 1]
+            elif stat == 'std':
+                means = np.repeat(sums / counts, counts)
+                squares = np.add.reduceat((values - means) ** 2, plan.starts)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    result[stat] = np.where(counts > 1, squares / (counts - 1), np.nan) ** 0.5
+            elif stat in QUANTILES:
+                # Linear interpolation between the two closest ranks, as pandas' quantile
+                rank = QUANTILES[stat] * (counts - 1)
+                below = np.floor(rank).astype(np.int64)
+                above = np.minimum(below + 1, counts - 1)
+                low, high = values[plan.starts + below], values[plan.starts + above]
+                result[stat] = low + (high - low) * (rank - below)
+            else:
+                raise ValueError(f"Unknown statistic: {stat}")
+
+        return pd.DataFrame(result, index=index)
+
+    def top_selections(self, chart, filters=None, k=20):
+        """
+        The k most selected answers of a multi-select chart among the rows matching filters.
+        """
+        filters = normalize_filters(filters)
+
+        def compute():
+            index = multi_hot_index(self.survey, SELECTION_CHARTS[chart])
+            if not filters:
+                return index.top_k(k)
+            # The multi-hot rows follow survey.final; map the stored (salary-sorted) rows back to them
+            rows = np.zeros(self.rows, dtype=bool)
+            rows[self.order[self.mask(filters)]] = True
+            return index.subset(rows).top_k(k)
+
+        return self._cached(self.results, RESULT_CACHE_SIZE, (chart, filters), compute)
+
+    def chart(self, name, filters=None):
+        """
+        Returns the aggregate of one chart for filters, in the shape plotting_helpers.compute_insights gives it.
+
+        The charts drawn from the USA subset keep to the USA unless filters select countries.
+        """
+        key = ('chart', name, normalize_filters(filters))
+        return self._cached(self.results, RESULT_CACHE_SIZE, key, lambda: self._chart(name, filters))
+
+    def _chart(self, name, filters):
+        if name in SELECTION_CHARTS:
+            return self.top_selections(name, filters)
+
+        group_by, stats = SALARY_CHARTS[name]
+        filters = dict(filters or {})
+        exclude_mismatched = name in USA_CHARTS
+        if exclude_mismatched and not filters.get('Country'):
+            filters['Country'] = [USA]
+
+        frame = self.aggregate(group_by, stats, filters, exclude_mismatched)
+
+        if name == 'median_compensation':
+            frame = frame.sort_values(by='median', ascending=False)
+            return frame.rename(index={'United Kingdom of Great Britain and Northern Ireland': 'United Kingdom'})
+        if name == 'years_WorkExp':
+            return frame.rename_axis(group_by).reset_index()
+
+        medians = frame['median'].rename('ConvertedCompYearly').rename_axis(group_by).reset_index()
+        medians = medians.sort_values(by='ConvertedCompYearly', ascending=False, kind='stable')
+        # median_salary_Ed_Level keeps the positions of the groups as its index, like the pandas version
+        return medians if name == 'median_salary_Ed_Level' else medians.reset_index(drop=True)
+
+    def insights(self, filters=None):
+        """
+        Returns the aggregates of every filterable chart for filters, keyed by chart name.
+        """
+        return {name: self.chart(name, filters) for name in FILTERABLE_CHARTS}
+
+
+def parse_filters(pairs):
+    filters = {}
+    for pair in pairs:
+        column, _, value = pair.partition('=')
+        filters.setdefault(column, []).append(value)
+    return filters
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Slice the Key Insights charts and time the queries.")
+    parser.add_argument('--survey', default=SURVEY_PATH)
+    parser.add_argument('--filter', action='append', default=[], metavar='COLUMN=VALUE',
+                        help="keep rows whose COLUMN is VALUE; repeat for more values or columns")
+    parser.add_argument('--repeat', type=int, default=5, help="timed runs of the cold and warm queries")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    engine = InsightsEngine(load_survey_frames(args.survey, shared_dir=None))
+    print(f"Loaded {engine.rows:,} responses into the engine in {time.perf_counter() - start:.2f}s")
+
+    filters = parse_filters(args.filter)
+    cold, warm = [], []
+    for _ in range(args.repeat):
+        engine.plans.clear()
+        engine.results.clear()
+        start = time.perf_counter()
+        insights = engine.insights(filters)
+        cold.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        engine.insights(filters)
+        warm.append(time.perf_counter() - start)
+
+    with pd.option_context('display.width', 200, 'display.max_rows', 30):
+        for name, frame in insights.items():
+            print(f"\n{name}\n{frame.head(10)}")
+    print(f"\nAll {len(insights)} filterable charts for {filters or 'no filters'}: "
+          f"{min(cold) * 1e3:.1f} ms uncached, {min(warm) * 1e3:.3f} ms cached")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Precomputed store for the Key Insights aggregates.
+
+Every chart on the Key Insights tab is deterministic for a given survey release, so the aggregates
+are computed offline and written to one small Parquet file. The app then reads that file instead of
+parsing survey_results_public.csv.
+
+Build the store (from src/):
+    python insights_store.py --survey ../stack-overflow-developer-survey-results-2023/survey_results_public.csv
+"""
+import argparse
+import json
+import os
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from plotting_helpers import SURVEY_PATH, INSIGHT_NAMES, compute_insights, load_survey_frames
+
+INSIGHTS_PATH = "../stack-overflow-developer-survey-results-2023/key_insights.parquet"
+
+# Schema metadata key holding the layout needed to rebuild each aggregate's original shape.
+METADATA_KEY = b'devcomp.insights'
+
+
+def insights_to_table(insights, version):
+    """
+    Flattens the aggregates into one long table: (chart, position, label, stat, value).
+
+    Parameters:
+    - insights (dict): Aggregate DataFrames keyed by chart name, as returned by compute_insights.
+    - version (str): Content hash of the survey file the aggregates were computed from.
+
+    Returns:
+    - pa.Table: The long table, with the per-chart layout stored in the schema metadata.
+    """
+    frames, layout = [], {}
+
+    for name, frame in insights.items():
+        has_index = frame.index.name is not None
+        flat = frame.reset_index() if has_index else frame.reset_index(drop=True)
+        label, stats = flat.columns[0], list(flat.columns[1:])
+
+        layout[name] = {'label': label, 'label_dtype': str(flat[label].dtype), 'index': has_index,
+                        'stats': {stat: str(flat[stat].dtype) for stat in stats}}
+
+        long_df = flat.melt(id_vars=label, value_vars=stats, var_name='stat', value_name='value', ignore_index=False)
+        frames.append(pd.DataFrame({'chart': name, 'position': long_df.index, 'label': long_df[label].astype(str),
+                                    'stat': long_df['stat'], 'value': long_df['value'].astype('float64')}))
+
+    table = pa.Table.from_pandas(pd.concat(frames, ignore_index=True), preserve_index=False)
+    metadata = {'version': version, 'built_at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'layout': layout}
+
+    return table.replace_schema_metadata({**(table.schema.metadata or {}), METADATA_KEY: json.dumps(metadata)})
+
+
+def table_to_insights(table):
+    """
+    Rebuilds the aggregate DataFrames from a table written by insights_to_table.
+
+    Returns:
+    - tuple: (version, dict of aggregate DataFrames keyed by chart name).
+    """
+    metadata = json.loads(table.schema.metadata[METADATA_KEY])
+    long_df = table.to_pandas()
+    insights = {}
+
+    for name, chart_df in long_df.groupby('chart', sort=False):
+        spec = metadata['layout'][name]
+        stats = list(spec['stats'])
+
+        values = chart_df.pivot(index='position', columns='stat', values='value')[stats]
+        labels = chart_df.drop_duplicates('position').set_index('position')['label']
+
+        frame = values.astype(spec['stats'])
+        frame.insert(0, spec['label'], labels.astype(spec['label_dtype']) if spec['label_dtype'] != 'object' else labels)
+        frame = frame.sort_index().reset_index(drop=True)
+        frame.columns.name = None
+
+        insights[name] = frame.set_index(spec['label']) if spec['index'] else frame
+
+    return metadata['version'], {name: insights[name] for name in INSIGHT_NAMES if name in insights}
+
+
+def write_insights(insights, version, path=INSIGHTS_PATH):
+    pq.write_table(insights_to_table(insights, version), path, compression='zstd')
+
+
+def read_insights(path=INSIGHTS_PATH):
+    return table_to_insights(pq.read_table(path))
+
+
+def read_insights_version(path=INSIGHTS_PATH):
+    """
+    Returns the version recorded in a store without reading its aggregates: the survey's content hash for
+    a store built from the survey alone, another hash once incremental_insights.py has folded batches in.
+    """
+    return json.loads(pq.read_schema(path).metadata[METADATA_KEY])['version']
+
+
+def build_insights(survey_path=SURVEY_PATH, output_path=INSIGHTS_PATH):
+    """
+    Computes all Key Insights aggregates from the raw survey and writes them to output_path.
+
+    Returns:
+    - str: The survey content hash the store was built from.
+    """
+    survey = load_survey_frames(survey_path)
+    write_insights(compute_insights(survey), survey.version, output_path)
+
+    return survey.version
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute the Key Insights aggregates into a Parquet file.")
+    parser.add_argument('--survey', default=SURVEY_PATH, help="path to survey_results_public.csv")
+    parser.add_argument('--output', default=INSIGHTS_PATH, help="Parquet file to write")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    version = build_insights(args.survey, args.output)
+
+    print(f"Wrote {args.output} ({os.path.getsize(args.output) / 1024:.1f} KiB) for survey {version[:12]} "
+          f"in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,440 @@
+"""
+Timing spans and counters for the hot paths of the app and the prediction service.
+
+Instrumentation is off unless SURVEY_METRICS=1 is set in the environment (or configure(enabled=True) is
+called). While it is off, span() hands out one shared no-op context manager and @timed functions call
+straight through after a single flag check, so the instrumented code pays well under a microsecond per call.
+
+When it is on, every span adds its duration to a histogram labelled by span name (and any labels passed
+to it) and counters can be incremented from anywhere. They are exported as:
+    - Prometheus text: GET /metrics on server.py, or on a small HTTP server of its own when
+      SURVEY_METRICS_PORT is set (the Streamlit app has no routes of its own)
+    - a local JSON log: one line per finished span appended to SURVEY_METRICS_LOG
+
+Setting SURVEY_PROFILE_SLOW_MS turns on a sampling profiler for slow requests. While an outermost span
+is open, a background thread samples its thread's stack every SURVEY_PROFILE_INTERVAL_MS (default 5).
+If the span takes longer than the threshold, the samples are written to SURVEY_PROFILE_DIR as collapsed
+stacks (one "frame;frame;frame count" line per stack), which flamegraph.pl and speedscope read directly.
+
+Usage:
+    from instrumentation import count, span, timed
+
+    @timed('load_csv')
+    def load_survey(...): ...
+
+    with span('plot_eda_charts', level=3):
+        ...
+"""
+import bisect
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from functools import wraps
+
+# Upper bounds (seconds) of the span duration histogram buckets; the last bucket is +Inf
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+METRIC_PREFIX = 'survey_app'
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_enabled = False
+_log_path = None
+_profile_threshold = None
+_profile_interval = 0.005
+_profile_dir = 'profiles'
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = Counter()
+# Open spans of the current thread or asyncio task, innermost last
+_open_spans = contextvars.ContextVar('open_spans', default=())
+_sampler = None
+
+
+def _labels_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of the durations of one (span, labels) pair."""
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+
+class Span:
+    """
+    Times the block it wraps and records it when the block exits.
+
+    Attributes set with span.set(key, value) go to the JSON log only; labels also go to Prometheus,
+    so they must take few distinct values.
+    """
+
+    __slots__ = ('name', 'labels', 'attributes', 'start', 'seconds', 'samples', 'token')
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+        self.attributes = {}
+        self.samples = None
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        stack = _open_spans.get()
+        if not stack and _profile_threshold is not None:
+            self.samples = _get_sampler().watch(self)
+        self.token = _open_spans.set(stack + (self,))
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.seconds = time.perf_counter() - self.start
+        _open_spans.reset(self.token)
+        if self.samples is not None:
+            _get_sampler().unwatch(self)
+        stack = _open_spans.get()
+        _record(self, stack[-1].name if stack else None, exc_type)
+        return False
+
+
+class _NoopSpan:
+    """What span() returns while instrumentation is off."""
+
+    __slots__ = ()
+
+    def set(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(name, **labels):
+    """
+    Returns a context manager timing the block under name, e.g. with span('plot_eda_charts', level=3).
+    """
+    if not _enabled:
+        return _NOOP_SPAN
+    return Span(name, labels)
+
+
+def current_span():
+    """
+    Returns the innermost open span of this thread or task, or the no-op span when there is none.
+    """
+    stack = _open_spans.get() if _enabled else None
+    return stack[-1] if stack else _NOOP_SPAN
+
+
+def timed(name=None, **labels):
+    """
+    Decorator wrapping every call of a function in a span (named after the function by default).
+    """
+    def decorator(function):
+        span_name = name or function.__name__
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with Span(span_name, labels):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def count(name, value=1, **labels):
+    """
+    Adds value to the counter name (exported as <prefix>_<name>_total).
+    """
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name, _labels_key(labels)] += value
+
+
+def _record(finished, parent, exc_type):
+    key = (finished.name, _labels_key(finished.labels))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram()
+        histogram.observe(finished.seconds)
+        if exc_type is not None:
+            _counters['span_errors', key[1] + (('span', finished.name),)] += 1
+
+    profile = None
+    if finished.samples is not None and finished.seconds * 1000 >= _profile_threshold:
+        profile = write_profile(finished)
+
+    if _log_path:
+        entry = {'time': datetime.now(timezone.utc).isoformat(timespec='milliseconds'), 'span': finished.name,
+                 'seconds': round(finished.seconds, 6), 'labels': finished.labels, 'parent': parent,
+                 'thread': threading.current_thread().name}
+        if finished.attributes:
+            entry['attributes'] = finished.attributes
+        if exc_type is not None:
+            entry['error'] = exc_type.__name__
+        if profile:
+            entry['profile'] = profile
+        line = json.dumps(entry, default=str) + '\n'
+        with _lock, open(_log_path, 'a') as file:
+            file.write(line)
+
+
+class StackSampler:
+    """
+    Samples, from a daemon thread, the stacks of the threads running an outermost span.
+
+    The sampling thread only wakes up while at least one span is being watched.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.watched = {}
+        self.active = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='span-sampler', daemon=True)
+        self.thread.start()
+
+    def watch(self, watched_span):
+        samples = Counter()
+        with _lock:
+            self.watched[watched_span] = (threading.get_ident(), samples)
+            if not self.active.is_set():
+                self.active.set()
+        return samples
+
+    def unwatch(self, watched_span):
+        with _lock:
+            self.watched.pop(watched_span, None)
+            if not self.watched:
+                self.active.clear()
+
+    def run(self):
+        while True:
+            self.active.wait()
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with _lock:
+                watched = list(self.watched.items())
+            stacks = [(watched_span, collapse(frames[ident])) for watched_span, (ident, _) in watched if ident in frames]
+            del frames
+            # Under the lock, so a span that has just finished never sees its samples change while writing them
+            with _lock:
+                for watched_span, stack in stacks:
+                    if watched_span in self.watched:
+                        self.watched[watched_span][1][stack] += 1
+
+
+def collapse(frame):
+    # Outermost frame first, as in the collapsed stack format
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def _get_sampler():
+    global _sampler
+    if _sampler is None:
+        with _lock:
+            if _sampler is None:
+                _sampler = StackSampler(_profile_interval)
+    return _sampler
+
+
+def write_profile(finished):
+    """
+    Writes the stack samples of a slow span as collapsed stacks and returns the file path.
+    """
+    os.makedirs(_profile_dir, exist_ok=True)
+    labels = ''.join(f"-{key}{value}" for key, value in sorted(finished.labels.items()))
+    path = os.path.join(_profile_dir, f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{finished.name}{labels}.folded")
+    with open(path, 'w') as file:
+        for stack, samples in finished.samples.most_common():
+            file.write(f"{stack} {samples}\n")
+    return path
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for _, value in pairs)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+
+def render_prometheus():
+    """
+    Returns every span histogram and counter in the Prometheus text exposition format (version 0.0.4).
+    """
+    with _lock:
+        histograms = {key: (list(histogram.buckets), histogram.total, histogram.count)
+                      for key, histogram in _histograms.items()}
+        counters = dict(_counters)
+
+    lines = []
+    metric = f"{METRIC_PREFIX}_span_seconds"
+    if histograms:
+        lines += [f"# HELP {metric} Duration of the instrumented code paths.", f"# TYPE {metric} histogram"]
+    for (name, labels), (buckets, total, observations) in sorted(histograms.items()):
+        labels = (('span', name),) + labels
+        cumulative = 0
+        for bound, bucket in zip(BUCKETS + (float('inf'),), buckets):
+            cumulative += bucket
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f"{metric}_bucket{_format_labels(labels, [('le', le)])} {cumulative}")
+        lines.append(f"{metric}_sum{_format_labels(labels)} {total!r}")
+        lines.append(f"{metric}_count{_format_labels(labels)} {observations}")
+
+    by_name = defaultdict(list)
+    for (name, labels), value in counters.items():
+        by_name[name].append((labels, value))
+    for name, series in sorted(by_name.items()):
+        metric = f"{METRIC_PREFIX}_{name}_total"
+        lines.append(f"# TYPE {metric} counter")
+        for labels, value in sorted(series):
+            lines.append(f"{metric}{_format_labels(labels)} {value}")
+
+    return '\n'.join(lines) + '\n'
+
+
+def snapshot():
+    """
+    Returns the span histograms and counters as a JSON-serialisable dict.
+    """
+    with _lock:
+        spans = [{'span': name, 'labels': dict(labels), 'count': histogram.count, 'sum_seconds': histogram.total,
+                  'buckets': dict(zip([*map(str, BUCKETS), '+Inf'], histogram.buckets))}
+                 for (name, labels), histogram in sorted(_histograms.items())]
+        counters = [{'counter': name, 'labels': dict(labels), 'value': value}
+                    for (name, labels), value in sorted(_counters.items())]
+    return {'spans': spans, 'counters': counters}
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+def start_metrics_server(port, host='127.0.0.1'):
+    """
+    Serves /metrics (Prometheus text) and /metrics.json from a daemon thread and returns the server.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip('/') == '/metrics':
+                body, content_type = render_prometheus().encode(), PROMETHEUS_CONTENT_TYPE
+            elif self.path.rstrip('/') == '/metrics.json':
+                body, content_type = json.dumps(snapshot()).encode(), 'application/json'
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    return server
+
+
+def langchain_callback():
+    """
+    Returns a LangChain callback handler counting LLM round trips, token usage and tool calls, for
+    agent.invoke(..., config={'callbacks': [handler]}). The totals are also set on the current span.
+    """
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class UsageCallback(BaseCallbackHandler):
+        def __init__(self):
+            self.usage = Counter()
+
+        def add(self, name, value=1):
+            self.usage[name] += value
+            count(name, value)
+            current_span().set(name, self.usage[name])
+
+        def on_llm_end(self, response, **kwargs):
+            self.add('llm_calls')
+            token_usage = (response.llm_output or {}).get('token_usage') or {}
+            for kind in ['prompt_tokens', 'completion_tokens']:
+                if token_usage.get(kind):
+                    self.add(f"llm_{kind}", token_usage[kind])
+
+        def on_llm_error(self, error, **kwargs):
+            self.add('llm_errors')
+
+        def on_tool_end(self, output, **kwargs):
+            self.add('agent_tool_calls')
+
+    return UsageCallback()
+
+
+def configure(enabled=None, log_path=None, profile_slow_ms=None, profile_interval_ms=None, profile_dir=None):
+    """
+    Turns instrumentation on or off and sets where spans are logged and slow spans profiled.
+    Arguments left as None keep their current value.
+    """
+    global _enabled, _log_path, _profile_threshold, _profile_interval, _profile_dir
+
+    if enabled is not None:
+        _enabled = bool(enabled)
+    if log_path is not None:
+        _log_path = log_path or None
+    if profile_slow_ms is not None:
+        _profile_threshold = float(profile_slow_ms)
+    if profile_interval_ms is not None:
+        _profile_interval = float(profile_interval_ms) / 1000
+    if profile_dir is not None:
+        _profile_dir = profile_dir
+
+
+def configure_from_environment(environ=os.environ):
+    """
+    Reads SURVEY_METRICS, SURVEY_METRICS_LOG and the SURVEY_PROFILE_* variables (done on import).
+    """
+    configure(enabled=environ.get('SURVEY_METRICS', '').lower() in ('1', 'true', 'yes', 'on'),
+              log_path=environ.get('SURVEY_METRICS_LOG'),
+              profile_slow_ms=environ.get('SURVEY_PROFILE_SLOW_MS') or None,
+              profile_interval_ms=environ.get('SURVEY_PROFILE_INTERVAL_MS') or None,
+              profile_dir=environ.get('SURVEY_PROFILE_DIR'))
+
+
+configure_from_environment()
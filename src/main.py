@@ -1,30 +1,88 @@
 #Importing the necessary libraries
+# Only what the first render needs is imported here. Each tab imports its heavy dependencies (plotly, the
+# model, langchain) on first use, and the data and models behind them are cached resources shared by every session.
 import os
-import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-import plotly.express as px
-import plotly.graph_objects as go
 import streamlit as st
-import pickle
 
-from langchain_openai import ChatOpenAI
-from langchain.agents.agent_types import AgentType
-from langchain_experimental.agents.agent_toolkits import create_pandas_dataframe_agent
-from langchain.prompts import ChatPromptTemplate
-from collections import Counter
-
-from plotting_helpers import survey_responses_count, median_compensation, dev_type, industry_salaries, years_WorkExp, median_salary_Ed_Level
-from plotting_helpers import languages_worked_with, databases_worked_with
-from helpers import salary_ranges, slider_ranges, perform_encoding
+from helpers import SURVEY_PATH, salary_ranges, slider_ranges
 from helpers import OrgSize_keys, EdLevel_keys, Industry_keys, DevType_keys, Age_keys, RemoteWork_keys, IcorPM_keys, Employment_keys
-
-
-# Set API Key and initialize agents
-API_KEY = st.secrets["OPENAI_API_KEY"]
-df = pd.read_csv("../stack-overflow-developer-survey-results-2023/survey_results_public.csv")
-chat = ChatOpenAI(model_name='gpt-4-0613', temperature=0.2, api_key=API_KEY)
-agent = create_pandas_dataframe_agent(chat, df, verbose=True)
+from chatbot import predefined_questions
+from instrumentation import current_span, timed
+
+
+# The API key comes from .streamlit/secrets.toml or the environment. Without it the chatbot is disabled
+# but the other tabs still work.
+def get_api_key():
+    if st.secrets.load_if_toml_exists() and "OPENAI_API_KEY" in st.secrets:
+        return st.secrets["OPENAI_API_KEY"]
+    return os.environ.get("OPENAI_API_KEY")
+
+# The agent gets a compact typed view of the survey, described in its prompt by a schema summary (see agent_view.py).
+# The CSV is only parsed once the first question is asked, and by only one process on the host (see shared_store.py).
+@st.cache_resource
+def get_agent():
+    from langchain_openai import ChatOpenAI
+    from agent_view import AGENT_VIEW_VERSION, agent_prefix, agent_view_dtypes, load_agent_view
+    from chatbot import build_agent
+    from plotting_helpers import file_content_hash
+    from shared_store import shared_frame
+
+    chat = ChatOpenAI(model_name='gpt-4-0613', temperature=0.2, api_key=get_api_key())
+    view = shared_frame('survey_agent_view', file_content_hash(SURVEY_PATH), load_agent_view,
+                        schema_version=AGENT_VIEW_VERSION, dtypes=agent_view_dtypes())
+    return build_agent(chat, view, prefix=agent_prefix(view))
+
+# Answers are cached per survey and agent version and shared by every session (see answer_cache.py).
+@st.cache_resource
+def get_answer_cache():
+    from agent_view import agent_version
+    from answer_cache import ANSWER_CACHE_PATH, AnswerCache
+    from plotting_helpers import file_content_hash
+
+    return AnswerCache(ANSWER_CACHE_PATH, agent_version(file_content_hash(SURVEY_PATH)))
+
+# Simple aggregate questions are answered straight from the preprocessed survey (see query_router.py)
+@st.cache_resource
+def get_query_router():
+    from plotting_helpers import load_survey_frames
+    from query_router import QueryRouter
+
+    survey = load_survey_frames()
+    return QueryRouter(survey.final, survey.raw)
+
+# Key Insights aggregates come from the precomputed store (see insights_store.py) when it has been built,
+# otherwise they are computed from the raw survey. The store is read again once it is rewritten, e.g. by
+# incremental_insights.py folding in new responses.
+def insights_store_version():
+    from insights_store import INSIGHTS_PATH
+
+    return os.stat(INSIGHTS_PATH).st_mtime_ns if os.path.exists(INSIGHTS_PATH) else None
+
+@st.cache_resource(max_entries=2)
+def get_insights(store_version=None):
+    from insights_store import INSIGHTS_PATH, read_insights
+
+    if os.path.exists(INSIGHTS_PATH):
+        _, insights = read_insights(INSIGHTS_PATH)
+        return insights
+
+    from plotting_helpers import compute_insights, load_survey_frames
+    return compute_insights(load_survey_frames())
+
+# With SURVEY_METRICS=1 and SURVEY_METRICS_PORT set, the spans and counters of this process are served as
+# Prometheus text on that port (see instrumentation.py); started once per process. With several app processes
+# on the host only the first gets the port; the others log a warning and run without the endpoint.
+@st.cache_resource
+def start_metrics_export():
+    import logging
+    from instrumentation import is_enabled, start_metrics_server
+
+    port = os.environ.get("SURVEY_METRICS_PORT")
+    if is_enabled() and port:
+        try:
+            return start_metrics_server(int(port))
+        except OSError as error:
+            logging.getLogger(__name__).warning("Not serving metrics on port %s: %s", port, error)
 
 # Custom Headers for enhancing UI Text elements
 def custom_header(text, level=1):
@@ -47,148 +105,148 @@ def custom_header(text, level=1):
     elif level == 5:
         st.markdown(f"<h5 style='text-align: center; color: #f63366; font-family: sans serif;'>{text}</h5>", unsafe_allow_html=True)
 
-# Helper function for predicting compensation
-def predict_compensation(features):
-    with open("../saved_weights/salary_mapping.pkl", 'rb') as f:
-        salary_mapping = pickle.load(f)
-    
-    with open("../saved_weights/hybrid_classifier.pkl", 'rb') as file:
-        hybrid_classifier = pickle.load(file)
-    
-    encoded_response = hybrid_classifier.predict(features)
-
-    target_category = next((k for k, v in salary_mapping.items() if v == encoded_response[0]), None)
-    
-    return target_category
-
-# Helper function to display key insights
-def plot_eda_charts(level):
-    if level == 1:
-        sorted_df = survey_responses_count(df)
-
-        fig = px.bar(sorted_df, x='count', y='Country', color='Country', labels={'count': 'Number of Survey Responses'}, orientation='h')
-        fig.update_layout(yaxis={'categoryorder':'total ascending'}, showlegend=False)
-
-        return fig
-
-    if level == 2:
-        salary_stats_df = median_compensation(df)
-
-        fig = px.bar(salary_stats_df,  y=salary_stats_df.index, x='median', labels={'median': 'Median Compensation (USD)'},
-                color='median', orientation='h', color_continuous_scale=px.colors.qualitative.Set1) 
-        fig.update_layout(yaxis={'categoryorder':'total ascending'}, showlegend=False)
-
-        return fig
-    
-    if level == 3:
-        df_databases = databases_worked_with(df)
-
-        all_dbs = [db for sublist in df_databases['DatabaseHaveWorkedWith'] for db in sublist]
-        dbs_counts = Counter(all_dbs)
-
-        # Sort databases by counts and select top 20
-        top20_dbs_counts = dbs_counts.most_common(20)
-        dbs, counts = zip(*top20_dbs_counts) 
-
-        vibrant_colors = [
-            '#e6194B', '#3cb44b', '#ffe119', '#4363d8', '#f58231', '#911eb4', '#46f0f0', '#f032e6', '#bcf60c', '#fabebe', 
-            '#008080', '#e6beff', '#9a6324', '#fffac8', '#800000', '#aaffc3', '#808000', '#ffd8b1', '#000075', '#808080'
-        ]
-
-        fig = go.Figure(data=[go.Bar(y=dbs, x=counts, orientation='h', marker_color=vibrant_colors 
-        )])
-
-        fig.update_layout( xaxis_title="Usage Count", yaxis_title="Databases",
-            yaxis={'categoryorder':'total ascending'}, height=500 
-        )
-
-        return fig
-    
-    if level == 4:
-        df_languages = languages_worked_with(df)
-
-        all_languages = [db for sublist in df_languages['LanguageHaveWorkedWith'] for db in sublist]
-        languages_counts = Counter(all_languages)
-
-        # Sort databases by counts and select top 20
-        top20_languages_counts = languages_counts.most_common(20)
-        languages, counts = zip(*top20_languages_counts)
-
-        vibrant_colors = ['#17bebb', '#ff6f61','#6b5b95', '#88b04b', '#f7cac9', '#92a8d1', '#955251', '#b565a7', '#009B77',
-                          '#DD4124', '#D65076', '#45B8AC', '#EFC050', '#5B5EA6', '#9B2335', '#e6194B', '#3cb44b', '#ffe119',
-                          '#4363d8', '#f58231' ] 
+# Model artifacts are loaded once per process and shared by every session
+@st.cache_resource
+def get_predictor():
+    from predictor import load_predictor
+    return load_predictor()
 
-        fig = go.Figure(data=[go.Bar(y=languages, x=counts, orientation='h', marker_color=vibrant_colors 
-        )])
+# Prebuilt predictions for every combination of form inputs (see prediction_table.py), or None if not built
+@st.cache_resource
+def get_prediction_table():
+    from prediction_table import load_prediction_table
+    return load_prediction_table()
 
-        fig.update_layout( xaxis_title="Usage Count", yaxis_title="Languages",
-            yaxis={'categoryorder':'total ascending'}, height=500 
-        )
-
-        return fig
-    
-    if level == 5:
-        dev_type_df = dev_type(df)
-
-        fig = px.bar(dev_type_df, y='DevType', x='ConvertedCompYearly', color='DevType', 
-                     labels={'ConvertedCompYearly': 'Median Salary (USD)', 'DevType': 'Developer Type'}, orientation='h',height=550,
-                    color_continuous_scale=px.colors.qualitative.Set2)  
-
-        fig.update_layout(yaxis={'categoryorder':'total ascending'}, showlegend=False, xaxis_title='Median Salary (USD)',
-                        margin=dict(l=20, r=20, t=30, b=20))
-        return fig
-    
-    if level == 6:
-        industry_df = industry_salaries(df)
-
-        fig = px.bar(industry_df, y='Industry', x='ConvertedCompYearly', color='Industry',  
-            labels={'ConvertedCompYearly': 'Median Salary (USD)', 'Industry': 'Industry'}, orientation='h',
-            height = 500, color_continuous_scale=px.colors.qualitative.Set3)  
-
-        fig.update_layout(yaxis={'categoryorder':'total ascending'}, showlegend=False)
-        return fig
-    
-    if level == 7:
-        salary_stats = years_WorkExp(df)
-
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(x=salary_stats['WorkExp'], y=salary_stats['median'], mode='lines+markers',
-                                name='Median Salary', line=dict(color='royalblue')))
-
-        lower_bound = np.maximum(salary_stats['median'] - salary_stats['std'], 0)
-
-        fig.add_trace(go.Scatter(x=salary_stats['WorkExp'], y=salary_stats['median'] + salary_stats['std'],
-                                mode='lines', name='Upper Bound', marker=dict(color="#444"),
-                                line=dict(width=0), showlegend=False))
-
-        fig.add_trace(go.Scatter(x=salary_stats['WorkExp'], y=lower_bound, mode='lines', name='Lower Bound',
-                                marker=dict(color="#444"), line=dict(width=0),
-                                fillcolor='rgba(68, 68, 68, 0.3)',fill='tonexty',showlegend=False))
-
-        fig.update_layout(xaxis_title='Years of Work Experience',
-                        yaxis_title='Median Salary (Yearly)',
-                        hovermode="x", height = 400)
-        
-        return fig 
-    
-    if level == 8:
-        median_salary_by_edlevel_sorted = median_salary_Ed_Level(df)
+# Helper function for predicting compensation: a table lookup when the table is built, the model otherwise
+@timed('predict_compensation')
+def predict_compensation(features):
+    table = get_prediction_table()
+    if table is not None:
+        current_span().set('source', 'table')
+        return table.lookup({column: values[0] for column, values in features.items()})
+    current_span().set('source', 'model')
+    return get_predictor().predict_many(features)[0]
+
+# Filtered charts are aggregated by the insights engine (see insights_engine.py), built once per survey version.
+# Its query plans and results are cached, so repeating a slice is a lookup.
+def survey_version():
+    from plotting_helpers import file_content_hash
+    return file_content_hash(SURVEY_PATH)
+
+@st.cache_resource(max_entries=2)
+def get_insights_engine(version):
+    from insights_engine import InsightsEngine
+    from plotting_helpers import load_survey_frames
+
+    return InsightsEngine(load_survey_frames())
+
+# Filtered charts only cover the survey CSV. True when the store also holds responses folded in later by
+# incremental_insights.py (its version is then no longer the survey's content hash).
+@st.cache_resource(max_entries=2)
+def store_has_appended_responses(store_version=None):
+    from insights_store import INSIGHTS_PATH, read_insights_version
+
+    return store_version is not None and read_insights_version(INSIGHTS_PATH) != survey_version()
+
+# Finished charts are cached as the JSON sent to the browser, per insights version, theme and level
+# (see figure_cache.py), so a rerun with a warm cache builds no figures.
+@st.cache_resource
+def get_figure_cache():
+    from figure_cache import FigureCache
+    return FigureCache()
+
+# Charts missing from the figure cache are built concurrently on a bounded thread pool shared by every
+# session; SURVEY_CHART_WORKERS sets its size (default 4). A process pool cannot be used here: Streamlit
+# runs this script as __main__, so spawned workers would run the whole app again.
+@st.cache_resource
+def get_chart_executor():
+    from concurrent.futures import ThreadPoolExecutor
+    from charts import warm_up
+
+    warm_up()
+    return ThreadPoolExecutor(int(os.environ.get("SURVEY_CHART_WORKERS", 4)), thread_name_prefix="eda-chart")
+
+# SURVEY_STATIC_CHARTS=1 serves the Key Insights charts as static images (needs kaleido)
+def static_charts():
+    return os.environ.get("SURVEY_STATIC_CHARTS", "").lower() in ("1", "true", "yes", "on")
+
+def show_eda_chart(placeholder, key, spec):
+    from figure_cache import plotly_chart_from_json, render_image
+
+    if static_charts():
+        theme = key[1]
+        image = get_figure_cache().image(key, lambda: spec, lambda spec: render_image(spec, theme))
+        if image is not None:
+            placeholder.image(image, use_column_width=True)
+            return
+
+    plotly_chart_from_json(spec, use_container_width=True, container=placeholder)
+
+# Pool task of a filtered chart: its aggregate (InsightsEngine caches are thread-safe) and its figure
+def filtered_chart_json(engine, level, filters):
+    from charts import eda_chart_json
+    from plotting_helpers import INSIGHT_NAMES
+
+    name = INSIGHT_NAMES[level - 1]
+    return eda_chart_json(level, {name: engine.chart(name, filters)})
+
+def render_eda_charts(placeholders, filters=None):
+    """
+    Fills each placeholder ({level: st.empty()}) with its chart: cached charts right away, the others as
+    soon as the chart pool has built them, in whatever order they finish. Only the missing charts are
+    computed: a filtered chart is aggregated by the insights engine in the same pool task that builds it.
+    """
+    from concurrent.futures import as_completed
+    from charts import eda_chart_json
+    from insights_engine import FILTERABLE_CHARTS, normalize_filters
+    from plotting_helpers import INSIGHT_NAMES
+
+    theme = st.get_option("theme.base") or "light"
+    filters = normalize_filters(filters)
+    cache = get_figure_cache()
+
+    keys, missing = {}, []
+    for level, placeholder in placeholders.items():
+        chart_filters = filters if INSIGHT_NAMES[level - 1] in FILTERABLE_CHARTS else ()
+        if chart_filters:
+            keys[level] = (survey_version(), theme, level, chart_filters)
+        else:
+            keys[level] = (insights_store_version(), theme, level)
 
-        fig = go.Figure()
-        fig = px.bar(median_salary_by_edlevel_sorted, y='EdLevel', x='ConvertedCompYearly', color='EdLevel',  
-                    labels={'ConvertedCompYearly': 'Median Salary (Yearly)', 'EdLevel': 'Education Level'},
-                    orientation='h', height=400)  
+        spec = cache.get(keys[level])
+        if spec is None:
+            missing.append(level)
+        else:
+            show_eda_chart(placeholder, keys[level], spec)
+
+    if not missing:
+        return
+
+    # The cached resources are looked up here, on the script thread; the pool tasks touch no Streamlit state
+    executor = get_chart_executor()
+    futures = {}
+    for level in missing:
+        name = INSIGHT_NAMES[level - 1]
+        if filters and name in FILTERABLE_CHARTS:
+            engine = get_insights_engine(survey_version())
+            futures[executor.submit(filtered_chart_json, engine, level, dict(filters))] = level
+        else:
+            # The unfiltered aggregates are read from the insights store, nothing to compute
+            insights = get_insights(insights_store_version())
+            futures[executor.submit(eda_chart_json, level, {name: insights[name]})] = level
 
-        fig.update_layout(yaxis={'categoryorder':'total ascending'},  
-                        coloraxis_colorbar=dict(title='Median Salary'))
-        
-        return fig 
+    for future in as_completed(futures):
+        level = futures[future]
+        spec = cache.put(keys[level], future.result())['spec']
+        show_eda_chart(placeholders[level], keys[level], spec)
 
 # Main Streamlit UI code
 
 st.set_page_config(page_title='StackOverflow Developer Survey Results 2023', page_icon='📋',
                     layout="wide", initial_sidebar_state='collapsed')
 
+start_metrics_export()
+
 custom_header('Stackoverflow Developer Survey Results 2023',level=1)
 
 # Introduction content
@@ -210,19 +268,38 @@ headers = ["Number of Survey Responses According to the Country", "Median Compen
            "Median Salary by Years of Work Experience in USA", "Median Salary by Education Level in USA"]
 
 with tab1:
+    # Slicing the charts: the options are the app's form values, so no survey data is read until one is picked
+    filter_options = {'Country': sorted(get_insights(insights_store_version())['survey_responses_count']['Country']),
+                      'Age': Age_keys, 'RemoteWork': RemoteWork_keys, 'OrgSize': OrgSize_keys}
+    filter_cols = st.columns(len(filter_options))
+    filters = {}
+    for filter_col, (column, options) in zip(filter_cols, filter_options.items()):
+        with filter_col:
+            filters[column] = st.multiselect(column, options, key=f'insights_filter_{column}')
+
+    if any(filters.values()):
+        st.caption("Filters apply to every chart except the number of survey responses.")
+        if store_has_appended_responses(insights_store_version()):
+            st.caption("Filtered charts cover the survey file only: responses added to the Key Insights since "
+                       "it was published are not included until the filters are cleared.")
+    if filters['Country']:
+        headers = [header.replace(" in USA", " in the Selected Countries") for header in headers]
+
+    # The layout is laid out first with an empty placeholder per chart, which render_eda_charts then fills
+    placeholders = {}
     for i in range(0, len(headers), 2):
         cols = st.columns(2)  # Create two columns
         
         with cols[0]:
             custom_header(headers[i], level=4)
-            fig = plot_eda_charts(level=i+1)
-            st.plotly_chart(fig, use_container_width=True)
+            placeholders[i+1] = st.empty()
         
         if (i+1) < len(headers):
             with cols[1]:
                 custom_header(headers[i+1], level=4)
-                fig = plot_eda_charts(level=i+2)
-                st.plotly_chart(fig, use_container_width=True)
+                placeholders[i+2] = st.empty()
+
+    render_eda_charts(placeholders, filters)
 
 with tab2:
     custom_header("Compensation Range Predictor",level = 2)
@@ -258,9 +335,7 @@ with tab2:
                     'ICorPM' : [icor_pm]
                     }
         
-        encoded_features = perform_encoding(features)
-
-        prediction = predict_compensation(encoded_features)
+        prediction = predict_compensation(features)
 
         st.markdown(f"<div style='background-color:#A8E6CF;padding:10px;border-radius:10px;font-size:20px;'>"
             f"Predicted Compensation Range: <b>{salary_ranges[prediction]} USD</b></div>", unsafe_allow_html=True)
@@ -278,13 +353,6 @@ with tab3:
     st.write("\n")
     
     # Sidebar with predefined questions
-    predefined_questions = ["What are the most popular programming languages in 2023 according to the StackOverflow survey?",
-    "Which cloud platforms were mostly used by developers in 2023?",  
-    "What are the most common educational backgrounds for developers in 2023?",
-    "Which profession is rewarding to choose for a person having an I.T. background?",
-    "What was the median salary of Data Scientists in the IT field in USA?",
-    "What was the median annual salary for Data Scientists in the IT sector in the United States, including a breakdown by Education level?"]  # Replace with your actual questions
-    
     selected_question = st.sidebar.selectbox("Choose a Query", [""] + predefined_questions)
     # Text area for query input
     query = st.text_area("Enter your query:", value=selected_question if selected_question else "", placeholder="Which cloud platforms were most used by developers in 2023?")
@@ -294,18 +362,20 @@ with tab3:
         if query:
             with st.spinner("Generating response...."):
                 try:
-                    prompt_template = """Given the following dataframe and a question, generate an answer only based on the passed dataframe. 
-                    In case if you're unable to find it, go to this link "https://survey.stackoverflow.co/2023/" to figure out the answer.
-                    If the answer is not found, kindly state "Sorry, I don't know." Don't try to make up an answer.
-                    QUERY: {query}"""
-
-                    PROMPT = ChatPromptTemplate.from_template(
-                        template=prompt_template
-                    )
-                    final_prompt = PROMPT.format_messages(query = query)
-                    response = agent.invoke(final_prompt)
+                    from chatbot import ask_agent
+
+                    answer = get_query_router().answer(query)
+                    if answer is None and get_api_key():
+                        answer = get_answer_cache().get_or_compute(query, lambda: ask_agent(get_agent(), query))
+                    elif answer is None:
+                        # Without an API key only precomputed answers can be served
+                        answer = get_answer_cache().get(query)
+
                     st.write("\n")
-                    st.write(response['output'])
+                    if answer is None:
+                        st.warning("The chatbot needs an OPENAI_API_KEY in .streamlit/secrets.toml or the environment to answer this query.")
+                    else:
+                        st.write(answer)
                 except:
                     st.error("Please try again :(")
         else:
@@ -0,0 +1,299 @@
+"""
+Versioned artifact bundle for the compensation range model.
+
+A bundle is a directory with three files:
+    bundle.json                         the schema version, FEATURE_ORDER, the encoder vocabularies, the EdLevel
+                                        and salary maps as plain JSON, the model files' names and sha256 and
+                                        free-form metadata (train.py records its manifest there)
+    hybrid_classifier-<sha256>.pickle   the hybrid classifier pickled with protocol 5, without its array data
+    hybrid_classifier-<sha256>.buffers  the array data (the tree nodes, about all of the model's size), stored raw
+                                        and memory-mapped on load
+
+The model files are named after (the start of) their sha256, so the files of two bundles never share a
+name. A bundle is switched by writing its model files next to the old ones and then replacing bundle.json
+in one atomic rename (publish_bundle): a process loading it reads either the old bundle.json and the old
+files, or the new ones, never a mix.
+
+The pickle's sha256 is checked against bundle.json before it is unpickled. This is an integrity check
+against truncated or corrupted files, not a security boundary: the hash sits next to the pickle, so anyone
+able to replace the pickle can replace bundle.json too. Only load bundles from a trusted directory. The
+buffers file is large, so only its size is checked on load; pass verify_buffers=True (or run
+`python model_bundle.py --verify`) to hash it too.
+
+Convert the legacy pickles in saved_weights into a bundle (from src/):
+    python model_bundle.py
+    python model_bundle.py --weights-dir path/to/saved_weights --output path/to/bundle
+    python model_bundle.py --verify   # hash every file of the bundle in saved_weights
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import pickle
+from datetime import datetime, timezone
+
+import numpy as np
+
+from helpers import FEATURE_ORDER
+
+BUNDLE_FILE = 'bundle.json'
+MODEL_NAME = 'hybrid_classifier'
+MODEL_SUFFIXES = ('.pickle', '.buffers')
+SCHEMA_VERSION = 1
+
+# Each buffer starts at a multiple of this, so the arrays mapped onto the file are aligned
+BUFFER_ALIGNMENT = 64
+
+# The four pickles saved by the modeling notebook, in the order of CompensationPredictor's arguments
+LEGACY_FILES = ['encoders.pkl', 'education_level_map.pkl', 'hybrid_classifier.pkl', 'salary_mapping.pkl']
+
+
+def sha256_file(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_model(directory, model):
+    """
+    Pickles model into a .pickle file with its array data written out of band into a .buffers file, both
+    named after their sha256.
+
+    Returns:
+    - dict: The 'model' entry of bundle.json.
+    """
+    buffers = []
+    stream = pickle.dumps(model, protocol=5, buffer_callback=buffers.append)
+    model_sha256 = hashlib.sha256(stream).hexdigest()
+    model_file = f"{MODEL_NAME}-{model_sha256[:16]}.pickle"
+    with open(os.path.join(directory, model_file + '.tmp'), 'wb') as file:
+        file.write(stream)
+    os.replace(os.path.join(directory, model_file + '.tmp'), os.path.join(directory, model_file))
+
+    # The buffers' hash is only known once they are written, so they are renamed after it
+    buffers_tmp_path = os.path.join(directory, f"{MODEL_NAME}.buffers.tmp")
+    digest, layout, position = hashlib.sha256(), [], 0
+    with open(buffers_tmp_path, 'wb') as file:
+        for buffer in buffers:
+            raw = buffer.raw()
+            padding = b'\0' * (-position % BUFFER_ALIGNMENT)
+            for block in (padding, raw):
+                file.write(block)
+                digest.update(block)
+            position += len(padding)
+            layout.append([position, raw.nbytes])
+            position += raw.nbytes
+    buffers_file = f"{MODEL_NAME}-{digest.hexdigest()[:16]}.buffers"
+    os.replace(buffers_tmp_path, os.path.join(directory, buffers_file))
+
+    return {'file': model_file, 'format': 'pickle-5-out-of-band', 'sha256': model_sha256,
+            'buffers_file': buffers_file, 'buffers_size': position, 'buffers_sha256': digest.hexdigest(),
+            'buffers': layout}
+
+
+def read_model(directory, entry, verify=True, verify_buffers=False):
+    """
+    Unpickles the model of a bundle, with its arrays backed by the memory-mapped buffers file.
+
+    Raises:
+    - ValueError: If a model file does not match bundle.json.
+    """
+    model_path = os.path.join(directory, entry['file'])
+    with open(model_path, 'rb') as file:
+        stream = file.read()
+    if verify and hashlib.sha256(stream).hexdigest() != entry['sha256']:
+        raise ValueError(f"{model_path} does not match the sha256 recorded in {BUNDLE_FILE}")
+
+    buffers_path = os.path.join(directory, entry['buffers_file'])
+    if os.path.getsize(buffers_path) != entry['buffers_size']:
+        raise ValueError(f"{buffers_path} does not have the size recorded in {BUNDLE_FILE}")
+    if verify_buffers and sha256_file(buffers_path) != entry['buffers_sha256']:
+        raise ValueError(f"{buffers_path} does not match the sha256 recorded in {BUNDLE_FILE}")
+
+    if entry['buffers_size'] == 0:
+        return pickle.loads(stream, buffers=[])
+
+    # The mapping stays open as long as an array of the model uses it
+    with open(buffers_path, 'rb') as file:
+        data = memoryview(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+    return pickle.loads(stream, buffers=[data[offset:offset + size] for offset, size in entry['buffers']])
+
+
+def has_bundle(directory):
+    return os.path.exists(os.path.join(directory, BUNDLE_FILE))
+
+
+def model_files(bundle):
+    """
+    Returns the names of the model files a bundle (the contents of its bundle.json) refers to.
+    """
+    return [bundle['model']['file'], bundle['model']['buffers_file']]
+
+
+def publish_bundle(directory, bundle):
+    """
+    Makes bundle the one loaded from directory by replacing its bundle.json in one atomic rename. The
+    bundle's model files must already be in directory.
+
+    The model files of the replaced bundle are kept, for processes that read its bundle.json just before
+    the rename; those of older bundles are removed.
+
+    Returns:
+    - str: Path of bundle.json.
+    """
+    bundle_path = os.path.join(directory, BUNDLE_FILE)
+
+    keep = set(model_files(bundle))
+    if os.path.exists(bundle_path):
+        with open(bundle_path) as file:
+            keep.update(model_files(json.load(file)))
+
+    with open(bundle_path + '.tmp', 'w') as file:
+        json.dump(bundle, file, indent=2, default=float)
+    os.replace(bundle_path + '.tmp', bundle_path)
+
+    # Running processes keep their mapping of a removed buffers file
+    for name in os.listdir(directory):
+        if name.startswith(MODEL_NAME) and name.endswith(MODEL_SUFFIXES) and name not in keep:
+            os.remove(os.path.join(directory, name))
+
+    return bundle_path
+
+
+def write_bundle(directory, encoders, education_level_map, hybrid_classifier, salary_mapping, metadata=None):
+    """
+    Writes the model artifacts as a bundle.
+
+    Parameters:
+    - directory (str): Where to write bundle.json and the model file; created if needed.
+    - encoders (dict): Fitted LabelEncoders keyed by column.
+    - education_level_map (dict): Ordinal mapping for EdLevel.
+    - hybrid_classifier (VotingClassifier): The fitted model.
+    - salary_mapping (dict): Salary bracket label -> class code.
+    - metadata (dict, optional): Extra JSON-serializable information to keep with the bundle.
+
+    Returns:
+    - str: Path of bundle.json.
+    """
+    import sklearn
+
+    os.makedirs(directory, exist_ok=True)
+    model = write_model(directory, hybrid_classifier)
+
+    bundle = {'schema_version': SCHEMA_VERSION,
+              'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+              'feature_order': FEATURE_ORDER,
+              'encoders': {column: [str(label) for label in encoder.classes_] for column, encoder in encoders.items()},
+              'education_level_map': {str(label): int(code) for label, code in education_level_map.items()},
+              'salary_mapping': {str(label): int(code) for label, code in salary_mapping.items()},
+              'model': {**model, 'scikit-learn': sklearn.__version__},
+              'metadata': metadata or {}}
+
+    return publish_bundle(directory, bundle)
+
+
+def read_bundle_info(directory):
+    """
+    Reads and checks bundle.json without loading the model.
+
+    Raises:
+    - ValueError: If the bundle has another schema version or feature layout.
+    """
+    with open(os.path.join(directory, BUNDLE_FILE)) as file:
+        bundle = json.load(file)
+
+    if bundle.get('schema_version') != SCHEMA_VERSION:
+        raise ValueError(f"{directory} holds a bundle with schema version {bundle.get('schema_version')}, "
+                         f"this code reads version {SCHEMA_VERSION}")
+
+    if bundle['feature_order'] != FEATURE_ORDER:
+        raise ValueError(f"{directory} holds a model for features {bundle['feature_order']}, expected {FEATURE_ORDER}")
+
+    return bundle
+
+
+def read_bundle(directory, verify=True, verify_buffers=False):
+    """
+    Loads the model artifacts from a bundle.
+
+    Parameters:
+    - directory (str): The bundle directory.
+    - verify (bool, optional): Check the model file's sha256 before unpickling it. Default is True.
+    - verify_buffers (bool, optional): Also hash the (large) buffers file. Default is False.
+
+    Returns:
+    - tuple: (encoders, education_level_map, hybrid_classifier, salary_mapping, metadata).
+
+    Raises:
+    - ValueError: If the bundle does not pass its checks.
+    """
+    from sklearn.preprocessing import LabelEncoder
+
+    bundle = read_bundle_info(directory)
+
+    encoders = {}
+    for column, labels in bundle['encoders'].items():
+        encoders[column] = LabelEncoder()
+        encoders[column].classes_ = np.array(labels, dtype=object)
+
+    hybrid_classifier = read_model(directory, bundle['model'], verify, verify_buffers)
+
+    return encoders, bundle['education_level_map'], hybrid_classifier, bundle['salary_mapping'], bundle['metadata']
+
+
+def artifacts_version(directory):
+    """
+    Returns a hash identifying the model artifacts in directory (a bundle, or else the legacy pickles).
+    """
+    if has_bundle(directory):
+        return sha256_file(os.path.join(directory, BUNDLE_FILE))
+
+    hashes = [sha256_file(os.path.join(directory, name)) for name in LEGACY_FILES]
+    return hashlib.sha256('\n'.join(hashes).encode()).hexdigest()
+
+
+def read_legacy_pickles(directory):
+    """
+    Loads the four pickles written by the modeling notebook.
+
+    Returns:
+    - tuple: (encoders, education_level_map, hybrid_classifier, salary_mapping).
+    """
+    artifacts = []
+    for name in LEGACY_FILES:
+        with open(os.path.join(directory, name), 'rb') as file:
+            artifacts.append(pickle.load(file))
+    return tuple(artifacts)
+
+
+def convert_pickles(weights_dir, output_dir=None):
+    """
+    Writes a bundle with the artifacts of the legacy pickles in weights_dir (into weights_dir by default).
+    """
+    return write_bundle(output_dir or weights_dir, *read_legacy_pickles(weights_dir),
+                        metadata={'converted_from': LEGACY_FILES,
+                                  'source_sha256': {name: sha256_file(os.path.join(weights_dir, name)) for name in LEGACY_FILES}})
+
+
+if __name__ == '__main__':
+    from predictor import WEIGHTS_DIR, CompensationPredictor
+
+    parser = argparse.ArgumentParser(description="Convert the legacy model pickles into an artifact bundle.")
+    parser.add_argument('--weights-dir', default=WEIGHTS_DIR, help="directory holding the legacy pickles")
+    parser.add_argument('--output', default=None, help="bundle directory to write (default: the weights directory)")
+    parser.add_argument('--verify', action='store_true', help="check every file of the bundle in --weights-dir instead")
+    args = parser.parse_args()
+
+    if args.verify:
+        CompensationPredictor(*read_bundle(args.weights_dir, verify_buffers=True)[:4])
+        print(f"{os.path.join(args.weights_dir, BUNDLE_FILE)} is intact")
+        raise SystemExit
+
+    bundle_path = convert_pickles(args.weights_dir, args.output)
+
+    # Fails here, rather than in the app, if the bundle does not load
+    CompensationPredictor(*read_bundle(os.path.dirname(bundle_path))[:4])
+    print(f"Wrote {bundle_path}")
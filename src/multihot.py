@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+
+class MultiHotIndex:
+    """
+    Sparse multi-hot encoding of a semicolon-delimited multi-select survey column
+    (LanguageHaveWorkedWith, DatabaseHaveWorkedWith, PlatformHaveWorkedWith, ...).
+
+    Row i, column j of the matrix is 1 when respondent i selected vocabulary[j]. Once built,
+    usage counts, co-occurrence and per-segment counts are sparse column sums and products.
+
+    Parameters:
+    - matrix (sp.csr_matrix): Respondents x vocabulary indicator matrix.
+    - vocabulary (pd.Index): The distinct answers, in order of first appearance.
+    - index (pd.Index): Row labels of the source column.
+    - name (str): Name of the source column.
+    """
+
+    def __init__(self, matrix, vocabulary, index, name):
+        self.matrix = matrix
+        self.vocabulary = vocabulary
+        self.index = index
+        self.name = name
+
+    @classmethod
+    def from_column(cls, column, sep=';'):
+        """
+        Builds the index from a column of delimited answers. Missing answers become empty rows.
+
+        Each distinct combination of answers is split only once, and the rows are gathered from
+        those combinations, so the cost scales with the number of distinct combinations.
+        """
+        row_codes, combinations = pd.factorize(column)
+        split_combinations = [str(combination).split(sep) for combination in combinations]
+
+        lengths = np.fromiter((len(items) for items in split_combinations), dtype=np.int64, count=len(split_combinations))
+        item_codes, vocabulary = pd.factorize(np.array([item for items in split_combinations for item in items], dtype=object))
+
+        # One row per distinct combination, plus a trailing empty row for missing answers (code -1).
+        indptr = np.concatenate([[0], np.cumsum(lengths), [lengths.sum()]])
+        combination_matrix = sp.csr_matrix((np.ones(len(item_codes), dtype=np.int32), item_codes, indptr),
+                                           shape=(len(combinations) + 1, len(vocabulary)))
+        combination_matrix.sum_duplicates()
+        combination_matrix.data[:] = 1
+
+        matrix = combination_matrix[np.where(row_codes == -1, len(combinations), row_codes)]
+
+        return cls(matrix.tocsr(), pd.Index(vocabulary, name=column.name), column.index, column.name)
+
+    @property
+    def nbytes(self):
+        return self.matrix.data.nbytes + self.matrix.indices.nbytes + self.matrix.indptr.nbytes
+
+    def subset(self, mask):
+        """
+        Returns the index restricted to the rows where mask (aligned with the source column) is True.
+        """
+        mask = np.asarray(mask, dtype=bool)
+        return MultiHotIndex(self.matrix[mask], self.vocabulary, self.index[mask], self.name)
+
+    def counts(self):
+        """
+        Returns:
+        - pd.Series: Number of respondents selecting each answer, in vocabulary order.
+        """
+        return pd.Series(np.asarray(self.matrix.sum(axis=0)).ravel(), index=self.vocabulary, name='count')
+
+    def top_k(self, k=20):
+        """
+        Returns the k most selected answers.
+
+        Ties keep vocabulary (first appearance) order, matching collections.Counter.most_common.
+
+        Returns:
+        - pd.DataFrame: Columns [name, 'count'] sorted by descending count.
+        """
+        counts = self.counts()
+        order = np.argsort(-counts.values, kind='stable')[:k]
+
+        return pd.DataFrame({self.name: counts.index[order], 'count': counts.values[order]})
+
+    def cooccurrence(self):
+        """
+        Returns:
+        - pd.DataFrame: vocabulary x vocabulary counts of respondents selecting both answers.
+        """
+        product = (self.matrix.T @ self.matrix).toarray()
+        return pd.DataFrame(product, index=self.vocabulary, columns=self.vocabulary)
+
+    def segment_counts(self, segments):
+        """
+        Counts selections per segment, e.g. per Country or DevType.
+
+        Parameters:
+        - segments (pd.Series or array-like): Segment label of each row. Rows with a missing label are ignored.
+
+        Returns:
+        - pd.DataFrame: segments x vocabulary counts.
+        """
+        segment_codes, segment_labels = pd.factorize(np.asarray(segments, dtype=object), sort=True)
+        rows = np.flatnonzero(segment_codes != -1)
+
+        membership = sp.csr_matrix((np.ones(len(rows), dtype=np.int32), (segment_codes[rows], rows)),
+                                   shape=(len(segment_labels), self.matrix.shape[0]))
+        product = (membership @ self.matrix).toarray()
+
+        return pd.DataFrame(product, index=pd.Index(segment_labels, name=getattr(segments, 'name', None)),
+                            columns=self.vocabulary)
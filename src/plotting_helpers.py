@@ -1,16 +1,91 @@
-import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from collections import Counter
-from helpers import renaming_education_level, percentile
-from helpers import records_to_consider, convert_OrgSize, convert_YearsCodePro
+import hashlib
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from helpers import SURVEY_COLUMNS, SURVEY_DTYPES, SURVEY_PATH, load_survey, renaming_education_level, percentile
+from helpers import records_to_consider, convert_OrgSize_column, convert_YearsCodePro_column
+from multihot import MultiHotIndex
+from instrumentation import timed
+from shared_store import SHARED_DIR, shared_frame
 
 import warnings
 warnings.filterwarnings('ignore')
 
 
-df = pd.read_csv("../stack-overflow-developer-survey-results-2023/survey_results_public.csv")
+# The raw survey, its preprocessed frame and the USA subset, computed together once per source file version.
+SurveyFrames = namedtuple('SurveyFrames', ['version', 'raw', 'final', 'usa'])
+
+_content_hashes = {}
+_survey_frames = OrderedDict()
+SURVEY_CACHE_SIZE = 2
+
+# Schema version of the shared raw, final and usa frames (see shared_store.py). Bump it when load_survey,
+# preprocess_till_Ed_Level, select_complete_records or process_usa_data change what they return.
+SURVEY_FRAMES_VERSION = 1
+
+# Columns kept by select_complete_records
+REQUIRED_COLUMNS = ['MainBranch', 'Age', 'Employment', 'RemoteWork', 'EdLevel', 'YearsCodePro', 'DevType', 'Country',
+                    'CompTotal', 'ConvertedCompYearly', 'WorkExp', 'Industry', 'Currency', 'OrgSize', 'ICorPM',
+                    'LanguageHaveWorkedWith', 'DatabaseHaveWorkedWith']
+
+# dtypes of the raw survey and of the preprocessed frames, checked when the shared files are mapped
+RAW_DTYPES = {column: SURVEY_DTYPES.get(column, 'object') for column in SURVEY_COLUMNS}
+FINAL_DTYPES = {**{column: RAW_DTYPES[column] for column in REQUIRED_COLUMNS}, 'YearsCodePro': 'float64'}
+
+
+def file_content_hash(path, chunk_size=1 << 20):
+    """
+    Returns the SHA-256 of a file's contents.
+
+    The digest is remembered against the file's size and modification time, so repeated calls
+    only re-read the file after it has changed.
+    """
+    stat = os.stat(path)
+    signature = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+    if signature not in _content_hashes:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(chunk_size), b''):
+                digest.update(block)
+        _content_hashes[signature] = digest.hexdigest()
+
+    return _content_hashes[signature]
+
+
+def load_survey_frames(path=SURVEY_PATH, shared_dir=SHARED_DIR):
+    """
+    Loads and preprocesses the survey once per distinct file content.
+
+    Every Key Insights chart is computed from the returned frames, so a page render does one
+    preprocessing pass on a cold cache and none once it is warm. The frames are also written to the
+    shared store (see shared_store.py), so other worker processes on the host map them instead of
+    parsing and preprocessing the survey again.
+
+    Parameters:
+    - path (str, optional): Location of survey_results_public.csv.
+    - shared_dir (str, optional): Directory of the shared frames. None keeps the frames private to this process.
+
+    Returns:
+    - SurveyFrames: (version, raw, final, usa) where version is the file's content hash, final is the
+    output of preprocess_till_Ed_Level and usa is the output of process_usa_data.
+    """
+    version = file_content_hash(path)
+
+    if version in _survey_frames:
+        _survey_frames.move_to_end(version)
+    else:
+        df = shared_frame('raw', version, lambda: load_survey(path), shared_dir, SURVEY_FRAMES_VERSION, RAW_DTYPES)
+        df_final = shared_frame('final', version, lambda: preprocess_till_Ed_Level(df), shared_dir, SURVEY_FRAMES_VERSION,
+                                FINAL_DTYPES)
+        df_usa = shared_frame('usa', version, lambda: process_usa_data(df_final), shared_dir, SURVEY_FRAMES_VERSION,
+                              FINAL_DTYPES)
+        _survey_frames[version] = SurveyFrames(version, df, df_final, df_usa)
+
+        while len(_survey_frames) > SURVEY_CACHE_SIZE:
+            _survey_frames.popitem(last=False)
+
+    return _survey_frames[version]
 
 def survey_responses_count(df):
     # Considering only countries having atleast 1000 data points.
@@ -19,12 +94,14 @@ def survey_responses_count(df):
     # Finalizing data points only from these shortlisted countries.
     df = df[df['Country'].isin(countries_shortlisted)]
 
-    # Survey Responses count according to the country
-    sorted_df = df['Country'].value_counts().reset_index().sort_values(by='count', ascending=False)
+    # Survey Responses count according to the country (Country is categorical, so drop the filtered out categories)
+    country_counts = df['Country'].value_counts()
+    sorted_df = country_counts[country_counts > 0].reset_index().sort_values(by='count', ascending=False)
 
     return sorted_df
 
 
+@timed('preprocess_till_Ed_Level')
 def preprocess_till_Ed_Level(df):
     # Considering only countries having atleast 1000 data points.
     countries_shortlisted = records_to_consider(df['Country'].value_counts(), threshold=1000)
@@ -32,39 +109,37 @@ def preprocess_till_Ed_Level(df):
     # Finalizing data points only from these shortlisted countries.
     df = df[df['Country'].isin(countries_shortlisted)]
 
-    # Selecting the below columns
-    required_cols = ['MainBranch', 'Age','Employment','RemoteWork','EdLevel',
-                    'YearsCodePro', 'DevType','Country','CompTotal','ConvertedCompYearly',
-                    'WorkExp','Industry','Currency','OrgSize','ICorPM','LanguageHaveWorkedWith','DatabaseHaveWorkedWith']
+    return select_complete_records(df)
+
+def select_complete_records(df):
+    # Every step below looks at one row at a time, so it can also run on a batch of new responses
+    # (see incremental_insights.py) before the country shortlist is known.
 
-    df_subset = df[required_cols]
+    # Selecting the below columns
+    df_subset = df[REQUIRED_COLUMNS]
 
     # Dropping all the NaN entries
     df_final = df_subset.dropna()
 
     # Formatting the values into a concise field and appropriate data type
-    df_final['OrgSize'] = df_final['OrgSize'].apply(convert_OrgSize)
-    df_final['YearsCodePro'] = df_final['YearsCodePro'].apply(convert_YearsCodePro)
+    df_final['OrgSize'] = convert_OrgSize_column(df_final['OrgSize'])
+    df_final['YearsCodePro'] = convert_YearsCodePro_column(df_final['YearsCodePro'])
 
     # Rename Education levels for clarity and brevity.
     df_final.loc[:,'EdLevel'] = df_final['EdLevel'].map(renaming_education_level)
 
     return df_final
 
-def median_compensation(df):
-    df_final = preprocess_till_Ed_Level(df)
-
-    salary_stats_df = df_final.groupby('Country')['ConvertedCompYearly'].agg({'mean','median','min','max',
+def median_compensation(df_final):
+    salary_stats_df = df_final.groupby('Country', observed=True)['ConvertedCompYearly'].agg(['mean','median','min','max',
                                                                                         percentile(0.25), percentile(0.75),
-                                                                                        percentile(0.90), percentile(0.99)})
+                                                                                        percentile(0.90), percentile(0.99)])
     salary_stats_df = salary_stats_df.sort_values(by = 'median',ascending = False)
     salary_stats_df.rename(index={'United Kingdom of Great Britain and Northern Ireland': 'United Kingdom'},inplace=True)
 
     return salary_stats_df
 
-def process_usa_data(df):
-    df_final = preprocess_till_Ed_Level(df)
-
+def process_usa_data(df_final):
     df_usa = df_final[df_final['Country'] == 'United States of America']
 
     mismatched_records = df_usa[df_usa['CompTotal'] != df_usa['ConvertedCompYearly']]
@@ -73,48 +148,92 @@ def process_usa_data(df):
 
     return df_usa
 
-def languages_worked_with(df):
-    df_final = preprocess_till_Ed_Level(df)
+def languages_worked_with(df_final):
+    # Split into a new frame; df_final is shared by every chart and must not be modified.
+    return df_final['LanguageHaveWorkedWith'].str.split(';').to_frame()
 
-    df_final['LanguageHaveWorkedWith'] = df_final['LanguageHaveWorkedWith'].str.split(';')
+def databases_worked_with(df_final):
+    # Split into a new frame; df_final is shared by every chart and must not be modified.
+    return df_final['DatabaseHaveWorkedWith'].str.split(';').to_frame()
 
-    return df_final
+def dev_type(df_usa):
+    median_salary_df = df_usa.groupby('DevType', observed=True)['ConvertedCompYearly'].median().reset_index().sort_values(
+                                                by='ConvertedCompYearly', ascending=False).reset_index(drop=True)
+    return median_salary_df
 
-def databases_worked_with(df):
-    df_final = preprocess_till_Ed_Level(df)
+def industry_salaries(df_usa):
+    median_salary_df = df_usa.groupby('Industry', observed=True)['ConvertedCompYearly'].median().reset_index().sort_values(
+                                                by='ConvertedCompYearly', ascending=False).reset_index(drop=True)
+    return median_salary_df
 
-    df_final['DatabaseHaveWorkedWith'] = df_final['DatabaseHaveWorkedWith'].str.split(';')
 
-    return df_final
+def years_WorkExp(df_usa):
+    salary_stats = df_usa.groupby('WorkExp', observed=True)['ConvertedCompYearly'].agg(['median', 'std']).reset_index()
 
-def dev_type(df):
-    df_usa = process_usa_data(df)
+    return salary_stats
 
-    median_salary_df = df_usa.groupby('DevType')['ConvertedCompYearly'].median().reset_index().sort_values(
-                                                by='ConvertedCompYearly', ascending=False).reset_index(drop=True)
-    return median_salary_df
+def median_salary_Ed_Level(df_usa):
+    median_salary_by_edlevel = df_usa.groupby('EdLevel', observed=True)['ConvertedCompYearly'].median().reset_index()
+
+    # Sort the results in descending order of median salary
+    median_salary_by_edlevel_sorted = median_salary_by_edlevel.sort_values(by='ConvertedCompYearly', ascending=False)
 
-def industry_salaries(df):
-    df_usa = process_usa_data(df)
+    return median_salary_by_edlevel_sorted
 
-    median_salary_df = df_usa.groupby('Industry')['ConvertedCompYearly'].median().reset_index().sort_values(
-                                                by='ConvertedCompYearly', ascending=False).reset_index(drop=True)
-    return median_salary_df
 
+_multi_hot_indexes = {}
+_multi_hot_lock = threading.Lock()
 
-def years_WorkExp(df):
-    df_usa = process_usa_data(df)
 
-    salary_stats = df_usa.groupby('WorkExp')['ConvertedCompYearly'].agg(['median', 'std']).reset_index()
+def multi_hot_index(survey, column):
+    """
+    Returns the MultiHotIndex of a multi-select column of the preprocessed survey, building it
+    once per survey version.
 
-    return salary_stats
+    Parameters:
+    - survey (SurveyFrames): The output of load_survey_frames.
+    - column (str): A semicolon-delimited column, e.g. 'LanguageHaveWorkedWith'.
 
-def median_salary_Ed_Level(df):
-    df_usa = process_usa_data(df)
+    Returns:
+    - MultiHotIndex: Respondents in survey.final x distinct answers.
+    """
+    key = (survey.version, column)
+    with _multi_hot_lock:
+        index = _multi_hot_indexes.get(key)
+    if index is not None:
+        return index
 
-    median_salary_by_edlevel = df_usa.groupby('EdLevel')['ConvertedCompYearly'].median().reset_index()
+    # Built outside the lock, so the chart pool can build the indexes of two columns at once
+    index = MultiHotIndex.from_column(survey.final[column])
+    with _multi_hot_lock:
+        # Drop indexes of older survey versions
+        for stale in [cached for cached in _multi_hot_indexes if cached[0] != survey.version]:
+            del _multi_hot_indexes[stale]
+        return _multi_hot_indexes.setdefault(key, index)
 
-    # Sort the results in descending order of median salary
-    median_salary_by_edlevel_sorted = median_salary_by_edlevel.sort_values(by='ConvertedCompYearly', ascending=False)
 
-    return median_salary_by_edlevel_sorted
\ No newline at end of file
+# Aggregates behind the Key Insights charts, in chart (level) order, each computed from the survey frames.
+INSIGHT_BUILDERS = OrderedDict([
+    ('survey_responses_count', lambda survey: survey_responses_count(survey.raw)),
+    ('median_compensation', lambda survey: median_compensation(survey.final)),
+    ('top_databases', lambda survey: multi_hot_index(survey, 'DatabaseHaveWorkedWith').top_k(20)),
+    ('top_languages', lambda survey: multi_hot_index(survey, 'LanguageHaveWorkedWith').top_k(20)),
+    ('dev_type', lambda survey: dev_type(survey.usa)),
+    ('industry_salaries', lambda survey: industry_salaries(survey.usa)),
+    ('years_WorkExp', lambda survey: years_WorkExp(survey.usa)),
+    ('median_salary_Ed_Level', lambda survey: median_salary_Ed_Level(survey.usa))])
+
+INSIGHT_NAMES = list(INSIGHT_BUILDERS)
+
+
+def compute_insights(survey):
+    """
+    Computes every Key Insights aggregate from the preprocessed survey frames.
+
+    Parameters:
+    - survey (SurveyFrames): The output of load_survey_frames.
+
+    Returns:
+    - dict: Aggregate DataFrames keyed by the names in INSIGHT_NAMES.
+    """
+    return {name: build(survey) for name, build in INSIGHT_BUILDERS.items()}
@@ -0,0 +1,86 @@
+"""
+Batch compensation range prediction over CSV files of respondents.
+
+Usage (from src/):
+    python predict.py --input ../stack-overflow-developer-survey-results-2023/test_set_usa_2023.csv --output predictions.csv
+
+The input needs the model's feature columns (see helpers.FEATURE_ORDER); every input column is
+kept in the output and the predicted bracket is appended as PredictedSalaryBracket. With --distribution
+the probability of every bracket, the --top-k most likely brackets and the expected salary are appended
+too (see CompensationPredictor.predict_distribution), from the same model call.
+"""
+import argparse
+import sys
+import time
+
+import pandas as pd
+
+from predictor import WEIGHTS_DIR, load_predictor
+
+PREDICTION_COLUMN = 'PredictedSalaryBracket'
+
+
+def output_columns(predictor, top_k=None):
+    # Columns predict_csv appends to the input columns, in the order predict_distribution returns them
+    if top_k is None:
+        return [PREDICTION_COLUMN]
+    ranks = range(1, min(top_k, len(predictor.brackets)) + 1)
+    return ([f"P({label})" for label in predictor.brackets] + [PREDICTION_COLUMN] +
+            [column for rank in ranks for column in (f"Top{rank}Bracket", f"Top{rank}Probability")] + ['ExpectedSalary'])
+
+
+def predict_csv(input_path, output_path, predictor, chunksize=100000, top_k=None):
+    """
+    Streams input_path through the predictor chunk by chunk and appends the results to output_path.
+
+    Parameters:
+    - input_path (str): CSV file with at least the FEATURE_ORDER columns.
+    - output_path (str): CSV file to write; overwritten if it exists.
+    - predictor (CompensationPredictor): The loaded model artifacts.
+    - chunksize (int, optional): Number of rows encoded and scored at a time. Default is 100000.
+    - top_k (int, optional): Append the bracket distribution with this many top brackets. Default is None (the label only).
+
+    Returns:
+    - tuple: (number of rows scored, elapsed seconds).
+    """
+    start = time.perf_counter()
+    total_rows = 0
+
+    for chunk_number, chunk in enumerate(pd.read_csv(input_path, chunksize=chunksize)):
+        if chunk.empty:
+            # A header-only input: the model cannot score zero rows, so only the output header is written
+            chunk = chunk.reindex(columns=[*chunk.columns, *output_columns(predictor, top_k)])
+        elif top_k is None:
+            chunk[PREDICTION_COLUMN] = predictor.predict_many(chunk)
+        else:
+            distribution = predictor.predict_distribution(chunk, top_k=top_k)
+            chunk = chunk.join(distribution.rename(columns={'SalaryBracket': PREDICTION_COLUMN}))
+
+        chunk.to_csv(output_path, mode='w' if chunk_number == 0 else 'a', header=chunk_number == 0, index=False)
+
+        total_rows += len(chunk)
+        elapsed = time.perf_counter() - start
+        print(f"chunk {chunk_number + 1}: {total_rows} rows, {total_rows / elapsed:,.0f} rows/sec", file=sys.stderr)
+
+    return total_rows, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Predict compensation ranges for every respondent in a CSV file.")
+    parser.add_argument('--input', required=True, help="CSV file of respondents to score")
+    parser.add_argument('--output', required=True, help="CSV file to write the predictions to")
+    parser.add_argument('--chunksize', type=int, default=100000, help="rows encoded and scored per batch")
+    parser.add_argument('--weights-dir', default=WEIGHTS_DIR, help="directory holding the saved model artifacts")
+    parser.add_argument('--distribution', action='store_true', help="also write bracket probabilities and the expected salary")
+    parser.add_argument('--top-k', type=int, default=2, help="most likely brackets written with --distribution")
+    args = parser.parse_args(argv)
+
+    predictor = load_predictor(args.weights_dir)
+    total_rows, elapsed = predict_csv(args.input, args.output, predictor, chunksize=args.chunksize,
+                                      top_k=args.top_k if args.distribution else None)
+
+    print(f"Scored {total_rows} rows in {elapsed:.2f}s ({total_rows / max(elapsed, 1e-9):,.0f} rows/sec)", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
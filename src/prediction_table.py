@@ -0,0 +1,268 @@
+"""
+Exhaustive prediction table for the Compensation Range Predictor.
+
+Every input of the tab2 form is one of the values in the helpers key lists, except YearsCodePro, an
+integer slider from 0 to 50. The whole input space (about 61 million combinations) is enumerated in
+FEATURE_ORDER and scored once with the hybrid classifier in large vectorized batches. The predicted
+classes are stored as one uint8 per combination, at the mixed-radix offset of its values. Serving a
+prediction is then an O(1) lookup in a memory-mapped array, with no model in memory.
+
+The table records a hash of the model artifacts it was built from and is ignored once they change.
+
+Usage (from src/):
+    python prediction_table.py build --jobs 8
+    python prediction_table.py check --sample 100000
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from helpers import FEATURE_ORDER
+from helpers import OrgSize_keys, EdLevel_keys, Industry_keys, DevType_keys, Age_keys, RemoteWork_keys, IcorPM_keys, Employment_keys
+from model_bundle import artifacts_version
+from predictor import WEIGHTS_DIR, load_predictor
+
+logger = logging.getLogger(__name__)
+
+TABLE_FILE = 'prediction_table.npy'
+METADATA_FILE = 'prediction_table.json'
+
+# Values of each axis of the table, as shown in the tab2 form
+AXES = {'Age': Age_keys, 'Employment': Employment_keys, 'RemoteWork': RemoteWork_keys, 'EdLevel': EdLevel_keys,
+        'YearsCodePro': list(range(0, 51)), 'DevType': DevType_keys, 'Industry': Industry_keys, 'OrgSize': OrgSize_keys,
+        'ICorPM': IcorPM_keys}
+
+
+def model_value(column, value):
+    # The form sends 0.5 for a YearsCodePro of 0
+    if column == 'YearsCodePro':
+        return float(value) if value != 0 else 0.5
+    return value
+
+
+class PredictionTable:
+    """
+    Predicted salary bracket of every combination of form inputs, indexed by mixed-radix offset.
+
+    Parameters:
+    - table (np.ndarray): Predicted class of each combination, flattened in C order over the axes.
+    - axes (dict): Values of each axis, in FEATURE_ORDER.
+    - labels (dict): Predicted class -> salary bracket label.
+    """
+
+    def __init__(self, table, axes, labels):
+        self.table = table
+        self.axes = axes
+        self.labels = labels
+        self.shape = tuple(len(values) for values in axes.values())
+
+        # Mixed-radix place value of each axis (the last axis varies fastest), and the position of each value along it
+        self.strides, stride = {}, 1
+        for column in reversed(list(axes)):
+            self.strides[column] = stride
+            stride *= len(axes[column])
+        self.positions = {column: {model_value(column, value): position for position, value in enumerate(values)}
+                          for column, values in axes.items()}
+
+    @classmethod
+    def from_directory(cls, weights_dir=WEIGHTS_DIR):
+        with open(os.path.join(weights_dir, METADATA_FILE)) as file:
+            metadata = json.load(file)
+
+        table = np.load(os.path.join(weights_dir, TABLE_FILE), mmap_mode='r')
+        return cls(table, metadata['axes'], {int(code): label for code, label in metadata['labels'].items()})
+
+    def offset(self, features):
+        """
+        Returns the position of a combination of form inputs in the table.
+
+        Raises:
+        - ValueError: If a value is outside the table's input space.
+        """
+        offset = 0
+        for column, positions in self.positions.items():
+            value = model_value(column, features[column])
+            if value not in positions:
+                raise ValueError(f"{column} value {features[column]!r} is not in the prediction table")
+            offset += positions[value] * self.strides[column]
+        return offset
+
+    def lookup(self, features):
+        """
+        Returns the predicted salary bracket label for one respondent (a dict of raw feature values).
+        """
+        return self.labels[int(self.table[self.offset(features)])]
+
+    def features_at(self, offsets):
+        """
+        Returns the raw feature values at the given offsets, as a dict of columns.
+        """
+        indices = np.unravel_index(np.asarray(offsets), self.shape)
+        features = {}
+        for (column, values), index in zip(self.axes.items(), indices):
+            values = np.array([model_value(column, value) for value in values], dtype=object)
+            features[column] = values[index]
+        return features
+
+
+def encoded_axes(predictor):
+    """
+    Returns the encoded model input of every value of every axis, in FEATURE_ORDER.
+    """
+    encoded = []
+    for column, values in AXES.items():
+        if column == 'YearsCodePro':
+            encoded.append(np.array([model_value(column, value) for value in values], dtype=np.float32))
+        else:
+            table = predictor.feature_encoder.tables[column]
+            missing = [value for value in values if value not in table]
+            if missing:
+                raise ValueError(f"The model artifacts cannot encode these {column} values: {missing}")
+            encoded.append(np.array([table[value] for value in values], dtype=np.float32))
+    return encoded
+
+
+def score_range(weights_dir, start, stop):
+    """
+    Scores the combinations at offsets [start, stop) and returns their predicted classes.
+    """
+    predictor = load_predictor(weights_dir)
+    axis_values = encoded_axes(predictor)
+    shape = tuple(len(values) for values in axis_values)
+
+    indices = np.unravel_index(np.arange(start, stop), shape)
+    encoded = np.empty((stop - start, len(FEATURE_ORDER)), dtype=np.float32)
+    for position, (values, index) in enumerate(zip(axis_values, indices)):
+        encoded[:, position] = values[index]
+
+    model_input = encoded
+    if hasattr(predictor.hybrid_classifier, 'feature_names_in_'):
+        model_input = pd.DataFrame(encoded, columns=FEATURE_ORDER, copy=False)
+
+    return predictor.hybrid_classifier.predict(model_input).astype(np.uint8)
+
+
+def build_table(weights_dir=WEIGHTS_DIR, batch_size=1000000, jobs=1):
+    """
+    Scores the whole input space and writes the table and its metadata next to the model artifacts.
+
+    Parameters:
+    - weights_dir (str, optional): Directory holding the model artifacts; the table is written there too.
+    - batch_size (int, optional): Combinations scored per model call. Default is 1000000.
+    - jobs (int, optional): Worker processes scoring batches in parallel. Default is 1.
+
+    Returns:
+    - PredictionTable: The new table.
+    """
+    assert list(AXES) == FEATURE_ORDER
+
+    predictor = load_predictor(weights_dir)
+    classes = np.asarray(getattr(predictor.hybrid_classifier, 'classes_', list(predictor.inverse_salary_mapping)))
+    if classes.min() < 0 or classes.max() > 255:
+        raise ValueError("The classifier's classes do not fit in a uint8 table")
+
+    shape = tuple(len(values) for values in AXES.values())
+    size = int(np.prod(shape))
+    path = os.path.join(weights_dir, TABLE_FILE)
+    tmp_path = path + '.tmp.npy'
+    table = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.uint8, shape=(size,))
+
+    start = time.perf_counter()
+    ranges = [(offset, min(offset + batch_size, size)) for offset in range(0, size, batch_size)]
+
+    executor = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else None
+    if executor is None:
+        results = (score_range(weights_dir, low, high) for low, high in ranges)
+    else:
+        results = executor.map(score_range, [weights_dir] * len(ranges), *zip(*ranges))
+
+    # Results come back in order, so high is the number of combinations scored so far
+    for (low, high), predicted in zip(ranges, results):
+        table[low:high] = predicted
+        print(f"{high:,} / {size:,} combinations, {high / (time.perf_counter() - start):,.0f} per sec", file=sys.stderr)
+
+    if executor is not None:
+        executor.shutdown()
+
+    table.flush()
+    del table
+    os.replace(tmp_path, path)
+
+    metadata = {'axes': AXES, 'labels': {int(code): label for code, label in predictor.inverse_salary_mapping.items()},
+                'artifacts_version': artifacts_version(weights_dir), 'build_seconds': round(time.perf_counter() - start, 1)}
+    with open(os.path.join(weights_dir, METADATA_FILE), 'w') as file:
+        json.dump(metadata, file, indent=2)
+
+    return PredictionTable.from_directory(weights_dir)
+
+
+def load_prediction_table(weights_dir=WEIGHTS_DIR):
+    """
+    Returns the prediction table of the current model artifacts, or None if it has not been built
+    or was built from other artifacts.
+    """
+    metadata_path = os.path.join(weights_dir, METADATA_FILE)
+    if not os.path.exists(metadata_path) or not os.path.exists(os.path.join(weights_dir, TABLE_FILE)):
+        return None
+
+    with open(metadata_path) as file:
+        built_from = json.load(file).get('artifacts_version')
+    if built_from != artifacts_version(weights_dir):
+        logger.warning("%s was built from other model artifacts; rebuild it with `python prediction_table.py build`",
+                       os.path.join(weights_dir, TABLE_FILE))
+        return None
+
+    return PredictionTable.from_directory(weights_dir)
+
+
+def check_table(table, predictor, sample_size=10000, seed=0):
+    """
+    Compares the table with live model output on a random sample of combinations.
+
+    Returns:
+    - pd.DataFrame: The sampled combinations where the table and the model disagree (empty if none).
+    """
+    offsets = np.random.default_rng(seed).integers(0, table.table.size, sample_size)
+    features = table.features_at(offsets)
+
+    expected = predictor.predict_many(features)
+    stored = [table.labels[int(code)] for code in table.table[offsets]]
+
+    sample = pd.DataFrame(features).assign(Table=stored, Model=expected)
+    return sample[sample['Table'] != sample['Model']]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or check the exhaustive prediction table.")
+    parser.add_argument('command', choices=['build', 'check'])
+    parser.add_argument('--weights-dir', default=WEIGHTS_DIR, help="directory holding the saved model artifacts")
+    parser.add_argument('--batch-size', type=int, default=1000000, help="combinations scored per model call")
+    parser.add_argument('--jobs', type=int, default=1, help="worker processes used to build the table")
+    parser.add_argument('--sample', type=int, default=10000, help="combinations compared with the model by check")
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        table = build_table(args.weights_dir, args.batch_size, args.jobs)
+        print(f"Wrote {table.table.size:,} predictions ({table.table.nbytes / 1e6:.1f} MB) to {args.weights_dir}")
+        return
+
+    table = load_prediction_table(args.weights_dir)
+    if table is None:
+        sys.exit(f"No up-to-date prediction table in {args.weights_dir}; run `python prediction_table.py build`")
+
+    mismatches = check_table(table, load_predictor(args.weights_dir), args.sample)
+    print(f"{len(mismatches)} of {args.sample:,} sampled combinations differ from the model")
+    if len(mismatches):
+        print(mismatches.head(20).to_string())
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
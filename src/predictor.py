@@ -0,0 +1,177 @@
+import logging
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from feature_encoder import FeatureEncoder
+from helpers import FEATURE_ORDER, slider_ranges
+from model_bundle import has_bundle, read_bundle, read_legacy_pickles
+
+logger = logging.getLogger(__name__)
+
+# Resolved from this file, so the model loads whatever the working directory is
+WEIGHTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'saved_weights')
+
+# Columns that are label encoded; EdLevel is ordinal and YearsCodePro is numeric.
+LABEL_ENCODED_COLUMNS = ['Age', 'Employment', 'RemoteWork', 'DevType', 'Industry', 'OrgSize', 'ICorPM']
+
+
+def validate_artifacts(encoders, education_level_map, hybrid_classifier, salary_mapping):
+    """
+    Checks that the loaded model artifacts are consistent with each other and with FEATURE_ORDER.
+
+    Raises:
+    - ValueError: If any artifact is missing an expected column, label or method.
+    """
+    missing = set(LABEL_ENCODED_COLUMNS) - set(encoders)
+    if missing:
+        raise ValueError(f"encoders.pkl is missing encoders for: {sorted(missing)}")
+
+    unexpected = set(encoders) - set(FEATURE_ORDER)
+    if unexpected:
+        raise ValueError(f"encoders.pkl has encoders for unknown columns: {sorted(unexpected)}")
+
+    for column, encoder in encoders.items():
+        if not hasattr(encoder, 'transform') or not hasattr(encoder, 'classes_'):
+            raise ValueError(f"Encoder for '{column}' is not a fitted LabelEncoder")
+
+    if not education_level_map:
+        raise ValueError("education_level_map.pkl is empty")
+
+    if not hasattr(hybrid_classifier, 'predict') or not hasattr(hybrid_classifier, 'predict_proba'):
+        raise ValueError("hybrid_classifier.pkl does not provide predict and predict_proba methods")
+
+    if len(set(salary_mapping.values())) != len(salary_mapping):
+        raise ValueError("salary_mapping.pkl maps several brackets to the same code")
+
+    unknown_classes = set(getattr(hybrid_classifier, 'classes_', [])) - set(salary_mapping.values())
+    if unknown_classes:
+        raise ValueError(f"hybrid_classifier predicts codes missing from salary_mapping.pkl: {sorted(unknown_classes)}")
+
+
+class CompensationPredictor:
+    """
+    Keeps the encoders, education level map, hybrid classifier and salary mapping in memory
+    so predictions do not touch the disk.
+
+    Use load_predictor() to get the shared instance for the current process.
+    """
+
+    def __init__(self, encoders, education_level_map, hybrid_classifier, salary_mapping):
+        validate_artifacts(encoders, education_level_map, hybrid_classifier, salary_mapping)
+
+        self.encoders = encoders
+        self.education_level_map = education_level_map
+        self.hybrid_classifier = hybrid_classifier
+        self.salary_mapping = salary_mapping
+        self.feature_encoder = FeatureEncoder(encoders, education_level_map)
+
+        # Encoded class -> bracket label, so results don't need a scan over salary_mapping.
+        self.inverse_salary_mapping = {code: label for label, code in salary_mapping.items()}
+
+        # Bracket labels from lowest to highest code, the column order of predict_proba_encoded
+        self.brackets = [self.inverse_salary_mapping[code] for code in sorted(self.inverse_salary_mapping)]
+        classes = getattr(hybrid_classifier, 'classes_', sorted(self.inverse_salary_mapping))
+        self.class_positions = np.array([self.brackets.index(self.inverse_salary_mapping[code]) for code in classes])
+
+        # Middle of each bracket's salary range (NaN for a bracket without one), weighted by its probability for ExpectedSalary
+        self.midpoints = np.array([np.mean(slider_ranges[label]) if label in slider_ranges else np.nan
+                                   for label in self.brackets])
+
+    @classmethod
+    def from_directory(cls, weights_dir=WEIGHTS_DIR):
+        """
+        Loads the artifact bundle in weights_dir (see model_bundle.py), or the legacy pickles if it has none.
+        """
+        if has_bundle(weights_dir):
+            return cls(*read_bundle(weights_dir)[:4])
+
+        logger.warning("Loading the legacy pickles from %s; convert them with `python model_bundle.py`", weights_dir)
+        return cls(*read_legacy_pickles(weights_dir))
+
+    def encode(self, input_features):
+        return self.feature_encoder.encode_many(input_features)
+
+    def predict_encoded(self, encoded):
+        """
+        Predicts salary bracket labels from features already encoded by FeatureEncoder.
+        """
+        # The classifier was fitted on a DataFrame; wrapping the array (without copying) keeps sklearn's feature name check quiet.
+        if hasattr(self.hybrid_classifier, 'feature_names_in_'):
+            encoded = pd.DataFrame(encoded, columns=FEATURE_ORDER, copy=False)
+
+        return [self.inverse_salary_mapping.get(code) for code in self.hybrid_classifier.predict(encoded)]
+
+    def predict_proba_encoded(self, encoded):
+        """
+        Returns the probability of every salary bracket (columns in self.brackets order) for features already
+        encoded by FeatureEncoder.
+        """
+        if hasattr(self.hybrid_classifier, 'feature_names_in_'):
+            encoded = pd.DataFrame(encoded, columns=FEATURE_ORDER, copy=False)
+
+        probabilities = np.zeros((len(encoded), len(self.brackets)))
+        probabilities[:, self.class_positions] = self.hybrid_classifier.predict_proba(encoded)
+        return probabilities
+
+    def predict_distribution(self, input_features, top_k=2):
+        """
+        Predicts the whole salary bracket distribution for every respondent in input_features, from a single
+        predict_proba call.
+
+        Parameters:
+        - input_features (dict or pd.DataFrame): Raw feature values with one list entry (or row) per respondent.
+        - top_k (int, optional): Number of most likely brackets to list per respondent. Default is 2.
+
+        Returns:
+        - pd.DataFrame: One row per respondent, in input order, with the columns
+          'P(<bracket>)' for every bracket, 'SalaryBracket' (the most likely bracket, as predict_many returns),
+          'Top<i>Bracket' and 'Top<i>Probability' for i in 1..top_k, and 'ExpectedSalary' (the bracket
+          midpoints of slider_ranges weighted by their probabilities).
+        """
+        probabilities = self.predict_proba_encoded(self.encode(input_features))
+        brackets = np.array(self.brackets, dtype=object)
+
+        # A stable sort keeps the lower bracket first on ties, which is also the one predict() picks
+        ranking = np.argsort(-probabilities, axis=1, kind='stable')[:, :top_k]
+        ranked_probabilities = np.take_along_axis(probabilities, ranking, axis=1)
+
+        distribution = {f"P({label})": probabilities[:, position] for position, label in enumerate(self.brackets)}
+        distribution['SalaryBracket'] = brackets[ranking[:, 0]]
+        for rank in range(ranking.shape[1]):
+            distribution[f"Top{rank + 1}Bracket"] = brackets[ranking[:, rank]]
+            distribution[f"Top{rank + 1}Probability"] = ranked_probabilities[:, rank]
+        distribution['ExpectedSalary'] = probabilities @ self.midpoints
+
+        return pd.DataFrame(distribution, index=getattr(input_features, 'index', None))
+
+    def predict_many(self, input_features):
+        """
+        Predicts the salary bracket for every respondent in input_features.
+
+        Parameters:
+        - input_features (dict or pd.DataFrame): Raw feature values with one list entry (or row) per respondent.
+
+        Returns:
+        - list: Salary bracket labels (e.g. 'Low-Mid'), in input order.
+        """
+        return self.predict_encoded(self.encode(input_features))
+
+    def predict_one(self, features):
+        """
+        Predicts the salary bracket for a single respondent.
+
+        Parameters:
+        - features (dict): Raw feature values keyed by column, e.g. {'Age': '25-34 years old', ...}.
+
+        Returns:
+        - str: The predicted salary bracket label.
+        """
+        return self.predict_encoded(self.feature_encoder.encode_one(features))[0]
+
+
+@lru_cache(maxsize=None)
+def load_predictor(weights_dir=WEIGHTS_DIR):
+    return CompensationPredictor.from_directory(weights_dir)
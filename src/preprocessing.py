@@ -1,85 +1,56 @@
-# Import necessary libraries for data manipulation and visualization
+# Builds survey_results_clean_usa.csv, the training data for the compensation model, from one or more
+# survey_results_public.csv files (e.g. several survey years in the same schema).
+#
+# The survey is streamed in chunks so peak memory stays bounded however many files are concatenated:
+#   pass 1 counts responses per country (only the Country column is read),
+#   pass 2 applies the per-row cleaning to each chunk, spills the surviving rows to disk and counts
+#          them per (DevType, Industry, Employment),
+#   pass 3 applies the count thresholds and the compensation range, and collects compensation values
+#          for the quantile bracket edges,
+#   pass 4 assigns the salary brackets and appends each chunk to the output CSV.
+# The output is identical to loading the whole file and filtering it in memory.
+#
+# EdLevel is renamed with the helpers mapping, which spells Bachelor’s and Master’s with the survey's
+# typographic apostrophe. The script used to carry its own copy with ASCII apostrophes, which left every
+# Bachelor's and Master's respondent of the 2023 survey with an empty EdLevel in the clean CSV (the same
+# rows are kept either way). Both spellings are accepted, for survey files that use the ASCII one.
+#
+# Usage (from src/):
+#     python preprocessing.py
+#     python preprocessing.py --input survey_2022.csv survey_2023.csv --chunksize 50000
+
+# Import necessary libraries for data manipulation
+import argparse
+import os
+import tempfile
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from helpers import records_to_consider, convert_YearsCodePro, convert_OrgSize
+from helpers import SURVEY_PATH, SURVEY_DTYPES, records_to_consider, convert_YearsCodePro_column, convert_OrgSize_column
+from helpers import renaming_education_level
 
 # Suppress any warnings for cleaner output
 import warnings
 warnings.filterwarnings('ignore')
 
-# Load the survey dataset into a pandas DataFrame
-df = pd.read_csv("../survey_results_public.csv")
+CLEAN_PATH = "../stack-overflow-developer-survey-results-2023/survey_results_clean_usa.csv"
+CHUNKSIZE = 100000
 
-# Filter countries with at least 1000 data points using a custom helper function
-countries_shortlisted = records_to_consider(df['Country'].value_counts())
-
-# Keep only data from shortlisted countries
-df = df[df['Country'].isin(countries_shortlisted)]
+# Compensation stays float64 here: it is compared for equality and written out as training data, so it must not be rounded.
+PREPROCESSING_DTYPES = {**SURVEY_DTYPES, 'CompTotal': 'float64', 'ConvertedCompYearly': 'float64'}
 
 # Select the below columns for analysis
 required_cols = ['MainBranch', 'Age','Employment','RemoteWork','EdLevel','YearsCode',
                  'YearsCodePro', 'DevType','Country','CompTotal','ConvertedCompYearly',
                  'WorkExp','Industry','Currency','OrgSize','ICorPM']
 
-# Create a subset DataFrame with the selected columns
-df_subset = df[required_cols]
-
-# Drop all rows with any NaN values to ensure data quality
-df_final = df_subset.dropna()
-
-# Apply custom functions to format 'OrgSize' and 'YearsCodePro' columns for consistency
-df_final['OrgSize'] = df_final['OrgSize'].apply(convert_OrgSize)
-df_final['YearsCodePro'] = df_final['YearsCodePro'].apply(convert_YearsCodePro)
-
-# Rename Education levels for clarity and brevity.
-renaming_education_level = {"Bachelor's degree (B.A., B.S., B.Eng., etc.)" : 'Bachelors',
-       "Master's degree (M.A., M.S., M.Eng., MBA, etc.)" : 'Masters',
-       'Some college/university study without earning a degree' : 'Some College',
-       'Professional degree (JD, MD, Ph.D, Ed.D, etc.)' : 'PhD, Postdoc',
-       'Secondary school (e.g. American high school, German Realschule or Gymnasium, etc.)' : 'Secondary School',
-       'Associate degree (A.A., A.S., etc.)' : 'Associate degree',
-       'Primary/elementary school' : 'Primary School',
-       'Something else' : 'Something else'
-       }
-df_final.loc[:,'EdLevel'] = df_final['EdLevel'].map(renaming_education_level)
-
-# Filter the dataset to include only respondents from the United States
-df_usa = df_final[df_final['Country'] == 'United States of America']
-
-# Identify and remove any records with discrepancies between 'CompTotal' & 'ConvertedCompYearly'
-mismatched_records = df_usa[df_usa['CompTotal'] != df_usa['ConvertedCompYearly']]
-df_usa = df_usa[~df_usa.index.isin(mismatched_records.index)]
-
-# Copy the cleaned USA dataset for further operations
-df_oa = df_usa.copy()
-
-# Exclude specific categories from 'MainBranch', 'Age', 'EdLevel', and 'OrgSize' for more focused analysis
-df_oa = df_oa[~df_oa['MainBranch'].isin(['I am not primarily a developer, but I write code sometimes as part of my work/studies'])]
-df_oa = df_oa[~df_oa['Age'].isin(['Prefer not to say', 'Under 18 years old'])]
-df_oa = df_oa[~df_oa['EdLevel'].isin(['Something else'])]
-df_oa = df_oa[~df_oa['OrgSize'].isin(["I don't know", "Frelancer/Sole Proprietor"])]
-
-# Filter 'DevType' and 'Industry' to include only those with at least 50 data points
-df_oa = df_oa[df_oa['DevType'].map(df_oa['DevType'].value_counts()) >= 50]
-df_oa = df_oa[df_oa['Industry'].map(df_oa['Industry'].value_counts()) >= 50]
-
-# Shortlist employment types based on a custom threshold using a helper function
-employment_shortlisted = records_to_consider(df_oa['Employment'].value_counts(), threshold=10)
-df_oa = df_oa[df_oa['Employment'].isin(employment_shortlisted)]
-
-# Filter records to include only those with a yearly compensation between $40,000 and $300,000
-df_oa = df_oa[(df_oa['ConvertedCompYearly'] >= 40000) & (df_oa['ConvertedCompYearly'] <= 300000)]
+# Rename Education levels for clarity and brevity, whichever apostrophe the survey file uses
+education_levels = {**{level.replace('’', "'"): short for level, short in renaming_education_level.items()},
+                    **renaming_education_level}
 
 # Define salary brackets based on quantiles and label them accordingly
 quantiles = [0, 0.2, 0.4, 0.6, 0.8, 1]
 bin_labels = ['Low', 'Low-Mid', 'Mid', 'Mid-High', 'High']
-df_oa['SalaryBracket'] = pd.qcut(df_oa['ConvertedCompYearly'], q=quantiles, labels=bin_labels)
 
-
-bin_ranges = {label: (df_oa.loc[df_oa['SalaryBracket'] == label, 'ConvertedCompYearly'].min(), \
-                       df_oa.loc[df_oa['SalaryBracket'] == label, 'ConvertedCompYearly'].max()) for label in bin_labels}
 # Reference
 salary_ranges = {
     'Low' : '40k - 105k',
@@ -89,16 +60,170 @@ salary_ranges = {
     'High' : '200.4k - 300k',
 }
 
-clean_df = df_oa.copy()
-
 # Drop irrelevant columns for the final clean dataset
 cols_to_drop = ['MainBranch','Country','CompTotal','WorkExp','Currency','YearsCode']
-clean_df = clean_df.drop(cols_to_drop,axis = 1).reset_index(drop = True)
 
-# Convert categorical columns to 'category' dtype for efficient storage and processing
-categorical_columns = ['Age', 'RemoteWork', 'EdLevel', 'DevType', 'Industry', 'OrgSize', 'ICorPM','Employment']
-for col in categorical_columns:
-    clean_df[col] = clean_df[col].astype('category')
+# Columns whose per-group counts decide the global thresholds
+group_cols = ['DevType', 'Industry', 'Employment']
+
+
+def read_chunks(paths, columns, chunksize=CHUNKSIZE):
+    """
+    Yields the survey files in paths one after another, chunksize rows at a time.
+    """
+    for path in paths:
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunksize,
+                               dtype={column: PREPROCESSING_DTYPES[column] for column in columns if column in PREPROCESSING_DTYPES})
+
+
+def count_countries(paths, chunksize=CHUNKSIZE):
+    """
+    Pass 1: number of responses per country over all the input files.
+    """
+    counts = pd.Series(dtype='int64')
+    for chunk in read_chunks(paths, ['Country'], chunksize):
+        counts = counts.add(chunk['Country'].astype(object).value_counts(), fill_value=0)
+
+    return counts.astype('int64').sort_values(ascending=False)
+
+
+def clean_chunk(chunk, countries_shortlisted):
+    """
+    Pass 2: every filter and transform that only looks at one row at a time.
+    """
+    # Keep only data from shortlisted countries
+    df = chunk[chunk['Country'].isin(countries_shortlisted)]
+
+    # Create a subset DataFrame with the selected columns
+    df_subset = df[required_cols]
+
+    # Drop all rows with any NaN values to ensure data quality
+    df_final = df_subset.dropna()
+
+    # Apply the vectorized helpers to format 'OrgSize' and 'YearsCodePro' columns for consistency
+    df_final['OrgSize'] = convert_OrgSize_column(df_final['OrgSize'])
+    df_final['YearsCodePro'] = convert_YearsCodePro_column(df_final['YearsCodePro'])
+
+    df_final['EdLevel'] = df_final['EdLevel'].astype(object).map(education_levels)
+
+    # Filter the dataset to include only respondents from the United States
+    df_usa = df_final[df_final['Country'] == 'United States of America']
+
+    # Remove any records with discrepancies between 'CompTotal' & 'ConvertedCompYearly'
+    df_usa = df_usa[df_usa['CompTotal'] == df_usa['ConvertedCompYearly']]
+
+    # Exclude specific categories from 'MainBranch', 'Age', 'EdLevel', and 'OrgSize' for more focused analysis
+    df_oa = df_usa[~df_usa['MainBranch'].isin(['I am not primarily a developer, but I write code sometimes as part of my work/studies'])]
+    df_oa = df_oa[~df_oa['Age'].isin(['Prefer not to say', 'Under 18 years old'])]
+    df_oa = df_oa[~df_oa['EdLevel'].isin(['Something else'])]
+    df_oa = df_oa[~df_oa['OrgSize'].isin(["I don't know", "Frelancer/Sole Proprietor"])]
+
+    # Categories differ from chunk to chunk, so spill plain values
+    return df_oa.astype({column: object for column in df_oa.columns if isinstance(df_oa[column].dtype, pd.CategoricalDtype)})
+
+
+def shortlist_groups(group_counts):
+    """
+    Applies the count thresholds in the same order as the in-memory filters, using only the
+    per-(DevType, Industry, Employment) counts of the cleaned rows.
+
+    Returns:
+    - tuple: (shortlisted DevTypes, Industries, Employment types).
+    """
+    # Filter 'DevType' and 'Industry' to include only those with at least 50 data points
+    devtype_counts = group_counts.groupby(level='DevType').sum()
+    devtypes = devtype_counts.index[devtype_counts >= 50]
+    group_counts = group_counts[group_counts.index.get_level_values('DevType').isin(devtypes)]
+
+    industry_counts = group_counts.groupby(level='Industry').sum()
+    industries = industry_counts.index[industry_counts >= 50]
+    group_counts = group_counts[group_counts.index.get_level_values('Industry').isin(industries)]
+
+    # Shortlist employment types based on a custom threshold using a helper function
+    employment_shortlisted = records_to_consider(group_counts.groupby(level='Employment').sum(), threshold=10)
+
+    return list(devtypes), list(industries), employment_shortlisted
+
+
+def filter_chunk(df_oa, devtypes, industries, employment_shortlisted):
+    """
+    Pass 3 and 4: the count thresholds and the compensation range.
+    """
+    df_oa = df_oa[df_oa['DevType'].isin(devtypes) & df_oa['Industry'].isin(industries)]
+    df_oa = df_oa[df_oa['Employment'].isin(employment_shortlisted)]
+
+    # Filter records to include only those with a yearly compensation between $40,000 and $300,000
+    return df_oa[(df_oa['ConvertedCompYearly'] >= 40000) & (df_oa['ConvertedCompYearly'] <= 300000)]
+
+
+def run_pipeline(paths, output_path=CLEAN_PATH, chunksize=CHUNKSIZE):
+    """
+    Streams the survey files in paths through the preprocessing steps and writes the clean USA dataset.
+
+    Parameters:
+    - paths (list): survey_results_public.csv files in the same schema, processed as one concatenated survey.
+    - output_path (str, optional): Where to write the clean CSV.
+    - chunksize (int, optional): Rows read per chunk; peak memory grows with this, not with the input size.
+
+    Returns:
+    - dict: (min, max) compensation of each salary bracket.
+
+    Raises:
+    - ValueError: If no response survives the filters.
+    """
+    # Pass 1: filter countries with at least 1000 data points using a custom helper function
+    countries_shortlisted = records_to_consider(count_countries(paths, chunksize))
+
+    with tempfile.TemporaryDirectory() as spill_dir:
+        # Pass 2: clean each chunk, spill it and count the survivors per group
+        spill_paths = []
+        group_counts = None
+        for chunk in read_chunks(paths, required_cols, chunksize):
+            df_oa = clean_chunk(chunk, countries_shortlisted)
+
+            spill_paths.append(os.path.join(spill_dir, f'chunk_{len(spill_paths):05d}.pkl'))
+            df_oa.to_pickle(spill_paths[-1])
+
+            counts = df_oa.groupby(group_cols).size()
+            group_counts = counts if group_counts is None else group_counts.add(counts, fill_value=0)
+
+        if group_counts is None:
+            group_counts = pd.Series(dtype='int64', index=pd.MultiIndex.from_arrays([[], [], []], names=group_cols))
+        devtypes, industries, employment_shortlisted = shortlist_groups(group_counts)
+
+        # Pass 3: the bracket edges are quantiles over every remaining record
+        compensation = np.concatenate([np.array([], dtype='float64')] +
+                                      [filter_chunk(pd.read_pickle(path), devtypes, industries, employment_shortlisted)
+                                       ['ConvertedCompYearly'].to_numpy() for path in spill_paths])
+        if len(compensation) == 0:
+            raise ValueError(f"No USA responses in {', '.join(paths)} pass the preprocessing filters, "
+                             "so there is nothing to split into salary brackets")
+        bin_edges = pd.Series(compensation).quantile(quantiles).to_numpy()
+
+        # Pass 4: label each record with its bracket (same edges and closure as pd.qcut) and append it to the output
+        bin_ranges = {}
+        for chunk_number, path in enumerate(spill_paths):
+            df_oa = filter_chunk(pd.read_pickle(path), devtypes, industries, employment_shortlisted)
+            df_oa['SalaryBracket'] = pd.cut(df_oa['ConvertedCompYearly'], bins=bin_edges, labels=bin_labels, include_lowest=True)
+
+            for label, values in df_oa.groupby('SalaryBracket', observed=True)['ConvertedCompYearly']:
+                low, high = bin_ranges.get(label, (values.min(), values.max()))
+                bin_ranges[label] = (min(low, values.min()), max(high, values.max()))
+
+            clean_df = df_oa.drop(cols_to_drop, axis=1)
+            clean_df.to_csv(output_path, mode='w' if chunk_number == 0 else 'a', header=chunk_number == 0, index=False)
+
+    return bin_ranges
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build the clean USA training data from the public survey.")
+    parser.add_argument('--input', nargs='+', default=[SURVEY_PATH], help="one or more survey_results_public.csv files")
+    parser.add_argument('--output', default=CLEAN_PATH)
+    parser.add_argument('--chunksize', type=int, default=CHUNKSIZE)
+    args = parser.parse_args()
+
+    bin_ranges = run_pipeline(args.input, args.output, args.chunksize)
 
-# Save the cleaned and processed DataFrame to a new CSV file
-clean_df.to_csv("../stack-overflow-developer-survey-results-2023/survey_results_clean_usa.csv",index=False)
+    for label in bin_labels:
+        print(label, bin_ranges.get(label))
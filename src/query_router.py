@@ -0,0 +1,221 @@
+"""
+Deterministic fast path for the chatbot.
+
+Simple aggregate questions such as "What was the median salary of Data Scientists in the IT field in USA,
+broken down by Education level?" are parsed into (metric, filters, group-by) over known columns of the
+preprocessed survey and answered directly with pandas. Anything the router does not fully understand
+returns None and goes to the LLM agent instead.
+
+Salary questions are answered from the preprocessed survey, which only keeps respondents with a salary
+and every other answer, in countries with enough responses. "How many respondents..." questions are
+counted over every response of the raw survey instead; without it they go to the agent.
+"""
+import re
+from collections import namedtuple
+
+from helpers import convert_OrgSize_column, renaming_education_level
+
+Intent = namedtuple('Intent', ['metric', 'filters', 'group_by'])
+
+# Metric words -> pandas aggregation over ConvertedCompYearly
+METRIC_PATTERNS = [(r'\bmedian\b', 'median'), (r'\b(?:mean|average|avg)\b', 'mean'),
+                   (r'\b(?:maximum|max|highest)\b', 'max'), (r'\b(?:minimum|min|lowest)\b', 'min')]
+
+SALARY_PATTERN = r'\b(?:salar(?:y|ies)|compensation|pay|income|earnings?)\b'
+COUNT_PATTERN = r'\b(?:how many|number of|count of)\b'
+
+# Phrases -> (column, value) filters on the preprocessed survey
+FILTER_ALIASES = {
+    'DevType': [(r'data scientists?|machine learning (?:specialists?|engineers?)', 'Data scientist or machine learning specialist'),
+                (r'full[- ]stack(?: developers?)?', 'Developer, full-stack'),
+                (r'back[- ]?end(?: developers?)?', 'Developer, back-end'),
+                (r'front[- ]?end(?: developers?)?', 'Developer, front-end'),
+                (r'mobile developers?', 'Developer, mobile'),
+                (r'embedded (?:developers?|engineers?)', 'Developer, embedded applications or devices'),
+                (r'desktop (?:developers?|engineers?)', 'Developer, desktop or enterprise applications'),
+                (r'data engineers?', 'Engineer, data'),
+                (r'site reliability engineers?|sres?', 'Engineer, site reliability'),
+                (r'devops(?: specialists?| engineers?)?', 'DevOps specialist'),
+                (r'cloud (?:infrastructure )?engineers?', 'Cloud infrastructure engineer'),
+                (r'engineering managers?', 'Engineering manager'),
+                (r'senior executives?|c-suite|executives?', 'Senior Executive (C-Suite, VP, etc.)')],
+    'Industry': [(r'(?:it|i\.t\.) (?:field|sector|industry)|tech(?:nology)? (?:field|sector|industry)|software industry',
+                  'Information Services, IT, Software Development, or other Technology'),
+                 (r'financial services|finance(?: sector| industry)?|fintech', 'Financial Services'),
+                 (r'healthcare(?: sector| industry)?', 'Healthcare'),
+                 (r'insurance(?: sector| industry)?', 'Insurance'),
+                 (r'retail(?: sector| industry)?', 'Retail and Consumer Services'),
+                 (r'higher education(?: sector)?', 'Higher Education'),
+                 (r'manufacturing(?: sector| industry)?', 'Manufacturing, Transportation, or Supply Chain'),
+                 (r'advertising(?: sector| industry)?', 'Advertising Services')],
+    'Country': [(r'usa|u\.s\.a?\.?|united states(?: of america)?|america|the us', 'United States of America'),
+                (r'uk|u\.k\.|united kingdom|britain|great britain', 'United Kingdom of Great Britain and Northern Ireland')],
+    'RemoteWork': [(r'fully remote|remote workers?|working remotely', 'Remote'),
+                   (r'in-person|in the office|on-site|onsite', 'In-person'),
+                   (r'hybrid(?: workers?)?', 'Hybrid (some remote, some in-person)')],
+    'ICorPM': [(r'individual contributors?|ics?', 'Individual contributor'),
+               (r'people managers?', 'People manager')],
+}
+
+# Phrases after "by", "per", "for each", "across" -> column to group by
+GROUP_BY_ALIASES = [(r'education(?:al)? levels?|education|degrees?|edlevel', 'EdLevel'),
+                    (r'countr(?:y|ies)', 'Country'),
+                    (r'industr(?:y|ies)', 'Industry'),
+                    (r'developer types?|dev ?types?|roles?|professions?|job titles?', 'DevType'),
+                    (r'age(?: groups?)?', 'Age'),
+                    (r'remote work|work ?modes?|work arrangements?', 'RemoteWork'),
+                    (r'organi[sz]ation sizes?|org ?sizes?|company sizes?', 'OrgSize'),
+                    (r'years of (?:work )?experience|work experience|experience', 'WorkExp')]
+
+GROUP_BY_PREFIX = r'\b(?:(?:broken down|breakdown|split|grouped|group) by|by|per|for each|for every|across)\s+(?:the\s+|each\s+)?'
+
+# Columns that can be filtered or grouped on
+INTENT_COLUMNS = sorted(set(FILTER_ALIASES) | {column for _, column in GROUP_BY_ALIASES})
+
+# Words that carry no meaning for the aggregate. Anything else left over means the question was not fully understood.
+FILLER_WORDS = {'what', 'whats', 'was', 'is', 'were', 'are', 'the', 'of', 'in', 'for', 'a', 'an', 'and', 'at', 'to', 'among',
+                'with', 'who', 'work', 'working', 'works', 'including', 'include', 'also', 'annual', 'annually', 'yearly',
+                'year', 'per', 'give', 'me', 'show', 'tell', 'please', 'can', 'you', 'field', 'sector', 'industry',
+                'developers', 'developer', 'respondents', 'respondent', 'people', 'professionals', 'employees', 'engineers',
+                'usd', 'dollars', 'us', 'how', 'much', 'do', 'does', 'did', 'make', 'get', 'earn', 'earned', 'overall',
+                '2023', 'survey', 'stackoverflow', 'stack', 'overflow', 'according', 'based', 'on', 'data', 'there',
+                'as', 'well', 'by', 'breakdown', 'broken', 'down', 'each', 'every', 'across', 'split', 'grouped', 'total'}
+
+
+def _match(pattern, text):
+    return re.search(r'(?<![\w-])(?:' + pattern + r')(?![\w-])', text)
+
+
+def _consume(pattern, text):
+    # Returns the text with the first match of pattern blanked out, or None if there is no match.
+    match = _match(pattern, text)
+    if match is None:
+        return None
+    return text[:match.start()] + ' ' + text[match.end():]
+
+
+def counting_frame(df_raw):
+    """
+    Returns the INTENT_COLUMNS of the raw survey with the same education levels and organisation sizes
+    as the preprocessed one, for counting respondents.
+    """
+    df = df_raw[INTENT_COLUMNS].copy()
+    df['EdLevel'] = df['EdLevel'].map(renaming_education_level)
+    df['OrgSize'] = convert_OrgSize_column(df['OrgSize'])
+    return df
+
+
+class QueryRouter:
+    """
+    Answers (metric, filter, group-by) questions about compensation directly from the preprocessed survey.
+
+    Parameters:
+    - df_final (pd.DataFrame): The output of preprocess_till_Ed_Level (survey.final).
+    - df_raw (pd.DataFrame, optional): The raw survey (survey.raw), used to count respondents. Without it,
+      count questions are left to the agent.
+    """
+
+    def __init__(self, df_final, df_raw=None):
+        self.df = df_final
+        self.df_counts = counting_frame(df_raw) if df_raw is not None else None
+
+        # Any country present in the data can be named in full. Full names are tried before the short
+        # aliases so "United Kingdom of Great Britain..." is not cut short at "United Kingdom".
+        countries_frame = self.df_counts if self.df_counts is not None else df_final
+        countries = [str(country) for country in countries_frame['Country'].dropna().unique()]
+        self.filter_aliases = dict(FILTER_ALIASES)
+        self.filter_aliases['Country'] = [(re.escape(country.lower()), country)
+                                          for country in sorted(countries, key=len, reverse=True)] + FILTER_ALIASES['Country']
+
+    def parse(self, query):
+        """
+        Parses query into an Intent, or returns None when it is not a simple aggregate question.
+        """
+        text = ' ' + query.lower().replace('’', "'").replace("'s", '') + ' '
+        text = re.sub(r'[?,!;:()]', ' ', text)
+
+        metric = None
+        for pattern, name in METRIC_PATTERNS:
+            remaining = _consume(pattern, text)
+            if remaining is not None:
+                metric, text = name, remaining
+                break
+
+        remaining = _consume(SALARY_PATTERN, text)
+        if metric is not None and remaining is not None:
+            text = remaining
+        else:
+            remaining = _consume(COUNT_PATTERN, text)
+            if metric is not None or remaining is None:
+                return None
+            metric, text = 'count', remaining
+
+        group_by = None
+        for pattern, column in GROUP_BY_ALIASES:
+            remaining = _consume(GROUP_BY_PREFIX + '(?:' + pattern + ')', text)
+            if remaining is not None:
+                group_by, text = column, remaining
+                break
+
+        filters = {}
+        for column, aliases in self.filter_aliases.items():
+            for pattern, value in aliases:
+                remaining = _consume(pattern, text)
+                if remaining is not None:
+                    filters[column], text = value, remaining
+                    break
+
+        leftover = [word for word in re.findall(r"[\w.'-]+", text) if word.strip('.') and word.strip('.') not in FILLER_WORDS]
+        if leftover:
+            return None
+
+        return Intent(metric, filters, group_by)
+
+    def compute(self, intent):
+        """
+        Evaluates an Intent on the survey.
+
+        Returns:
+        - tuple: (result, number of matching respondents) where result is a scalar, or a Series when grouped.
+        """
+        df = self.df_counts if intent.metric == 'count' else self.df
+        for column, value in intent.filters.items():
+            df = df[df[column] == value]
+
+        if intent.metric == 'count':
+            if intent.group_by is None:
+                return len(df), len(df)
+            return df.groupby(intent.group_by, observed=True).size().sort_values(ascending=False), len(df)
+
+        values = df['ConvertedCompYearly']
+        if intent.group_by is None:
+            result = values.agg(intent.metric)
+        else:
+            result = values.groupby(df[intent.group_by], observed=True).agg(intent.metric).sort_values(ascending=False)
+
+        return result, len(df)
+
+    def answer(self, query):
+        """
+        Returns a markdown answer to query, or None if the query should go to the agent.
+        """
+        intent = self.parse(query)
+        if intent is None or (intent.metric == 'count' and self.df_counts is None):
+            return None
+
+        result, respondents = self.compute(intent)
+        if respondents == 0:
+            return None
+
+        scope = ', '.join(f"{column} = {value}" for column, value in intent.filters.items()) or 'all respondents'
+        subject = 'Number of respondents' if intent.metric == 'count' else f"{intent.metric.capitalize()} yearly compensation (USD)"
+
+        if intent.group_by is None and intent.metric == 'count':
+            return f"{subject} for {scope}: **{result:,}**."
+
+        if intent.group_by is None:
+            return f"{subject} for {scope}: **${result:,.0f}** (based on {respondents:,} survey responses)."
+
+        rows = '\n'.join(f"| {label} | {value:,.0f} |" for label, value in result.items())
+        return (f"{subject} for {scope}, by {intent.group_by} (based on {respondents:,} survey responses):\n\n"
+                f"| {intent.group_by} | {subject} |\n|---|---|\n{rows}")
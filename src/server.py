@@ -0,0 +1,317 @@
+"""
+Standalone HTTP inference service for the compensation range predictor.
+
+It is a plain ASGI application, independent of the Streamlit app, serving:
+    GET  /health         -> {"status": "ok"}
+    POST /predict        -> one respondent in, one prediction out
+    POST /predict/batch  -> {"records": [...]} in, {"predictions": [...]} out
+    GET  /metrics        -> request, batch and model timings as Prometheus text (see instrumentation.py)
+
+Each prediction carries the bracket, its salary range, the probability of every bracket and the
+expected salary, all from the one predict_proba call of its batch.
+
+Concurrent requests are collected into micro-batches (up to max_batch_size records, waiting at most
+max_wait_ms for more to arrive) so the hybrid classifier is called once per batch instead of once per request.
+
+Timings are only collected when instrumentation is on (--metrics, or SURVEY_METRICS=1 for uvicorn).
+
+Usage (from src/):
+    python server.py --port 8000
+    python server.py --port 8000 --metrics
+    uvicorn server:app --port 8000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+from helpers import FEATURE_ORDER, salary_ranges
+from instrumentation import PROMETHEUS_CONTENT_TYPE, configure, count, render_prometheus, span
+from predictor import WEIGHTS_DIR, load_predictor
+
+
+ROUTES = {'/health', '/metrics', '/predict', '/predict/batch'}
+
+logger = logging.getLogger(__name__)
+
+
+class RequestError(Exception):
+    """A client error that is reported back with HTTP status 422."""
+
+
+def parse_record(record):
+    """
+    Validates one respondent posted to the service and applies the same rules as the tab2 form.
+
+    Parameters:
+    - record (dict): Raw feature values keyed by FEATURE_ORDER column names.
+
+    Returns:
+    - dict: The record restricted to FEATURE_ORDER, with YearsCodePro as a float (0 becomes 0.5).
+    """
+    if not isinstance(record, dict):
+        raise RequestError("Each record must be a JSON object")
+
+    missing = [column for column in FEATURE_ORDER if column not in record]
+    if missing:
+        raise RequestError(f"Missing features: {missing}")
+
+    features = {column: record[column] for column in FEATURE_ORDER}
+    try:
+        years = float(features['YearsCodePro'])
+    except (TypeError, ValueError):
+        raise RequestError("YearsCodePro must be a number")
+    features['YearsCodePro'] = years if years != 0 else 0.5
+
+    return features
+
+
+class MicroBatcher:
+    """
+    Groups records from concurrent requests and scores them with a single predict_distribution call.
+
+    Parameters:
+    - predictor (CompensationPredictor): The loaded model artifacts.
+    - max_batch_size (int, optional): Upper bound on records per model call. Default is 256.
+    - max_wait_ms (float, optional): How long the first queued record waits for others. Default is 5.
+    """
+
+    def __init__(self, predictor, max_batch_size=256, max_wait_ms=5):
+        self.predictor = predictor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue = asyncio.Queue()
+        self.worker = None
+        self.batches = 0
+        self.records = 0
+
+    def start(self):
+        # A worker that ended anyway is replaced, so queued requests are never left without one
+        if self.worker is None or self.worker.done():
+            self.worker = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            try:
+                await self.worker
+            except asyncio.CancelledError:
+                pass
+            self.worker = None
+
+    async def submit(self, records):
+        """
+        Queues records for prediction and waits for their bracket distributions (one dict per record).
+        """
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((records, future))
+        return await future
+
+    async def collect(self):
+        # Block for the first request, then gather whatever arrives within the wait window.
+        pending = [await self.queue.get()]
+        size = len(pending[0][0])
+        deadline = time.monotonic() + self.max_wait
+
+        while size < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            pending.append(item)
+            size += len(item[0])
+
+        return pending
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = await self.collect()
+            try:
+                await self.predict_pending(loop, pending)
+            except Exception as error:
+                # Keep serving: an unexpected error fails this batch's requests, not every later one
+                logger.exception("Prediction batch failed")
+                for _, future in pending:
+                    set_exception(future, error)
+
+    async def predict_pending(self, loop, pending):
+        records = [record for request_records, _ in pending for record in request_records]
+
+        try:
+            predictions = await self.predict(loop, records)
+        except Exception as error:
+            # One bad request must not fail the others it was batched with, so score them one by one.
+            if len(pending) == 1:
+                set_exception(pending[0][1], error)
+            else:
+                await self.predict_individually(loop, pending)
+            return
+
+        offset = 0
+        for request_records, future in pending:
+            set_result(future, predictions[offset:offset + len(request_records)])
+            offset += len(request_records)
+
+    async def predict(self, loop, records):
+        # The model call is CPU bound; keep the event loop free to accept the next batch.
+        columns = {column: [record[column] for record in records] for column in FEATURE_ORDER}
+        distribution = await loop.run_in_executor(None, self.score, columns)
+        self.batches += 1
+        self.records += len(records)
+        count('predict_batches')
+        count('predicted_records', len(records))
+        return distribution.to_dict('records')
+
+    def score(self, columns):
+        with span('predict_batch'):
+            return self.predictor.predict_distribution(columns, 1)
+
+    async def predict_individually(self, loop, pending):
+        for request_records, future in pending:
+            if future.done():
+                continue
+            try:
+                set_result(future, await self.predict(loop, request_records))
+            except Exception as error:
+                set_exception(future, error)
+
+
+# A client that disconnects cancels its future, so it may be done before its batch is
+def set_result(future, result):
+    if not future.done():
+        future.set_result(result)
+
+
+def set_exception(future, error):
+    if not future.done():
+        future.set_exception(error)
+
+
+def format_prediction(prediction):
+    label = prediction['SalaryBracket']
+    probabilities = {key[2:-1]: value for key, value in prediction.items() if key.startswith('P(')}
+    return {'SalaryBracket': label, 'SalaryRange': salary_ranges.get(label), 'Probabilities': probabilities,
+            'ExpectedSalary': round(prediction['ExpectedSalary'])}
+
+
+async def read_json(receive):
+    body = b''
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get('body', b'')
+        more_body = message.get('more_body', False)
+
+    try:
+        return json.loads(body or b'null')
+    except json.JSONDecodeError:
+        raise RequestError("Request body must be valid JSON")
+
+
+async def send_json(send, status, payload):
+    await send_body(send, status, json.dumps(payload).encode(), b'application/json')
+
+
+async def send_body(send, status, body, content_type):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', content_type), (b'content-length', str(len(body)).encode())]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def create_app(weights_dir=WEIGHTS_DIR, max_batch_size=256, max_wait_ms=5):
+    """
+    Builds the ASGI application. The model is loaded on startup and kept for the life of the process.
+    """
+    state = {}
+
+    def get_batcher():
+        if 'batcher' not in state:
+            state['batcher'] = MicroBatcher(load_predictor(weights_dir), max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+        return state['batcher']
+
+    async def lifespan(receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                get_batcher().start()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if 'batcher' in state:
+                    await state['batcher'].stop()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def app(scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await lifespan(receive, send)
+            return
+
+        method, path = scope['method'], scope['path'].rstrip('/')
+        # Unknown paths share one label, so they cannot blow up the number of series
+        route = path if path in ROUTES else 'other'
+
+        with span('http_request', route=route):
+            status = await handle(method, path, receive, send)
+        count('http_responses', route=route, status=status)
+
+    async def handle(method, path, receive, send):
+        try:
+            if method == 'GET' and path == '/health':
+                await send_json(send, 200, {'status': 'ok'})
+
+            elif method == 'GET' and path == '/metrics':
+                await send_body(send, 200, render_prometheus().encode(), PROMETHEUS_CONTENT_TYPE.encode())
+
+            elif method == 'POST' and path == '/predict':
+                record = parse_record(await read_json(receive))
+                predictions = await get_batcher().submit([record])
+                await send_json(send, 200, format_prediction(predictions[0]))
+
+            elif method == 'POST' and path == '/predict/batch':
+                payload = await read_json(receive)
+                raw_records = payload.get('records') if isinstance(payload, dict) else payload
+                if not isinstance(raw_records, list) or not raw_records:
+                    raise RequestError("Expected a non-empty list of records under 'records'")
+                predictions = await get_batcher().submit([parse_record(record) for record in raw_records])
+                await send_json(send, 200, {'predictions': [format_prediction(prediction) for prediction in predictions]})
+
+            else:
+                await send_json(send, 404, {'error': f"No route for {method} {path}"})
+                return 404
+
+        except (RequestError, ValueError) as error:
+            # ValueError comes from the encoders when a category was not seen during training.
+            await send_json(send, 422, {'error': str(error)})
+            return 422
+
+        return 200
+
+    app.get_batcher = get_batcher
+    return app
+
+
+app = create_app()
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve compensation range predictions over HTTP.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--weights-dir', default=WEIGHTS_DIR)
+    parser.add_argument('--max-batch-size', type=int, default=256)
+    parser.add_argument('--max-wait-ms', type=float, default=5)
+    parser.add_argument('--metrics', action='store_true', help="collect timings for GET /metrics")
+    args = parser.parse_args()
+
+    if args.metrics:
+        configure(enabled=True)
+
+    uvicorn.run(create_app(args.weights_dir, args.max_batch_size, args.max_wait_ms), host=args.host, port=args.port)
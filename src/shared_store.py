@@ -0,0 +1,117 @@
+"""
+Survey frames shared by every session and worker process on a host.
+
+Each frame is written once as an uncompressed Arrow IPC (Feather v2) file named after the survey's
+content hash, and every process opens it through a memory map. Categorical codes and numeric columns
+without missing values become read-only views of the mapped file, so the operating system keeps a
+single copy of them in its page cache no matter how many processes read them. Within a process the
+frames are cached (see plotting_helpers.load_survey_frames and the st.cache_resource functions in
+main.py), so sessions share the same objects and must treat them as read-only.
+
+A file is named after the frame, its schema version and the survey's content hash, so it is rebuilt
+whenever the survey changes. The code building a frame owns its schema version and must bump it when
+it changes what it returns (e.g. plotting_helpers.SURVEY_FRAMES_VERSION); the files of the old code are
+then left alone. The columns and dtypes of a mapped file are also checked against the ones the caller
+expects, and a file that does not match is rebuilt.
+
+Prebuild or clear the shared frames (from src/):
+    python shared_store.py
+    python shared_store.py --clear
+"""
+import argparse
+import glob
+import logging
+import os
+
+import pyarrow as pa
+import pyarrow.feather as feather
+
+logger = logging.getLogger(__name__)
+
+SHARED_DIR = "../stack-overflow-developer-survey-results-2023/shared"
+
+
+def shared_frame_path(name, version, shared_dir=SHARED_DIR, schema_version=1):
+    return os.path.join(shared_dir, f"{name}-v{schema_version}-{version[:16]}.arrow")
+
+
+def frame_dtypes(df):
+    return {column: str(dtype) for column, dtype in df.dtypes.items()}
+
+
+def write_shared_frame(df, path):
+    """
+    Writes df as an uncompressed Arrow file, atomically so concurrent readers never see a partial file.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    feather.write_feather(pa.Table.from_pandas(df), tmp_path, compression='uncompressed')
+    os.replace(tmp_path, path)
+
+
+def open_shared_frame(path):
+    """
+    Memory-maps an Arrow file written by write_shared_frame and returns it as a DataFrame.
+    """
+    table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    return table.to_pandas(split_blocks=True)
+
+
+def shared_frame(name, version, build, shared_dir=SHARED_DIR, schema_version=1, dtypes=None):
+    """
+    Returns the shared copy of a frame, building and writing it first if no process has yet.
+
+    Parameters:
+    - name (str): Name of the frame, e.g. 'raw'.
+    - version (str): Content hash of the survey the frame is derived from.
+    - build (callable): Returns the frame; only called when the shared file does not exist or does not match dtypes.
+    - shared_dir (str, optional): Where the shared files live. None disables sharing and just calls build().
+    - schema_version (int, optional): Version of the code building the frame. Default is 1.
+    - dtypes (dict, optional): The frame's columns and their dtypes as strings (e.g. 'category'), checked
+      against the mapped file.
+
+    Returns:
+    - pd.DataFrame: The frame, backed by the memory-mapped file where possible.
+    """
+    if shared_dir is None:
+        return build()
+
+    path = shared_frame_path(name, version, shared_dir, schema_version)
+    if not os.path.exists(path):
+        write_shared_frame(build(), path)
+
+    df = open_shared_frame(path)
+    if dtypes is not None and frame_dtypes(df) != dtypes:
+        logger.warning("Rebuilding %s: its columns do not match the ones expected by this code", path)
+        write_shared_frame(build(), path)
+        df = open_shared_frame(path)
+
+    return df
+
+
+def clear_shared_frames(shared_dir=SHARED_DIR):
+    """
+    Deletes every shared frame. Processes that already mapped them keep their views.
+    """
+    paths = glob.glob(os.path.join(shared_dir, '*.arrow'))
+    for path in paths:
+        os.remove(path)
+    return paths
+
+
+if __name__ == '__main__':
+    from helpers import SURVEY_PATH
+    from plotting_helpers import load_survey_frames
+
+    parser = argparse.ArgumentParser(description="Prebuild or clear the shared survey frames.")
+    parser.add_argument('--survey', default=SURVEY_PATH)
+    parser.add_argument('--shared-dir', default=SHARED_DIR)
+    parser.add_argument('--clear', action='store_true', help="delete the shared frames instead of building them")
+    args = parser.parse_args()
+
+    if args.clear:
+        print(f"Removed {len(clear_shared_frames(args.shared_dir))} shared frames from {args.shared_dir}")
+    else:
+        survey = load_survey_frames(args.survey, shared_dir=args.shared_dir)
+        print(f"Shared frames for survey version {survey.version[:16]} are in {args.shared_dir}")
@@ -0,0 +1,279 @@
+"""
+Trains the compensation range model from survey_results_clean_usa.csv (the output of preprocessing.py).
+
+This is the procedure of notebooks/Compensation Prediction Modeling.ipynb as a script: the categorical
+features are label encoded, EdLevel is mapped to its ordinal and the salary brackets to their codes. A
+stratified 80% split is used for training. The soft-voting hybrid classifier (random forest, decision tree,
+gradient boosting) is tuned by a cross-validated grid search run in parallel over every core (40 fits,
+about 6.5 minutes on one core for the 2023 survey; see PARAM_GRID).
+
+Each run writes a model bundle (see model_bundle.py) to its own version directory. The bundle's
+metadata is the training manifest: the data hashes, the chosen hyperparameters, the metrics and the
+training time. --promote also copies the bundle into saved_weights, where the app and the prediction
+service read it.
+
+--calibrate keeps a stratified quarter of the training split aside and fits a sigmoid or isotonic
+calibration of the chosen model's probabilities on it (CalibratedClassifierCV), so the bracket
+probabilities of CompensationPredictor.predict_distribution can be read as frequencies. The log loss and
+Brier score of every split are recorded next to the accuracy.
+
+Usage (from src/):
+    python train.py
+    python train.py --jobs 8 --promote
+    python train.py --no-search   # the notebook's hyperparameters, no grid search
+    python train.py --calibrate isotonic
+"""
+import argparse
+import os
+import platform
+import shutil
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.calibration import CalibratedClassifierCV
+from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier, VotingClassifier
+from sklearn.metrics import accuracy_score, classification_report, log_loss
+from sklearn.model_selection import GridSearchCV, StratifiedKFold, train_test_split
+from sklearn.preprocessing import LabelEncoder
+from sklearn.tree import DecisionTreeClassifier
+
+from helpers import FEATURE_ORDER
+from helpers import OrgSize_keys, EdLevel_keys, Industry_keys, DevType_keys, Age_keys, RemoteWork_keys, IcorPM_keys, Employment_keys
+from plotting_helpers import file_content_hash
+from model_bundle import model_files, publish_bundle, read_bundle_info, write_bundle
+from predictor import LABEL_ENCODED_COLUMNS, WEIGHTS_DIR, CompensationPredictor
+from preprocessing import CLEAN_PATH
+
+TEST_PATH = "../stack-overflow-developer-survey-results-2023/test_set_usa_2023.csv"
+BUNDLES_DIR = os.path.join(WEIGHTS_DIR, 'bundles')
+
+education_level_map = {'Primary School': 0, 'Secondary School': 1, 'Some College': 2, 'Associate degree': 3,
+                       'Bachelors': 4, 'Masters': 5, 'PhD, Postdoc': 6}
+
+salary_mapping = {'Low': 0, 'Low-Mid': 1, 'Mid': 2, 'Mid-High': 3, 'High': 4}
+
+# Values the tab2 form can send; the fitted encoders should know all of them
+FORM_VALUES = {'Age': Age_keys, 'Employment': Employment_keys, 'RemoteWork': RemoteWork_keys, 'EdLevel': EdLevel_keys,
+               'DevType': DevType_keys, 'Industry': Industry_keys, 'OrgSize': OrgSize_keys, 'ICorPM': IcorPM_keys}
+
+# The notebook's hyperparameters are one point of the grid. The forest size and tree depth stay at the
+# notebook's values: 8 candidates x 5 folds = 40 fits. On one core a fit of ~3.6k training rows takes about
+# 5.5s with gbc__max_depth=5 and 13.5s with 20, so the search takes about 6.5 minutes divided by the cores
+# used, and grows about linearly with the rows.
+PARAM_GRID = {'rf__min_samples_split': [2, 5],
+              'gbc__learning_rate': [0.1, 0.5],
+              'gbc__max_depth': [5, 20]}
+
+
+def hybrid_classifier():
+    """
+    The notebook's soft-voting classifier, with its hyperparameters.
+    """
+    rf = RandomForestClassifier(n_estimators=500, min_samples_split=5, random_state=42)
+    dt = DecisionTreeClassifier(min_samples_split=2, max_depth=20, random_state=42)
+    gbc = GradientBoostingClassifier(n_estimators=100, learning_rate=0.5, max_depth=20, random_state=42)
+
+    return VotingClassifier(estimators=[('rf', rf), ('tree', dt), ('gbc', gbc)], voting='soft')
+
+
+def fit_encoders(df):
+    """
+    Fits one LabelEncoder per categorical feature.
+
+    Returns:
+    - dict: Fitted LabelEncoders keyed by column.
+    """
+    return {column: LabelEncoder().fit(df[column]) for column in LABEL_ENCODED_COLUMNS}
+
+
+def encode_dataset(df, encoders):
+    """
+    Encodes the features and the salary bracket of a clean dataset.
+
+    Returns:
+    - tuple: (X in FEATURE_ORDER, y as salary bracket codes).
+    """
+    X = df[FEATURE_ORDER].copy()
+    for column, encoder in encoders.items():
+        X[column] = encoder.transform(X[column])
+    X['EdLevel'] = X['EdLevel'].map(education_level_map)
+
+    unmapped = sorted(set(df.loc[X['EdLevel'].isna(), 'EdLevel'].astype(str)))
+    if unmapped:
+        raise ValueError(f"EdLevel contains values missing from education_level_map: {unmapped}")
+
+    return X, df['SalaryBracket'].map(salary_mapping)
+
+
+def evaluate(model, X, y):
+    probabilities = model.predict_proba(X)
+    y_pred = model.classes_[probabilities.argmax(axis=1)]
+
+    # Multi-class Brier score: squared distance between the predicted distribution and the one-hot outcome
+    outcome = (np.asarray(y)[:, None] == model.classes_).astype(float)
+    return {'accuracy': accuracy_score(y, y_pred), 'rows': len(y),
+            'log_loss': log_loss(y, probabilities, labels=model.classes_),
+            'brier': float(((probabilities - outcome) ** 2).sum(axis=1).mean()),
+            'report': classification_report(y, y_pred, labels=list(salary_mapping.values()),
+                                            target_names=list(salary_mapping), output_dict=True, zero_division=0)}
+
+
+def unknown_form_values(encoders):
+    """
+    Returns the tab2 form values the fitted encoders cannot encode, keyed by column.
+    """
+    known = {column: set(encoder.classes_) for column, encoder in encoders.items()}
+    known['EdLevel'] = set(education_level_map)
+
+    unknown = {column: [value for value in values if value not in known[column]] for column, values in FORM_VALUES.items()}
+    return {column: values for column, values in unknown.items() if values}
+
+
+def train(data_path=CLEAN_PATH, test_path=TEST_PATH, param_grid=PARAM_GRID, cv=5, jobs=-1, calibrate=None):
+    """
+    Fits the encoders and the hybrid classifier.
+
+    Parameters:
+    - data_path (str, optional): The clean training data written by preprocessing.py.
+    - test_path (str, optional): An extra held-out test set in the same format; skipped if the file does not exist.
+    - param_grid (dict, optional): Grid searched over the hybrid classifier. None skips the search.
+    - cv (int, optional): Cross-validation folds of the search. Default is 5.
+    - jobs (int, optional): Processes used by the search (-1 for every core). Default is -1.
+    - calibrate (str, optional): 'sigmoid' or 'isotonic' to calibrate the probabilities on a quarter of the
+      training split held out from the search. Default is None (no calibration).
+
+    Returns:
+    - tuple: (artifacts as (encoders, education_level_map, hybrid_classifier, salary_mapping), manifest dict).
+    """
+    start = time.perf_counter()
+
+    df = pd.read_csv(data_path)
+    encoders = fit_encoders(df)
+    X, y = encode_dataset(df, encoders)
+
+    X_train, X_holdout, y_train, y_holdout = train_test_split(X, y, test_size=0.2, stratify=y, random_state=42)
+    X_fit, y_fit = X_train, y_train
+    if calibrate:
+        X_fit, X_calibration, y_fit, y_calibration = train_test_split(X_train, y_train, test_size=0.25, stratify=y_train,
+                                                                      random_state=42)
+
+    search_start = time.perf_counter()
+    if param_grid:
+        search = GridSearchCV(hybrid_classifier(), param_grid, scoring='accuracy', n_jobs=jobs, refit=True,
+                              cv=StratifiedKFold(n_splits=cv, shuffle=True, random_state=42))
+        search.fit(X_fit, y_fit)
+        model = search.best_estimator_
+
+        ranking = np.argsort(search.cv_results_['rank_test_score'], kind='stable')
+        search_summary = {'best_params': search.best_params_, 'best_cv_accuracy': search.best_score_,
+                          'candidates': len(search.cv_results_['params']), 'folds': cv,
+                          'top_candidates': [{'params': search.cv_results_['params'][i],
+                                              'mean_cv_accuracy': search.cv_results_['mean_test_score'][i],
+                                              'std_cv_accuracy': search.cv_results_['std_test_score'][i]}
+                                             for i in ranking[:5]]}
+    else:
+        model = hybrid_classifier().fit(X_fit, y_fit)
+        search_summary = None
+    search_seconds = time.perf_counter() - search_start
+
+    calibration_summary = None
+    if calibrate:
+        uncalibrated = evaluate(model, X_holdout, y_holdout)
+        model = CalibratedClassifierCV(model, method=calibrate, cv='prefit').fit(X_calibration, y_calibration)
+        calibration_summary = {'method': calibrate, 'rows': len(X_calibration),
+                               'uncalibrated_holdout': {key: uncalibrated[key] for key in ['accuracy', 'log_loss', 'brier']}}
+
+    metrics = {'train': evaluate(model, X_fit, y_fit), 'holdout': evaluate(model, X_holdout, y_holdout)}
+    if test_path and os.path.exists(test_path):
+        metrics['test'] = evaluate(model, *encode_dataset(pd.read_csv(test_path), encoders))
+
+    artifacts = (encoders, dict(education_level_map), model, dict(salary_mapping))
+
+    manifest = {'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'data': {'path': os.path.abspath(data_path), 'sha256': file_content_hash(data_path), 'rows': len(df),
+                         'train_rows': len(X_fit), 'holdout_rows': len(X_holdout)},
+                'search': search_summary,
+                'calibration': calibration_summary,
+                'metrics': metrics,
+                'unknown_form_values': unknown_form_values(encoders),
+                'training_seconds': round(time.perf_counter() - start, 1),
+                'search_seconds': round(search_seconds, 1),
+                'environment': {'python': platform.python_version(), 'scikit-learn': sklearn.__version__,
+                                'pandas': pd.__version__, 'numpy': np.__version__, 'cpus': os.cpu_count(), 'jobs': jobs}}
+    if 'test' in metrics:
+        manifest['data']['test'] = {'path': os.path.abspath(test_path), 'sha256': file_content_hash(test_path)}
+
+    return artifacts, manifest
+
+
+def write_versioned_bundle(artifacts, manifest, bundles_dir=BUNDLES_DIR):
+    """
+    Writes the artifacts as a model bundle in a new version directory under bundles_dir, with the
+    manifest as its metadata.
+
+    Returns:
+    - str: The bundle directory.
+    """
+    # Fails here, rather than in the app, if the artifacts do not fit together
+    CompensationPredictor(*artifacts)
+
+    version = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}-{manifest['data']['sha256'][:8]}"
+    bundle_dir = os.path.join(bundles_dir, version)
+    write_bundle(bundle_dir, *artifacts, metadata={'version': version, **manifest})
+
+    return bundle_dir
+
+
+def promote_bundle(bundle_dir, weights_dir=WEIGHTS_DIR):
+    """
+    Copies a bundle into weights_dir, where the app loads it from.
+    """
+    # The model files are named after their hash, so copying them never touches the files of the bundle in
+    # use; the switch is the atomic replace of bundle.json in publish_bundle.
+    bundle = read_bundle_info(bundle_dir)
+    for name in model_files(bundle):
+        target = os.path.join(weights_dir, name)
+        if not os.path.exists(target):
+            shutil.copy2(os.path.join(bundle_dir, name), target + '.tmp')
+            os.replace(target + '.tmp', target)
+
+    publish_bundle(weights_dir, bundle)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the compensation range model and write a versioned artifact bundle.")
+    parser.add_argument('--data', default=CLEAN_PATH, help="clean training data written by preprocessing.py")
+    parser.add_argument('--test', default=TEST_PATH, help="extra held-out test set, used for metrics if it exists")
+    parser.add_argument('--bundles-dir', default=BUNDLES_DIR)
+    parser.add_argument('--jobs', type=int, default=-1, help="processes used by the grid search (-1 for every core)")
+    parser.add_argument('--cv', type=int, default=5, help="cross-validation folds")
+    parser.add_argument('--no-search', action='store_true', help="fit the notebook's hyperparameters without a grid search")
+    parser.add_argument('--calibrate', choices=['sigmoid', 'isotonic'], default=None,
+                        help="calibrate the bracket probabilities on a quarter of the training split")
+    parser.add_argument('--promote', action='store_true', help="copy the new bundle into saved_weights")
+    args = parser.parse_args(argv)
+
+    artifacts, manifest = train(args.data, args.test, None if args.no_search else PARAM_GRID, args.cv, args.jobs,
+                                args.calibrate)
+    bundle_dir = write_versioned_bundle(artifacts, manifest, args.bundles_dir)
+
+    for split, result in manifest['metrics'].items():
+        print(f"{split:<8} accuracy {result['accuracy']:.4f}  log loss {result['log_loss']:.4f}  "
+              f"brier {result['brier']:.4f} ({result['rows']} rows)")
+    if manifest['search']:
+        print(f"best parameters {manifest['search']['best_params']} (cv accuracy {manifest['search']['best_cv_accuracy']:.4f})")
+    if manifest['unknown_form_values']:
+        print(f"warning: the encoders cannot encode these form values: {manifest['unknown_form_values']}", file=sys.stderr)
+    print(f"Trained in {manifest['training_seconds']}s; wrote {bundle_dir}")
+
+    if args.promote:
+        promote_bundle(bundle_dir)
+        print(f"Promoted {os.path.basename(bundle_dir)} to {WEIGHTS_DIR}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from incremental_insights import SalarySummary, TDigest
+
+QUANTILES = [0.0, 0.01, 0.25, 0.5, 0.75, 0.9, 0.99, 1.0]
+
+
+def salaries(size, seed=0):
+    return np.random.default_rng(seed).lognormal(mean=11, sigma=0.7, size=size).round()
+
+
+def summary_of(*batches):
+    summary = SalarySummary()
+    for batch in batches:
+        summary.update(batch)
+    return summary
+
+
+@pytest.mark.parametrize('size', [1, 2, 7, 500, TDigest().buffer_size])
+def test_quantiles_are_exact_up_to_buffer_size(size):
+    values = salaries(size)
+    summary = summary_of(values)
+
+    for q in QUANTILES:
+        assert summary.quantile(q) == pytest.approx(pd.Series(values).quantile(q), rel=1e-12)
+    assert summary.std() == pytest.approx(pd.Series(values).std(), rel=1e-9, nan_ok=True)
+
+
+def test_merge_equals_single_fold_exactly_below_buffer_size():
+    values = salaries(1500)
+    merged = summary_of(values[:600])
+    merged.merge(summary_of(values[600:]))
+    single = summary_of(values)
+
+    assert merged.count == single.count
+    assert (merged.minimum, merged.maximum) == (single.minimum, single.maximum)
+    assert merged.mean == pytest.approx(single.mean, rel=1e-12)
+    assert merged.std() == pytest.approx(single.std(), rel=1e-9)
+    for q in QUANTILES:
+        assert merged.quantile(q) == single.quantile(q)
+
+
+def test_merge_matches_single_fold_above_buffer_size():
+    values = salaries(50000)
+    merged = summary_of(values[:20000])
+    merged.merge(summary_of(values[20000:35000], values[35000:]))
+    single = summary_of(values)
+
+    # The moments are exact; the t-digest quantiles only agree up to its approximation
+    assert merged.count == single.count == len(values)
+    assert merged.mean == pytest.approx(values.mean(), rel=1e-9)
+    assert merged.std() == pytest.approx(values.std(ddof=1), rel=1e-9)
+    assert (merged.minimum, merged.maximum) == (values.min(), values.max())
+    for q in [0.25, 0.5, 0.75, 0.9]:
+        assert merged.quantile(q) == pytest.approx(single.quantile(q), rel=0.01)
+        assert merged.quantile(q) == pytest.approx(np.quantile(values, q), rel=0.01)
+
+
+@pytest.mark.parametrize('size', [0, 10, 30000])
+def test_summary_round_trips_through_json(size):
+    summary = summary_of(salaries(size))
+    restored = SalarySummary.from_dict(json.loads(json.dumps(summary.to_dict())))
+
+    assert (restored.count, restored.mean, restored.m2) == (summary.count, summary.mean, summary.m2)
+    assert (restored.minimum, restored.maximum) == (summary.minimum, summary.maximum)
+    np.testing.assert_array_equal(restored.digest.means, summary.digest.means)
+    np.testing.assert_array_equal(restored.digest.weights, summary.digest.weights)
+    for q in QUANTILES:
+        assert restored.quantile(q) == pytest.approx(summary.quantile(q), nan_ok=True)
@@ -0,0 +1,60 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier, VotingClassifier
+from sklearn.preprocessing import LabelEncoder
+from sklearn.tree import DecisionTreeClassifier
+
+from helpers import FEATURE_ORDER
+from model_bundle import BUNDLE_FILE, model_files, read_bundle, write_bundle
+
+
+@pytest.fixture(scope='module')
+def artifacts():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.integers(0, 6, size=(300, len(FEATURE_ORDER))), columns=FEATURE_ORDER)
+    y = rng.integers(0, 5, size=300)
+
+    model = VotingClassifier(estimators=[('rf', RandomForestClassifier(n_estimators=10, random_state=0)),
+                                         ('tree', DecisionTreeClassifier(max_depth=5, random_state=0)),
+                                         ('gbc', GradientBoostingClassifier(n_estimators=5, max_depth=3, random_state=0))],
+                             voting='soft').fit(X, y)
+    encoders = {'Age': LabelEncoder().fit(['18-24 years old', '25-34 years old']),
+                'RemoteWork': LabelEncoder().fit(['Remote', 'In-person', 'Hybrid (some remote, some in-person)'])}
+    education_level_map = {'Bachelors': 4, 'Masters': 5}
+    salary_mapping = {'Low': 0, 'Low-Mid': 1, 'Mid': 2, 'Mid-High': 3, 'High': 4}
+
+    return (encoders, education_level_map, model, salary_mapping), X
+
+
+def test_bundle_round_trip(tmp_path, artifacts):
+    (encoders, education_level_map, model, salary_mapping), X = artifacts
+    write_bundle(str(tmp_path), encoders, education_level_map, model, salary_mapping, metadata={'version': 'test'})
+
+    loaded_encoders, loaded_map, loaded_model, loaded_salary_mapping, metadata = read_bundle(str(tmp_path), verify_buffers=True)
+
+    np.testing.assert_array_equal(loaded_model.predict_proba(X), model.predict_proba(X))
+    assert {column: list(encoder.classes_) for column, encoder in loaded_encoders.items()} == \
+           {column: list(encoder.classes_) for column, encoder in encoders.items()}
+    assert loaded_map == education_level_map
+    assert loaded_salary_mapping == salary_mapping
+    assert metadata == {'version': 'test'}
+
+
+def test_corrupted_model_file_is_rejected(tmp_path, artifacts):
+    (encoders, education_level_map, model, salary_mapping), _ = artifacts
+    write_bundle(str(tmp_path), encoders, education_level_map, model, salary_mapping)
+
+    with open(tmp_path / BUNDLE_FILE) as file:
+        model_file, _ = model_files(json.load(file))
+    with open(tmp_path / model_file, 'r+b') as file:
+        file.seek(-1, os.SEEK_END)
+        last = file.read(1)
+        file.seek(-1, os.SEEK_END)
+        file.write(bytes([last[0] ^ 1]))
+
+    with pytest.raises(ValueError, match='sha256'):
+        read_bundle(str(tmp_path))
@@ -0,0 +1,50 @@
+import asyncio
+import time
+
+import pandas as pd
+
+from helpers import FEATURE_ORDER
+from server import MicroBatcher
+
+
+class SlowPredictor:
+    # Stands in for CompensationPredictor: fails on an unseen Age label, like its LabelEncoder does
+    def predict_distribution(self, columns, top_k):
+        time.sleep(0.2)
+        if 'unseen' in columns['Age']:
+            raise ValueError("y contains previously unseen labels: 'unseen'")
+        return pd.DataFrame({'SalaryBracket': ['Mid'] * len(columns['Age']), 'ExpectedSalary': 100000.0})
+
+
+def record(age):
+    return {**{column: 0 for column in FEATURE_ORDER}, 'Age': age}
+
+
+def test_failing_batch_of_a_cancelled_request_keeps_the_worker():
+    async def scenario():
+        batcher = MicroBatcher(SlowPredictor(), max_wait_ms=1)
+        cancelled = asyncio.create_task(batcher.submit([record('unseen')]))
+        await asyncio.sleep(0.05)
+        # The client disconnects while its batch is being scored, and the batch then fails
+        cancelled.cancel()
+        await asyncio.sleep(0.3)
+
+        assert not batcher.worker.done()
+        predictions = await asyncio.wait_for(batcher.submit([record('25-34 years old')]), 5)
+        await batcher.stop()
+        return predictions
+
+    assert asyncio.run(scenario()) == [{'SalaryBracket': 'Mid', 'ExpectedSalary': 100000.0}]
+
+
+def test_failing_request_in_a_batch_fails_alone():
+    async def scenario():
+        batcher = MicroBatcher(SlowPredictor(), max_wait_ms=50)
+        results = await asyncio.gather(batcher.submit([record('unseen')]), batcher.submit([record('25-34 years old')]),
+                                       return_exceptions=True)
+        await batcher.stop()
+        return results
+
+    failed, predicted = asyncio.run(scenario())
+    assert isinstance(failed, ValueError)
+    assert predicted == [{'SalaryBracket': 'Mid', 'ExpectedSalary': 100000.0}]